@@ -0,0 +1,193 @@
+"""離線效能測試：解析、課表合併與ICS輸出各階段的耗時、記憶體與吞吐量
+
+使用 benchmarks/fixtures/ 的錄製/合成回應，不會連到學校伺服器。
+
+    python benchmarks/bench.py                  執行並和baseline.json比較
+    python benchmarks/bench.py --save-baseline  執行並把結果存成新的baseline
+    python benchmarks/bench.py --json out.json  另外輸出完整結果
+
+baseline跟機器有關，請在同一台機器上比較優化前後的數字。
+耗時比baseline慢只會標示出來；只有解析結果跟BeautifulSoup不一致時結束代碼才是1。
+在安靜的機器上要把退步當成失敗時加上--fail-on-regression。
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "codes"))
+
+from corpus import load_fixtures  # noqa: E402
+from extract import compare_with_bs4  # noqa: E402
+from ics import write_ics  # noqa: E402
+import table  # noqa: E402
+
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+# 每一輪至少要花的秒數
+MIN_ROUND_SECONDS = 0.02
+DAYS = range(1, 8)
+
+
+def parse_week(week, backend):
+    class_table = [[] for _ in DAYS]
+    class_time = []
+    for day, html in zip(DAYS, week):
+        day_classes, day_time = table.parse_class_table_day(html, day == 1, backend)
+        class_table[day - 1] = day_classes
+        if day == 1:
+            class_time = day_time
+    return class_table, class_time, []
+
+
+def build_stages(fixtures):
+    """回傳[(階段名稱, 每次處理一位學生的函式清單)]"""
+    parsed = {profile: parse_week(week, "stream") for profile, week in fixtures.items()}
+    mixed = {profile: table.build_mix_class_table(*data) for profile, data in parsed.items()}
+
+    def write_calendar(result):
+        if isinstance(result, dict):
+            write_ics(io.StringIO(), result)
+
+    def pipeline(week):
+        data = parse_week(week, "stream")
+        table.build_single_class_table(*data)
+        write_calendar(table.build_mix_class_table(*data))
+
+    return [
+        ("parse_bs4", [lambda w=w: parse_week(w, "bs4") for w in fixtures.values()]),
+        ("parse_stream", [lambda w=w: parse_week(w, "stream") for w in fixtures.values()]),
+        ("single_view", [lambda d=d: table.build_single_class_table(*d) for d in parsed.values()]),
+        ("mix_merge", [lambda d=d: table.build_mix_class_table(*d) for d in parsed.values()]),
+        ("ics_write", [lambda r=r: write_calendar(r) for r in mixed.values()]),
+        ("pipeline", [lambda w=w: pipeline(w) for w in fixtures.values()]),
+    ]
+
+
+def _run(ops, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        for op in ops:
+            op()
+    return time.perf_counter() - start
+
+
+def measure(ops, rounds):
+    """回傳(每位學生的最短秒數, 每位學生的最大額外記憶體bytes)
+
+    取多輪中最快的一輪，比中位數更不受其他程式干擾；跟timeit一樣測量時暫停GC。
+    很快的階段每一輪重複執行到至少MIN_ROUND_SECONDS秒，不然計時器與排程的誤差比測量的時間還大。
+    """
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        loops = 1
+        while _run(ops, loops) < MIN_ROUND_SECONDS:
+            loops *= 2
+        for _ in range(rounds):
+            samples.append(_run(ops, loops) / (loops * len(ops)))
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    peak = 0
+    for op in ops:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        op()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return min(samples), peak
+
+
+def check_corpus(fixtures) -> int:
+    """先確認串流解析器與BeautifulSoup的輸出一致"""
+    mismatches = 0
+    for profile, week in fixtures.items():
+        for day, html in zip(DAYS, week):
+            differences = compare_with_bs4(html)
+            if differences:
+                mismatches += 1
+                print(f"  {profile} day{day}: {differences[0]}", file=sys.stderr)
+    return mismatches
+
+
+def run(rounds):
+    fixtures = load_fixtures()
+    results = {}
+    for name, ops in build_stages(fixtures):
+        seconds, peak = measure(ops, rounds)
+        results[name] = {
+            "us_per_student": round(seconds * 1e6, 1),
+            "students_per_sec": round(1 / seconds, 1) if seconds else None,
+            "peak_kib": round(peak / 1024, 1),
+        }
+    return fixtures, results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"{'stage':<14}{'us/student':>12}{'students/s':>12}{'peak KiB':>10}{'vs base':>10}")
+    for name, r in results.items():
+        base = baseline.get("stages", {}).get(name)
+        delta = ""
+        if base and base["us_per_student"]:
+            change = r["us_per_student"] / base["us_per_student"] - 1
+            delta = f"{change:+.0%}"
+            if change > threshold:
+                regressions.append(name)
+                delta += " !"
+        print(f"{name:<14}{r['us_per_student']:>12}{r['students_per_sec']:>12}{r['peak_kib']:>10}{delta:>10}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.5, help="慢多少比例算退步(預設0.5)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="有退步的階段時結束代碼為1(預設只顯示)；共用或忙碌的機器上誤差常超過threshold")
+    parser.add_argument("--json", help="把完整結果寫到這個檔案")
+    args = parser.parse_args(argv)
+
+    fixtures, results = run(args.rounds)
+    mismatches = check_corpus(fixtures)
+    if mismatches:
+        print(f"解析結果不一致: {mismatches} 個檔案", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "rounds": args.rounds,
+        "stages": results,
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f"退步的階段: {', '.join(regressions)}", file=sys.stderr)
+    return 1 if mismatches or (regressions and args.fail_on_regression) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""GUI啟動效能測試：視窗出現前需要載入的模組花多少時間
+
+每次都開一個新的Python行程(冷啟動，不共用已載入的模組)，取多次的最小值與中位數。
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --rounds 20 --json out.json
+
+"before_window"是gui.py現在在建立視窗前載入的模組，
+"eager"是以前一開始就全部載入的模組(網路、解析、ICS與日曆元件)，兩者的差就是省下的時間。
+沒有安裝的模組(例如tkcalendar)不計入，結果裡會列在missing。
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CODES = os.path.join(HERE, "..", "codes")
+
+# 名稱 -> 依序載入的模組
+IMPORT_SETS = [
+    ("interpreter", []),
+    ("before_window", ["tkinter", "layout"]),
+    ("eager", ["tkinter", "tkcalendar", "table", "ics", "layout", "client", "cache"]),
+    ("requests", ["requests"]),
+    ("bs4", ["bs4"]),
+    ("table", ["table"]),
+    ("tkcalendar", ["tkcalendar"]),
+]
+
+_CHILD = """
+import sys, time
+sys.path.insert(0, {codes!r})
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(time.perf_counter() - start)
+"""
+
+
+def available(name: str) -> bool:
+    sys.path.insert(0, CODES)
+    try:
+        return importlib.util.find_spec(name) is not None
+    finally:
+        sys.path.remove(CODES)
+
+
+def time_imports(modules, rounds: int):
+    """回傳每一輪的(行程總時間, 載入模組的時間)，單位秒"""
+    code = _CHILD.format(codes=os.path.abspath(CODES), modules=list(modules))
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], check=True,
+                             capture_output=True, text=True).stdout
+        samples.append((time.perf_counter() - start, float(out.strip().splitlines()[-1])))
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--json", help="把完整結果寫到這個檔案")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'set':<15}{'import min':>12}{'import med':>12}{'process med':>13}")
+    for name, modules in IMPORT_SETS:
+        missing = [m for m in modules if not available(m)]
+        if modules and len(missing) == len(modules):
+            results[name] = {"modules": [], "missing": missing}
+            print(f"{name:<15}   (not installed)")
+            continue
+        modules = [m for m in modules if m not in missing]
+        samples = time_imports(modules, args.rounds)
+        imports = [s[1] * 1000 for s in samples]
+        process = [s[0] * 1000 for s in samples]
+        results[name] = {
+            "modules": modules,
+            "import_min_ms": min(imports),
+            "import_median_ms": statistics.median(imports),
+            "process_median_ms": statistics.median(process),
+            "missing": missing,
+        }
+        note = f"  (without {', '.join(missing)})" if missing else ""
+        print(f"{name:<15}{min(imports):>10.1f}ms{statistics.median(imports):>10.1f}ms"
+              f"{statistics.median(process):>11.1f}ms{note}")
+
+    saved = results["eager"]["import_median_ms"] - results["before_window"]["import_median_ms"]
+    print(f"\n視窗出現前少載入 {saved:.1f}ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""課表API(SRHCUR_Schedule_ajax.aspx)回應的合成語料
+
+產生的HTML結構與學校API相同：每一節一列，th.Stdth003放節次與時間，
+td.Stdtd001放當天的課程(<a>課名</a><br/>老師<br/>教室)。
+benchmarks/fixtures/ 裡的檔案由這個模組產生，壓力測試用的假伺服器也用它即時產生課表。
+
+    python benchmarks/corpus.py        重新產生 fixtures/
+"""
+import hashlib
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# (節次, 開始, 結束)；10節以後是進修部的夜間課程
+PERIODS: List[Tuple[str, str, str]] = [
+    ("1", "08:10", "09:00"), ("2", "09:10", "10:00"), ("3", "10:10", "11:00"),
+    ("4", "11:10", "12:00"), ("5", "12:40", "13:30"), ("6", "13:40", "14:30"),
+    ("7", "14:40", "15:30"), ("8", "15:40", "16:30"), ("9", "16:40", "17:30"),
+    ("10", "18:30", "19:15"), ("11", "19:20", "20:05"), ("12", "20:10", "20:55"),
+    ("13", "21:00", "21:45"),
+]
+
+COURSES = [
+    "計算機概論", "資料結構", "程式設計(一)", "微積分", "會計學", "經濟學",
+    "英文(二)", "國文", "體育", "統計學", "資料庫管理系統", "網頁程式設計",
+    "人工智慧導論與實務應用專題", "企業資源規劃", "行銷管理", "財務管理",
+]
+TEACHERS = ["王小明", "李大華", "陳怡君", "林志豪", "張雅婷", "黃建國", "吳佳穎", "劉俊傑"]
+ROOMS = ["A-501", "B-305", "C-201", "S-110", "F-402", "體育館", "電腦教室三"]
+
+PAGE_HEAD = (
+    '<table class="StdTable" width="100%">\r\n'
+    '<tr><th class="Stdth001">節次</th><th class="Stdth002">課程</th></tr>\r\n'
+)
+PAGE_TAIL = '</table>\r\n'
+
+# 語料的種類
+PROFILES = ("empty", "regular", "multi_teacher", "evening", "mixed_br")
+
+
+def render_cell(course: Optional[Dict[str, str]], br: str = "<br/>") -> str:
+    """產生一個td.Stdtd001儲存格"""
+    if course is None:
+        return '<td class="Stdtd001"><a></a></td>'
+    teacher = course["teacher"]
+    if isinstance(teacher, list):
+        # 多位老師時學校API把第二位老師放在<font>裡
+        teacher = teacher[0] + br + "".join(f'<font color="gray">{t}</font>' for t in teacher[1:])
+    return (f'<td class="Stdtd001"><a href="javascript:void(0)" class="CurLink">{course["name"]}</a>'
+            f'{br}{teacher}{br}{course["room"]}</td>')
+
+
+def render_day(courses: List[Optional[Dict[str, str]]], periods=PERIODS, br: str = "<br/>") -> str:
+    """產生某一天的完整回應，courses與periods一一對應"""
+    rows = [PAGE_HEAD]
+    for (class_no, start, end), course in zip(periods, courses):
+        rows.append(f'<tr><th class="Stdth003">{class_no}{br}{start}{br}{end}</th>'
+                    f'{render_cell(course, br)}</tr>\r\n')
+    rows.append(PAGE_TAIL)
+    return "".join(rows)
+
+
+def _course(rng: random.Random, multi_teacher: bool = False) -> Dict[str, str]:
+    teacher = rng.choice(TEACHERS)
+    if multi_teacher:
+        teacher = [teacher] + rng.sample([t for t in TEACHERS if t != teacher], rng.randint(1, 2))
+    return {"name": rng.choice(COURSES), "teacher": teacher, "room": rng.choice(ROOMS)}
+
+
+def generate_week(profile: str, seed) -> List[List[Optional[Dict[str, str]]]]:
+    """依種類產生一週七天的課程(每天的長度都是len(PERIODS))"""
+    rng = random.Random(f"{profile}:{seed}")
+    week = []
+    for day in range(7):
+        courses: List[Optional[Dict[str, str]]] = [None] * len(PERIODS)
+        if profile != "empty" and (day < 5 or (profile == "evening" and day == 5)):
+            if profile == "evening":
+                first, last = 9, len(PERIODS)
+            else:
+                first, last = 0, 9
+            i = first + rng.randint(0, 1)
+            while i < last:
+                if rng.random() < 0.7:
+                    course = _course(rng, profile == "multi_teacher" and rng.random() < 0.5)
+                    length = rng.randint(1, 3)
+                    for j in range(i, min(i + length, last)):
+                        courses[j] = course
+                    i += length
+                else:
+                    i += 1
+        week.append(courses)
+    return week
+
+
+def generate_response(student_id: str, today: int, profile: Optional[str] = None) -> str:
+    """依學號產生固定的(可重現的)某一天回應，供假伺服器使用"""
+    if profile is None:
+        digest = int(hashlib.md5(student_id.encode("utf-8")).hexdigest(), 16)
+        profile = PROFILES[digest % len(PROFILES)]
+    week = generate_week(profile, student_id)
+    br = "<br>" if profile == "mixed_br" and today % 2 else "<br/>"
+    return render_day(week[today - 1], br=br)
+
+
+def fixture_paths() -> Dict[str, List[str]]:
+    """{種類: [星期一~日的檔案路徑]}"""
+    return {profile: [os.path.join(FIXTURE_DIR, f"{profile}_day{day}.html") for day in range(1, 8)]
+            for profile in PROFILES}
+
+
+def load_fixtures() -> Dict[str, List[str]]:
+    """{種類: [星期一~日的HTML]}"""
+    fixtures = {}
+    for profile, paths in fixture_paths().items():
+        fixtures[profile] = []
+        for path in paths:
+            with open(path, encoding="utf-8", newline="") as f:
+                fixtures[profile].append(f.read())
+    return fixtures
+
+
+def write_fixtures():
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for profile, paths in fixture_paths().items():
+        for day, path in enumerate(paths, 1):
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(generate_response("fixture", day, profile))
+
+
+if __name__ == "__main__":
+    write_fixtures()
+    print(f"fixtures written to {FIXTURE_DIR}")
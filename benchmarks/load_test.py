@@ -0,0 +1,143 @@
+"""壓力測試：對假伺服器(或指定的伺服器)批次查詢課表，回報每位學生的延遲分布
+
+    python benchmarks/load_test.py --students 2000 --workers 32 --latency lognormal --latency-ms 80
+    python benchmarks/load_test.py --backend async --concurrency 200 --error-rate 0.05
+    python benchmarks/load_test.py --host http://127.0.0.1:8765 --students 500
+    python benchmarks/load_test.py --adaptive --workers 64 --error-rate 0.02
+    python benchmarks/load_test.py --hedge --retries 2 --slow-rate 0.02 --slow-ms 1000
+    python benchmarks/load_test.py --time-limit 0.5 --slow-rate 0.02 --slow-ms 3000
+
+沒有指定--host時會在同一個程式裡啟動mock_server.py，延遲與故障參數跟假伺服器相同。
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "codes"))
+
+from mock_server import SCHEDULE_PATH, add_fault_arguments, faults_from_args, start_server  # noqa: E402
+
+
+def percentile(sorted_values, p):
+    """最近序位法的百分位數"""
+    if not sorted_values:
+        return 0.0
+    # 第ceil(p/100 * n)個(1開始)；round()的.5會取偶數，有些百分位數會差一個
+    rank = min(max(1, math.ceil(p / 100 * len(sorted_values))), len(sorted_values))
+    return sorted_values[rank - 1]
+
+
+def run_threads(url, student_ids, workers, limiter=None, retry=None, hedger=None, time_limit=None):
+    from batch import batch_class_tables
+    from client import ClassTableClient
+
+    pool_size = workers * 2 if hedger is not None else workers
+    with ClassTableClient(url=url, pool_size=pool_size, limiter=limiter, retry=retry, hedger=hedger) as client:
+        yield from batch_class_tables(student_ids, max_workers=workers, client=client, time_limit=time_limit)
+
+
+def run_async(url, student_ids, concurrency, limiter=None):
+    from async_table import AsyncClassTableClient, batch_class_tables_async
+
+    async def main():
+        results = []
+        async with AsyncClassTableClient(url=url, concurrency=concurrency, limiter=limiter) as client:
+            async for result in batch_class_tables_async(student_ids, client):
+                results.append(result)
+        return results
+
+    return asyncio.run(main())
+
+
+def summarize(results, elapsed):
+    latencies = sorted(r.elapsed for r in results)
+    failed = [r for r in results if r.error_list]
+    return {
+        "students": len(results),
+        "failed_students": len(failed),
+        "failed_requests": sum(len(r.error_list) for r in results),
+        "elapsed": round(elapsed, 3),
+        "students_per_sec": round(len(results) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="課表批次查詢壓力測試")
+    parser.add_argument("--host", help="已在執行的伺服器，例如 http://127.0.0.1:8765")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--ids", help="學號清單檔案(一行一個)，取代--students")
+    parser.add_argument("--backend", choices=("threads", "async"), default="threads")
+    parser.add_argument("--workers", type=int, default=16, help="threads的執行緒數")
+    parser.add_argument("--concurrency", type=int, default=100, help="async同時進行的請求數")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="用AIMD自動調整同時請求數(上限是--workers或--concurrency)")
+    parser.add_argument("--retries", type=int, default=0, help="threads：每一天失敗時重試幾次")
+    parser.add_argument("--hedge", action="store_true", help="threads：太慢的請求另外送一次(對沖請求)")
+    parser.add_argument("--time-limit", type=float, help="threads：每位學生最多等幾秒(含排隊)")
+    parser.add_argument("--json", action="store_true", help="只輸出JSON")
+    add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = None
+    host = args.host
+    if host is None:
+        server, host = start_server(faults=faults_from_args(args))
+    url = host.rstrip("/") + SCHEDULE_PATH
+
+    if args.ids:
+        with open(args.ids, encoding="utf-8") as f:
+            student_ids = [line.strip() for line in f if line.strip()]
+    else:
+        student_ids = [str(11200000 + i) for i in range(args.students)]
+
+    limiter = None
+    if args.adaptive:
+        from limiter import AimdLimiter, AsyncAimdLimiter
+        if args.backend == "async":
+            limiter = AsyncAimdLimiter(max_limit=args.concurrency, name="load_test")
+        else:
+            limiter = AimdLimiter(max_limit=args.workers, name="load_test")
+
+    retry = hedger = None
+    if args.retries:
+        from hedge import RetryPolicy
+        retry = RetryPolicy(attempts=args.retries + 1)
+    if args.hedge:
+        from hedge import Hedger
+        hedger = Hedger(max_workers=args.workers * 2)
+
+    start = time.monotonic()
+    if args.backend == "async":
+        results = run_async(url, student_ids, args.concurrency, limiter)
+    else:
+        results = list(run_threads(url, student_ids, args.workers, limiter, retry, hedger, args.time_limit))
+    summary = summarize(results, time.monotonic() - start)
+    if limiter is not None:
+        summary["limiter"] = limiter.as_dict()
+    if hedger is not None:
+        summary["hedge"] = hedger.as_dict()
+
+    if server is not None:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        for key, value in summary.items():
+            print(f"{key:<18}{value}")
+    return 1 if summary["failed_students"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
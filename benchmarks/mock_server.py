@@ -0,0 +1,178 @@
+"""學校課表API的本機假伺服器，用來做壓力測試
+
+模擬 JMobile_STD/AjaxPage/SRHCUR_Schedule_ajax.aspx：POST StdNo/today，
+回傳corpus.py依學號產生的固定課表(或--profile指定的種類)，並可加上延遲與故障。
+
+    python benchmarks/mock_server.py --port 8765 --latency lognormal --latency-ms 80 --error-rate 0.02
+    NTUB_HOST=http://127.0.0.1:8765 python codes/gui.py
+
+NTUB_HOST會改變codes/api.py的ClassTableURL，不必改程式就能把工具指到假伺服器。
+"""
+import argparse
+import http.server
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import PROFILES, generate_response  # noqa: E402
+
+SCHEDULE_PATH = "/JMobile_STD/AjaxPage/SRHCUR_Schedule_ajax.aspx"
+LATENCY_DISTRIBUTIONS = ("none", "fixed", "uniform", "exponential", "lognormal")
+
+
+class FaultConfig:
+    """延遲與故障設定(毫秒與機率)"""
+
+    def __init__(self, latency="none", latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, slow_rate=0.0, slow_ms=5000.0, drop_rate=0.0,
+                 profile=None, seed=None):
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.drop_rate = drop_rate
+        self.profile = profile
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def delay(self) -> float:
+        """這次回應要等待的秒數"""
+        with self._lock:
+            rng = self._rng
+            mean = self.latency_ms
+            if self.latency == "fixed":
+                ms = mean
+            elif self.latency == "uniform":
+                ms = rng.uniform(max(0.0, mean - self.jitter_ms), mean + self.jitter_ms)
+            elif self.latency == "exponential":
+                ms = rng.expovariate(1 / mean) if mean > 0 else 0.0
+            elif self.latency == "lognormal":
+                # jitter_ms當作標準差；換算成對數常態分布的參數，平均值仍為latency_ms
+                sigma_ms = self.jitter_ms or mean / 2
+                sigma2 = math.log(1 + (sigma_ms / mean) ** 2) if mean > 0 else 0.0
+                ms = rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2)) if mean > 0 else 0.0
+            else:
+                ms = 0.0
+            if self.slow_rate and rng.random() < self.slow_rate:
+                ms += self.slow_ms
+        return ms / 1000
+
+
+class ScheduleHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockNTUB/1.0"
+    faults: FaultConfig = FaultConfig()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8", errors="replace"))
+        if urllib.parse.urlsplit(self.path).path != SCHEDULE_PATH:
+            self._send(404, b"not found")
+            return
+
+        student_id = form.get("StdNo", [""])[0]
+        try:
+            today = int(form.get("today", ["1"])[0])
+        except ValueError:
+            today = 0
+        if not 1 <= today <= 7:
+            self._send(400, b"bad today")
+            return
+
+        faults = self.faults
+        time.sleep(faults.delay())
+        if faults.drop_rate and faults.random() < faults.drop_rate:
+            # 不回應直接斷線
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        if faults.error_rate and faults.random() < faults.error_rate:
+            self._send(503, b"Service Unavailable")
+            return
+
+        body = generate_response(student_id, today, faults.profile).encode("utf-8")
+        self._send(200, body, "text/html; charset=utf-8")
+
+    def _send(self, status, body, content_type="text/plain; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客戶端逾時或故障注入造成的斷線是預期中的，不印出堆疊
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(host, port, faults) -> MockServer:
+    handler = type("Handler", (ScheduleHandler,), {"faults": faults})
+    return MockServer((host, port), handler)
+
+
+def start_server(host="127.0.0.1", port=0, faults=None):
+    """在背景執行緒啟動假伺服器，回傳(server, 對應的NTUB_HOST)"""
+    server = make_server(host, port, faults or FaultConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="none")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="平均延遲")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform的範圍/lognormal的標準差")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳503的機率")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="額外慢slow-ms的機率")
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="直接斷線的機率")
+    parser.add_argument("--profile", choices=PROFILES, help="所有學號都用同一種課表")
+    parser.add_argument("--seed", type=int)
+
+
+def faults_from_args(args) -> FaultConfig:
+    return FaultConfig(args.latency, args.latency_ms, args.jitter_ms, args.error_rate,
+                       args.slow_rate, args.slow_ms, args.drop_rate, args.profile, args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NTUB課表API假伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, faults_from_args(args))
+    print(f"NTUB_HOST=http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
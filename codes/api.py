@@ -1,2 +1,5 @@
-Host          = "https://ntcbadm.ntub.edu.tw"
+import os
+
+# 設定NTUB_HOST環境變數可以改連到其他伺服器(例如 benchmarks/mock_server.py 的假伺服器)
+Host          = os.environ.get("NTUB_HOST", "https://ntcbadm.ntub.edu.tw").rstrip("/")
 ClassTableURL = Host + "/JMobile_STD/AjaxPage/SRHCUR_Schedule_ajax.aspx"
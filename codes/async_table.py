@@ -0,0 +1,220 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+from api import ClassTableURL
+from batch import DAYS, StudentResult
+from cache import ResponseCache, cache_namespace
+from client import DEFAULT_HEADERS, DEFAULT_RETRIES
+from limiter import AsyncAimdLimiter, is_overload_status
+from table import DayFetchError, parse_class_table_day
+
+# 同時進行中的請求上限(全部在同一個執行緒上)
+DEFAULT_CONCURRENCY = 100
+DEFAULT_TIMEOUT = 20.0
+RETRY_STATUS = (502, 503, 504)
+
+
+class AsyncClassTableClient:
+    """asyncio版本的課表客戶端
+
+    所有請求共用同一個aiohttp連線池，並用Semaphore限制同時進行的請求數量；
+    有傳入limiter時改由AsyncAimdLimiter依伺服器的回應調整(concurrency是連線池的上限)。
+    ClientSession必須在事件迴圈裡建立，所以第一次請求時才會建立。
+    """
+
+    def __init__(self,
+                 url: str = ClassTableURL,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES,
+                 backoff: float = 0.3,
+                 cache: Optional[ResponseCache] = None,
+                 limiter: Optional[AsyncAimdLimiter] = None):
+        self.url = url
+        self.cache = cache
+        if cache is not None and cache.namespace != cache_namespace(url):
+            # 不同伺服器的回應不能共用快取(例如NTUB_HOST指到假伺服器時)
+            raise ValueError(f"快取屬於 {cache.url}，不能用在 {url}")
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=DEFAULT_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def post_schedule(self, student_id: str, today: int,
+                            headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], str]:
+        """查詢某學號某一天(1~7)的課表，回傳(狀態碼, 標頭, HTML文字)"""
+        session = self._get_session()
+        data = {"StdNo": student_id, "today": str(today)}
+        return await self._post_with_retries(session, data, headers)
+
+    async def _post_with_retries(self, session: aiohttp.ClientSession, data: Dict[str, str],
+                                 headers: Optional[Dict[str, str]]) -> Tuple[int, Dict[str, str], str]:
+        limiter = self.limiter
+        for attempt in range(self.retries + 1):
+            # 每次嘗試都各自取得空位(limiter或Semaphore)，重試前的等待不佔位置
+            if limiter is not None:
+                await limiter.acquire()
+            else:
+                await self._semaphore.acquire()
+            start = time.monotonic()
+            overloaded = False
+            try:
+                async with session.post(self.url, data=data, headers=headers) as response:
+                    overloaded = is_overload_status(response.status)
+                    if response.status not in RETRY_STATUS or attempt >= self.retries:
+                        if response.status == 304:
+                            if not headers:
+                                # 沒有送條件式請求卻回覆304，沒有內容可以用
+                                raise aiohttp.ClientResponseError(
+                                    response.request_info, response.history, status=304,
+                                    message="Not Modified (沒有送出條件式請求)", headers=response.headers)
+                            return 304, dict(response.headers), ""
+                        response.raise_for_status()
+                        return response.status, dict(response.headers), await response.text()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                overloaded = True
+                if attempt >= self.retries:
+                    raise
+            finally:
+                if limiter is not None:
+                    await limiter.release(not overloaded, time.monotonic() - start)
+                else:
+                    self._semaphore.release()
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def fetch_schedule(self, student_id: str, today: int, refresh: bool = False) -> str:
+        """ClassTableClient.fetch_schedule的asyncio版本，有設定快取時優先使用快取"""
+        cache = self.cache
+        entry = None
+        if cache is not None and not refresh:
+            entry = cache.get(student_id, today)
+            if entry is not None and entry.is_fresh(cache.ttl):
+                return entry.text
+
+        headers = cache.conditional_headers(entry) if cache is not None else None
+        status, response_headers, text = await self.post_schedule(student_id, today, headers)
+        if status == 304 and entry is not None:
+            return cache.revalidated(student_id, today, entry).text
+        if cache is not None and text:
+            cache.put(student_id, today, text,
+                      response_headers.get("ETag"), response_headers.get("Last-Modified"))
+        return text
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def get_personal_class_table_async(student_id: str, today: int,
+                                         client: AsyncClassTableClient,
+                                         refresh: bool = False) -> BeautifulSoup:
+    """get_personal_class_table的asyncio版本"""
+    html = await client.fetch_schedule(student_id, today, refresh)
+    return BeautifulSoup(html, 'html.parser')
+
+
+async def fetch_class_table_day_async(student_id: str, today: int,
+                                      client: AsyncClassTableClient,
+                                      with_time: bool = True,
+                                      refresh: bool = False) -> Tuple[List[Optional[Dict[str, str]]], List[Dict[str, str]]]:
+    """fetch_class_table_day的asyncio版本"""
+    html = await client.fetch_schedule(student_id, today, refresh)
+    return parse_class_table_day(html, with_time)
+
+
+async def personal_class_table_async(student_id: str,
+                                     client: AsyncClassTableClient,
+                                     refresh: bool = False) -> Tuple[List[List[Optional[Dict[str, str]]]], List[Dict[str, str]], List[Exception]]:
+    """personal_class_table的asyncio版本，同時送出七天的請求"""
+    results = await asyncio.gather(
+        *(client.fetch_schedule(student_id, day, refresh) for day in DAYS),
+        return_exceptions=True,
+    )
+
+    class_table = [[] for _ in DAYS]
+    class_time = []
+    error_list = []
+    for day, result in zip(DAYS, results):
+        if isinstance(result, Exception):
+            error_list.append(DayFetchError(student_id, day, result))
+            continue
+        # 節次時間從第一個成功的星期取得，星期一失敗時其他天的課仍有時間可以對應
+        try:
+            day_classes, day_time = parse_class_table_day(result, not class_time)
+        except Exception as e:
+            error_list.append(DayFetchError(student_id, day, e))
+            continue
+        class_table[day - 1] = day_classes
+        if not class_time:
+            class_time = day_time
+
+    return class_table, class_time, error_list
+
+
+async def batch_class_tables_async(student_ids: Iterable[str],
+                                   client: AsyncClassTableClient,
+                                   max_pending_students: Optional[int] = None) -> AsyncIterator[StudentResult]:
+    """批次查詢多位學生的課表，完成一位就產出一位
+
+    同時進行的請求數量由client的Semaphore控制。
+    同時在處理中的學生數量也有上限，學號清單再長也不會一次建立所有的task。
+    """
+    if max_pending_students is None:
+        # 跟batch_class_tables一樣，讓請求隨時有得送，又不會堆積太多未完成的學生
+        max_pending_students = max(2, client.concurrency // len(DAYS) * 2 + 1)
+
+    async def one(student_id: str) -> StudentResult:
+        started_at = time.monotonic()
+        data = await personal_class_table_async(student_id, client)
+        return StudentResult(student_id, *data, time.monotonic() - started_at)
+
+    ids = iter(student_ids)
+    pending = set()
+    try:
+        while True:
+            for student_id in ids:
+                pending.add(asyncio.ensure_future(one(str(student_id).strip())))
+                if len(pending) >= max_pending_students:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def run_personal_class_table(student_id: str, **client_options):
+    """在同步程式裡使用asyncio版本查詢單一學生的課表"""
+    async def main():
+        async with AsyncClassTableClient(**client_options) as client:
+            return await personal_class_table_async(student_id, client)
+
+    return asyncio.run(main())
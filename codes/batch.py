@@ -0,0 +1,256 @@
+import concurrent.futures
+import json
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import metrics
+from client import ClassTableClient
+from deadline import Deadline, DeadlineExceeded
+from model import CompactTimetable, Interner, build_compact_timetable
+from table import DayFetchError, parse_class_table_day
+
+DAYS = range(1, 8)
+DEFAULT_WORKERS = 16
+
+
+class StudentResult(NamedTuple):
+    """單一學生的批次查詢結果，欄位與personal_class_table的回傳值相同"""
+    student_id: str
+    class_table: List[List[Optional[Dict[str, str]]]]
+    class_time: List[Dict[str, str]]
+    error_list: List[Exception]
+    # 從送出第一個請求到七天都完成的秒數
+    elapsed: float = 0.0
+
+
+class BatchStats:
+    """批次查詢的吞吐量統計(可以在查詢途中從其他執行緒讀取)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.students = 0
+        self.failed_students = 0
+        self.requests = 0
+        self.failed_requests = 0
+
+    def record_request(self, ok: bool):
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.failed_requests += 1
+
+    def record_student(self, ok: bool):
+        with self._lock:
+            self.students += 1
+            if not ok:
+                self.failed_students += 1
+
+    def finish(self):
+        self.finished_at = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def students_per_sec(self) -> float:
+        return self.students / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def requests_per_sec(self) -> float:
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "students": self.students,
+                "failed_students": self.failed_students,
+                "requests": self.requests,
+                "failed_requests": self.failed_requests,
+                "elapsed": round(self.elapsed, 3),
+                "students_per_sec": round(self.students_per_sec, 2),
+                "requests_per_sec": round(self.requests_per_sec, 2),
+            }
+
+
+def _fetch_day(submitted_at: float, pending: "_PendingStudent", day: int, client: ClassTableClient):
+    metrics.observe("queue_wait", time.perf_counter() - submitted_at)
+    student_id = pending.student_id
+    try:
+        html = client.fetch_schedule(student_id, day, deadline=pending.deadline)
+        # 節次時間只要還沒有寫入的星期提供過就解析；解析到的星期失敗或超過時間被丟掉時，
+        # 之後完成的星期仍會解析(class_time只在主執行緒寫入)
+        return parse_class_table_day(html, not pending.class_time)
+    except Exception as e:
+        raise DayFetchError(student_id, day, e) from e
+
+
+class _PendingStudent:
+    """正在查詢中的學生，收集七天的結果"""
+
+    def __init__(self, student_id: str, days: List[int], time_limit: Optional[float] = None):
+        self.student_id = student_id
+        self.class_table = [[] for _ in DAYS]
+        self.class_time = []
+        self.error_list = []
+        self.remaining = len(days)
+        self.started_at = time.monotonic()
+        # 從排進佇列開始計時，排隊的時間也算在內
+        self.deadline = Deadline(time_limit) if time_limit is not None else None
+
+
+def batch_class_tables(student_ids: Iterable[str],
+                       max_workers: int = DEFAULT_WORKERS,
+                       client: Optional[ClassTableClient] = None,
+                       max_pending_students: Optional[int] = None,
+                       stats: Optional[BatchStats] = None,
+                       days: Iterable[int] = DAYS,
+                       time_limit: Optional[float] = None) -> Iterator[StudentResult]:
+    """批次查詢多位學生的課表，完成一位就產出一位(順序不保證)
+
+    所有(學生, 星期)的請求都排進同一個大小為max_workers的執行緒池，
+    整個批次同時最多只會有max_workers個請求打到學校伺服器。
+    同時在處理中的學生數量也有上限，學號清單再長也不會一次全部排進佇列。
+    days可以只查詢部分星期(例如課表格式只需要週一到週五)，沒查詢的星期是空清單。
+    time_limit是每位學生從排進佇列起最多等幾秒，到期還沒完成的星期是DeadlineExceeded。
+    """
+    days = sorted(set(days))
+    if not days:
+        raise ValueError("days不能是空的")
+    if max_pending_students is None:
+        # 讓執行緒池隨時有工作可做，又不會堆積太多未完成的學生
+        max_pending_students = max(2, max_workers // len(days) * 2 + 1)
+    if stats is None:
+        stats = BatchStats()
+
+    own_client = client is None
+    if own_client:
+        client = ClassTableClient(pool_size=max_workers)
+
+    ids = iter(student_ids)
+    students = {}
+    futures = {}
+
+    def submit_next() -> bool:
+        student_id = next(ids, None)
+        if student_id is None:
+            return False
+        student_id = str(student_id).strip()
+        pending = _PendingStudent(student_id, days, time_limit)
+        students[id(pending)] = pending
+        for day in days:
+            future = executor.submit(_fetch_day, time.perf_counter(), pending, day, client)
+            futures[future] = (pending, day)
+        return True
+
+    def expire_overdue():
+        """到期的學生不再等待還沒完成的星期(之後才完成的結果直接丟掉)"""
+        for future, (pending, day) in list(futures.items()):
+            if pending.deadline.expired():
+                del futures[future]
+                future.cancel()
+                pending.error_list.append(DayFetchError(
+                    pending.student_id, day, DeadlineExceeded(f"超過 {time_limit:g} 秒的時間限制")))
+                stats.record_request(False)
+                pending.remaining -= 1
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                exhausted = False
+                while True:
+                    while not exhausted and len(students) < max_pending_students:
+                        exhausted = not submit_next()
+                    if not futures:
+                        break
+
+                    timeout = None
+                    if time_limit is not None:
+                        # 最早到期的學生到期時也要醒來
+                        timeout = min(pending.deadline.remaining() for pending in students.values())
+                    done, _ = concurrent.futures.wait(
+                        list(futures), timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        pending, day = futures.pop(future)
+                        try:
+                            day_classes, day_time = future.result()
+                            pending.class_table[day - 1] = day_classes
+                            if day_time and not pending.class_time:
+                                pending.class_time = day_time
+                            stats.record_request(True)
+                        except Exception as e:
+                            pending.error_list.append(e)
+                            stats.record_request(False)
+                        pending.remaining -= 1
+
+                    if time_limit is not None:
+                        expire_overdue()
+                    for pending in [p for p in students.values() if p.remaining == 0]:
+                        del students[id(pending)]
+                        stats.record_student(not pending.error_list)
+                        yield StudentResult(pending.student_id, pending.class_table,
+                                            pending.class_time, pending.error_list,
+                                            time.monotonic() - pending.started_at)
+            finally:
+                # 呼叫端提早停止迭代時，取消還沒開始的請求
+                for future in futures:
+                    future.cancel()
+    finally:
+        stats.finish()
+        if own_client:
+            client.close()
+
+
+def batch_compact_timetables(student_ids: Iterable[str],
+                             interner: Optional[Interner] = None,
+                             **options) -> Iterator[Tuple[CompactTimetable, List[Exception]]]:
+    """batch_class_tables的精簡版，每位學生產出(CompactTimetable, 錯誤)
+
+    整批共用同一個Interner，老師、教室與課名在記憶體裡只有一份。
+    其餘參數與batch_class_tables相同。
+    """
+    if interner is None:
+        interner = Interner()
+    for result in batch_class_tables(student_ids, **options):
+        timetable = build_compact_timetable(result.student_id, result.class_table,
+                                            result.class_time, interner)
+        yield timetable, result.error_list
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """python batch.py 學號清單.txt [workers]
+
+    每完成一位學生輸出一行JSON，最後把統計資料印到stderr。
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print(main.__doc__, file=sys.stderr)
+        return 2
+
+    max_workers = int(argv[1]) if len(argv) > 1 else DEFAULT_WORKERS
+    with open(argv[0], encoding="utf-8") as f:
+        student_ids = [line.strip() for line in f if line.strip()]
+
+    stats = BatchStats()
+    failed = 0
+    for result in batch_class_tables(student_ids, max_workers=max_workers, stats=stats):
+        if result.error_list:
+            failed += 1
+        print(json.dumps({
+            "student_id": result.student_id,
+            "class_table": result.class_table,
+            "class_time": result.class_time,
+            "errors": [str(e) for e in result.error_list],
+        }, ensure_ascii=False), flush=True)
+
+    print(json.dumps(stats.as_dict()), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
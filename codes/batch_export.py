@@ -0,0 +1,263 @@
+import argparse
+import datetime
+import json
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from batch import DEFAULT_WORKERS, BatchStats, batch_class_tables
+from client import ClassTableClient
+from ics import calendar_bytes, diff_calendar, iter_events
+from table import build_mix_class_table
+
+MANIFEST_NAME = "manifest.json"
+# 寫入佇列最多暫存幾份行事曆，寫檔/壓縮跟不上時讓序列化等一下
+WRITE_QUEUE_SIZE = 64
+_UNSAFE_CHARS = re.compile(r"[^0-9A-Za-z_-]")
+
+
+class ExportEntry(NamedTuple):
+    """一位學生的匯出結果"""
+    student_id: str
+    filename: Optional[str]
+    events: int
+    size: int
+    error: Optional[str] = None
+    # 增量匯出時改變的事件數(0代表沒有重寫檔案)，完整匯出時為None
+    changed: Optional[int] = None
+
+
+class ExportManifest:
+    """整批匯出的成功/失敗清單"""
+
+    def __init__(self, output: str):
+        self.output = output
+        self.entries: List[ExportEntry] = []
+        self.stats: Optional[BatchStats] = None
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+
+    def add(self, entry: ExportEntry):
+        self.entries.append(entry)
+
+    @property
+    def succeeded(self) -> List[ExportEntry]:
+        return [e for e in self.entries if e.error is None]
+
+    @property
+    def failed(self) -> List[ExportEntry]:
+        return [e for e in self.entries if e.error is not None]
+
+    def as_dict(self) -> Dict:
+        return {
+            "output": self.output,
+            "generated_at": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "elapsed": round(self.elapsed, 3),
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "fetch": self.stats.as_dict() if self.stats else None,
+            "students": [e._asdict() for e in self.entries],
+        }
+
+    def to_json(self) -> bytes:
+        return json.dumps(self.as_dict(), ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def calendar_filename(student_id: str) -> str:
+    """學號轉成安全的檔名(避免../之類的路徑)"""
+    return f"{_UNSAFE_CHARS.sub('_', student_id)}.ics"
+
+
+def delta_filename(student_id: str) -> str:
+    """增量匯出時只包含變動事件的檔名"""
+    return f"{_UNSAFE_CHARS.sub('_', student_id)}.delta.ics"
+
+
+class _DirectorySink:
+    """每位學生一個檔案，先寫暫存檔再os.replace"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def read(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, name), encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def remove(self, name: str):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def write(self, name: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def close(self):
+        pass
+
+
+class _ZipSink:
+    """所有行事曆寫進同一個zip，邊寫邊壓縮；也可以寫到不能seek的串流(例如HTTP回應)"""
+
+    def __init__(self, target, compresslevel: Optional[int] = None):
+        self.zip = zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+        self.date_time = time.localtime()[:6]
+
+    def write(self, name: str, data: bytes):
+        info = zipfile.ZipInfo(name, self.date_time)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        self.zip.writestr(info, data)
+
+    def close(self):
+        self.zip.close()
+
+
+def _open_sink(output, compresslevel: Optional[int] = None):
+    if not isinstance(output, (str, os.PathLike)):
+        return _ZipSink(output, compresslevel)
+    if os.fspath(output).lower().endswith(".zip"):
+        return _ZipSink(output, compresslevel)
+    return _DirectorySink(os.fspath(output))
+
+
+def export_calendars(student_ids: Iterable[str], output,
+                     until_date: Optional[datetime.date] = None,
+                     max_workers: int = DEFAULT_WORKERS,
+                     client: Optional[ClassTableClient] = None,
+                     today: Optional[datetime.date] = None,
+                     compresslevel: Optional[int] = None,
+                     incremental: bool = False) -> ExportManifest:
+    """批次把多位學生的課表匯出成ics，回傳ExportManifest
+
+    output是資料夾路徑時每位學生一個<學號>.ics；路徑以.zip結尾或傳入檔案物件時，
+    全部寫進同一個zip。manifest.json會跟行事曆放在一起。
+
+    三個階段同時進行：執行緒池抓取與解析課表(batch_class_tables)、
+    目前的執行緒合併課程並產生ics、另一個執行緒寫檔與壓縮。
+
+    incremental=True時(只支援資料夾)會和資料夾裡上次匯出的檔案比較：
+    課表沒變的學生不重寫檔案；有變的學生重寫<學號>.ics(只有改變的事件SEQUENCE加一)，
+    並另外寫出只含變動與取消事件的<學號>.delta.ics。
+    """
+    manifest = ExportManifest(output if isinstance(output, (str, os.PathLike)) else "<stream>")
+    manifest.stats = BatchStats()
+    sink = _open_sink(output, compresslevel)
+    if incremental and not isinstance(sink, _DirectorySink):
+        sink.close()
+        raise ValueError("增量匯出只支援輸出到資料夾")
+
+    writes: "queue.Queue" = queue.Queue(WRITE_QUEUE_SIZE)
+    write_errors = []
+
+    def writer():
+        while True:
+            item = writes.get()
+            if item is None:
+                return
+            if write_errors:
+                continue
+            try:
+                sink.write(*item)
+            except Exception as e:
+                write_errors.append(e)
+
+    writer_thread = threading.Thread(target=writer, name="ics-writer", daemon=True)
+    writer_thread.start()
+
+    try:
+        for result in batch_class_tables(student_ids, max_workers=max_workers, client=client,
+                                         stats=manifest.stats):
+            if write_errors:
+                break
+            student_id = result.student_id
+            if result.error_list:
+                manifest.add(ExportEntry(student_id, None, 0, 0,
+                                         "; ".join(str(e) for e in result.error_list)))
+                continue
+
+            mixed = build_mix_class_table(result.class_table, result.class_time, result.error_list)
+            if not isinstance(mixed, dict):
+                manifest.add(ExportEntry(student_id, None, 0, 0, str(mixed or "沒有課表")))
+                continue
+
+            events = iter_events(mixed, today)
+            filename = calendar_filename(student_id)
+            changed = None
+            if incremental:
+                previous = sink.read(filename)
+                if previous is not None:
+                    diff = diff_calendar(previous, events, until_date)
+                    if not diff.has_changes:
+                        sink.remove(delta_filename(student_id))
+                        manifest.add(ExportEntry(student_id, filename, len(diff.events),
+                                                 len(previous.encode("utf-8")), changed=0))
+                        continue
+                    writes.put((delta_filename(student_id), calendar_bytes(diff.delta, until_date)))
+                    events = diff.events
+                    changed = len(diff.delta)
+
+            data = calendar_bytes(events, until_date)
+            writes.put((filename, data))
+            manifest.add(ExportEntry(student_id, filename, len(mixed["class"]), len(data),
+                                     changed=changed))
+    finally:
+        writes.put(None)
+        writer_thread.join()
+        manifest.elapsed = time.monotonic() - manifest.started_at
+        try:
+            if not write_errors:
+                sink.write(MANIFEST_NAME, manifest.to_json())
+        finally:
+            sink.close()
+
+    if write_errors:
+        raise write_errors[0]
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="批次匯出多位學生的ics行事曆")
+    parser.add_argument("ids", help="學號清單檔案(一行一個)")
+    parser.add_argument("output", help="輸出資料夾，或以.zip結尾的壓縮檔")
+    parser.add_argument("--until", type=datetime.date.fromisoformat,
+                        help="重複到這一天(YYYY-MM-DD)，預設無限重複")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--incremental", action="store_true",
+                        help="只重寫課表有變動的學生，另外輸出<學號>.delta.ics")
+    args = parser.parse_args(argv)
+
+    with open(args.ids, encoding="utf-8") as f:
+        student_ids = [line.strip() for line in f if line.strip()]
+
+    manifest = export_calendars(student_ids, args.output, args.until, args.workers,
+                                incremental=args.incremental)
+    for entry in manifest.failed:
+        print(f"{entry.student_id}: {entry.error}", file=sys.stderr)
+    print(json.dumps({key: value for key, value in manifest.as_dict().items() if key != "students"},
+                     ensure_ascii=False), file=sys.stderr)
+    return 1 if manifest.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
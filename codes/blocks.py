@@ -0,0 +1,93 @@
+"""把每天的節次依連續相同的課程切成區塊(run-length)
+
+行事曆(build_mix_class_table → ics)與畫面(layout.layout_mix)都用這裡的結果：
+同一天同一門課只有在節次連續時才合併，中間有空堂就是兩個區塊。
+每個區塊只掃描一次就決定好列號與開始/結束的分鐘數，不需要再用list.index找位置。
+"""
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from model import parse_minutes
+
+
+class Block(NamedTuple):
+    """某一天連續幾節的同一門課"""
+    day: int                # 星期(1開始)
+    start_row: int          # 第一節在節次表裡的位置(0開始)
+    end_row: int            # 最後一節的位置(包含)
+    value: Any              # 課程(比較是否相同用的值)
+    start_minute: int = -1
+    end_minute: int = -1
+
+    @property
+    def periods(self) -> List[int]:
+        """第幾節(1開始)"""
+        return list(range(self.start_row + 1, self.end_row + 2))
+
+    @property
+    def length(self) -> int:
+        return self.end_row - self.start_row + 1
+
+
+def run_length(values: Sequence[Any]) -> Iterator[Tuple[int, int, Any]]:
+    """連續相同的非空值合併成(開始, 結束(包含), 值)，空值(None或"")不產生區塊"""
+    start = None
+    current = None
+    for i, value in enumerate(values):
+        if start is not None and value == current:
+            continue
+        if start is not None:
+            yield start, i - 1, current
+        if value:
+            start, current = i, value
+        else:
+            start, current = None, None
+    if start is not None:
+        yield start, len(values) - 1, current
+
+
+def day_blocks(day: int, values: Sequence[Any],
+               starts: Optional[Sequence[int]] = None,
+               ends: Optional[Sequence[int]] = None) -> List[Block]:
+    """一天的區塊；starts/ends是每一節開始/結束的分鐘數"""
+    blocks = []
+    for start, end, value in run_length(values):
+        blocks.append(Block(day, start, end, value,
+                            starts[start] if starts else -1,
+                            ends[end] if ends else -1))
+    return blocks
+
+
+def course_key(class_info: Optional[Dict[str, str]]) -> Optional[Tuple[str, str, str]]:
+    """判斷兩節是不是同一門課：課名、老師、教室都相同"""
+    if not class_info:
+        return None
+    return (class_info['name'], class_info.get('teacher', ''), class_info.get('room', ''))
+
+
+def week_blocks(class_table, class_time: List[Dict[str, str]]) -> List[Block]:
+    """personal_class_table的(課表, 節次時間)切成區塊，value是(課名, 老師, 教室)"""
+    starts = [parse_minutes(t['start_at']) for t in class_time]
+    ends = [parse_minutes(t['end_at']) for t in class_time]
+    blocks = []
+    for day_index, day_classes in enumerate(class_table):
+        if not any(day_classes):
+            continue
+        blocks.extend(day_blocks(day_index + 1, [course_key(c) for c in day_classes], starts, ends))
+    return blocks
+
+
+def single_view_blocks(result: List[Dict[str, str]], day_keys: Iterable[str]) -> Dict[str, List[Block]]:
+    """get_single_class_table的結果切成區塊，{星期的key: [區塊]}，value是儲存格文字
+
+    列號是result裡的位置；分鐘數由'time'欄("08:10 - 09:00")取得。
+    """
+    starts = []
+    ends = []
+    for slot in result:
+        start_text, _, end_text = slot.get('time', '').partition('-')
+        starts.append(parse_minutes(start_text))
+        ends.append(parse_minutes(end_text))
+    return {
+        key: day_blocks(day, [slot.get(key, '') for slot in result], starts, ends)
+        for day, key in enumerate(day_keys, 1)
+    }
@@ -0,0 +1,178 @@
+import collections
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import Dict, NamedTuple, Optional
+
+from api import ClassTableURL
+
+# 預設快取位置與設定
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ntub_timetable')
+DEFAULT_TTL = 12 * 60 * 60          # 12小時後需要重新驗證
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# 寫到一半中斷留下的暫存檔，超過這麼多秒就刪掉(太新的可能是其他程式正在寫入)
+STALE_TMP_SECONDS = 60 * 60
+
+
+def cache_namespace(url: str) -> str:
+    """課表API網址對應的子資料夾名稱(主機與連接埠)，不同伺服器的回應不會混在一起"""
+    host = urllib.parse.urlsplit(url).netloc.lower() or "default"
+    return re.sub(r"[^a-z0-9.-]", "_", host)
+
+
+class CacheEntry(NamedTuple):
+    """快取的一筆原始回應"""
+    text: str
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+
+class ResponseCache:
+    """把課表API的原始回應存在硬碟上，以(學號, 星期)為鍵
+
+    - 每個伺服器(url的主機)各有一個子資料夾，假伺服器(NTUB_HOST)的回應不會跟學校的混在一起
+    - 超過ttl秒的資料視為過期，會重新向伺服器驗證或下載
+    - 總大小超過max_bytes時，依最近使用時間(LRU)刪除最舊的檔案
+    - 寫入時先寫暫存檔再os.replace，中途當掉也不會留下寫一半的檔案；留下的暫存檔下次啟動時刪除
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR,
+                 ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 url: str = ClassTableURL):
+        self.url = url
+        self.namespace = cache_namespace(url)
+        directory = os.path.join(directory, self.namespace)
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # 檔名 -> 檔案大小，依最近使用時間排序(最舊的在前面)
+        self._index: "collections.OrderedDict[str, int]" = collections.OrderedDict()
+        self._total = 0
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                self._remove_stale_tmp(name, now)
+                continue
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(files):
+            self._index[name] = size
+            self._total += size
+
+    def _remove_stale_tmp(self, name: str, now: float):
+        path = os.path.join(self.directory, name)
+        try:
+            if now - os.stat(path).st_mtime > STALE_TMP_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _filename(student_id: str, today: int) -> str:
+        # 學號只會是數字，其他字元一律雜湊避免變成奇怪的路徑
+        if not student_id.isdigit():
+            student_id = hashlib.sha1(student_id.encode("utf-8")).hexdigest()
+        return f"{student_id}_{today}.json"
+
+    def get(self, student_id: str, today: int) -> Optional[CacheEntry]:
+        """讀取快取(包含已過期的)，沒有資料時回傳None"""
+        name = self._filename(student_id, today)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = CacheEntry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+        with self._lock:
+            if name in self._index:
+                self._index.move_to_end(name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, student_id: str, today: int, text: str,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> CacheEntry:
+        """寫入一筆回應"""
+        entry = CacheEntry(text, time.time(), etag, last_modified)
+        self._write(self._filename(student_id, today), entry)
+        return entry
+
+    def revalidated(self, student_id: str, today: int, entry: CacheEntry) -> CacheEntry:
+        """伺服器回覆304(內容沒變)時更新取得時間"""
+        entry = entry._replace(fetched_at=time.time())
+        self._write(self._filename(student_id, today), entry)
+        return entry
+
+    def conditional_headers(self, entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """依快取內容產生重新驗證用的標頭"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def _write(self, name: str, entry: CacheEntry):
+        data = json.dumps(entry._asdict(), ensure_ascii=False).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self._total += len(data) - self._index.pop(name, 0)
+            self._index[name] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def clear(self):
+        """刪除所有快取"""
+        with self._lock:
+            for name in self._index:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._total = 0
@@ -0,0 +1,273 @@
+"""不需要視窗的命令列工具：查詢多位學生的課表，輸出JSON lines、CSV或ics
+
+    python codes/cli.py 11200001 11200002
+    python codes/cli.py -i ids.txt --format csv -o timetable.csv
+    cat ids.txt | python codes/cli.py --format ics -o calendars/ --until 2027-01-20
+
+學號可以寫在參數、檔案(-i，可以重複)或從stdin讀(參數寫"-"，或完全沒有指定學號時)。
+每完成一位學生就輸出一筆(順序不保證)，統計資料印到stderr；
+有任何學生失敗(查詢錯誤或查無此人)時結束代碼為1，適合在cron或shell pipeline裡使用。
+--time-limit限制每位學生最多等幾秒；加上--partial時，部分星期沒有取得的學生仍然輸出
+(JSON的missing_days列出缺少的星期)，但結束代碼一樣是1。
+"""
+import argparse
+import contextlib
+import csv
+import datetime
+import json
+import os
+import sys
+from typing import IO, Iterable, Iterator, List, Optional
+
+import metrics
+from batch import DEFAULT_WORKERS, BatchStats, StudentResult, batch_class_tables
+from batch_export import calendar_filename
+from cache import DEFAULT_CACHE_DIR, DEFAULT_TTL, ResponseCache
+from client import ClassTableClient
+from deadline import Deadline
+from hedge import Hedger, RetryPolicy
+from limiter import AimdLimiter
+from ics import write_ics
+from table import (ALL_DAYS, WEEKDAYS, build_mix_class_table, build_single_class_table, missing_days,
+                   with_weekend_if_empty)
+
+FORMATS = ("jsonl", "csv", "ics")
+VIEWS = ("single", "mix")
+SINGLE_COLUMNS = ["student_id", "time", "monday", "tuesday", "wednesday", "thursday", "friday"]
+MIX_COLUMNS = ["student_id", "day", "start", "end", "class", "teacher", "place", "periods"]
+
+
+def iter_student_ids(ids: List[str], files: List[str], stdin: IO[str]) -> Iterator[str]:
+    """依序產出參數、檔案與stdin裡的學號(一行一個，略過空行與#開頭的註解)
+
+    只讀需要的部分，stdin還在寫入時也可以邊讀邊查詢。
+    """
+    def from_lines(lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+    if not ids and not files:
+        ids = ["-"]
+    for student_id in ids:
+        if student_id == "-":
+            yield from from_lines(stdin)
+        else:
+            yield student_id
+    for path in files:
+        if path == "-":
+            yield from from_lines(stdin)
+            continue
+        with open(path, encoding="utf-8") as f:
+            yield from from_lines(f)
+
+
+def build_view(result: StudentResult, view: str, partial: bool = False):
+    """由查詢結果產生課表(single)或行事曆格式(mix)；查無此人時回傳"無此人" """
+    if view == "single":
+        return build_single_class_table(result.class_table, result.class_time, result.error_list, partial)
+    return build_mix_class_table(result.class_table, result.class_time, result.error_list, partial)
+
+
+def student_error(result: StudentResult, timetable, partial: bool = False) -> Optional[str]:
+    if result.error_list and not partial:
+        return "; ".join(str(e) for e in result.error_list)
+    if timetable == "無此人":
+        return "查無此人或沒有選課"
+    return None
+
+
+class _JsonLinesOutput:
+    def __init__(self, out: IO[str], view: str):
+        self.out = out
+        self.view = view
+
+    def write(self, result: StudentResult, timetable, error: Optional[str]):
+        self.out.write(json.dumps({
+            "student_id": result.student_id,
+            "ok": error is None,
+            "view": self.view,
+            "timetable": None if error else timetable,
+            "error": error,
+            "missing_days": missing_days(result.error_list),
+            "elapsed": round(result.elapsed, 3),
+        }, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+
+class _CsvOutput:
+    """single：每位學生每個時間槽一列；mix：每堂課(合併後的區塊)一列。失敗的學生不輸出"""
+
+    def __init__(self, out: IO[str], view: str):
+        self.out = out
+        self.view = view
+        self.writer = csv.writer(out)
+        self.writer.writerow(SINGLE_COLUMNS if view == "single" else MIX_COLUMNS)
+
+    def write(self, result: StudentResult, timetable, error: Optional[str]):
+        if error:
+            return
+        if self.view == "single":
+            for slot in timetable:
+                self.writer.writerow([result.student_id] + [slot.get(key, "") for key in SINGLE_COLUMNS[1:]])
+        else:
+            for i in range(len(timetable["class"])):
+                self.writer.writerow([
+                    result.student_id, timetable["day"][i], timetable["start"][i], timetable["end"][i],
+                    timetable["class"][i], timetable["teacher"][i], timetable["place"][i],
+                    " ".join(str(p) for p in timetable["periods"][i]),
+                ])
+        self.out.flush()
+
+
+class _IcsOutput:
+    """每位學生寫一個<學號>.ics到資料夾，stdout輸出寫好的檔案路徑"""
+
+    def __init__(self, directory: str, until_date: Optional[datetime.date], out: IO[str]):
+        self.directory = directory
+        self.until_date = until_date
+        self.out = out
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, result: StudentResult, timetable, error: Optional[str]):
+        if error:
+            return
+        path = os.path.join(self.directory, calendar_filename(result.student_id))
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                write_ics(f, timetable, self.until_date)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # 不要留下寫一半的暫存檔
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        self.out.write(path + "\n")
+        self.out.flush()
+
+
+def make_client(args) -> ClassTableClient:
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ResponseCache(args.cache_dir or DEFAULT_CACHE_DIR, ttl=args.cache_ttl)
+    # --adaptive：--workers是上限，實際同時請求數依伺服器的回應調整
+    limiter = AimdLimiter(max_limit=args.workers, name="cli") if args.adaptive else None
+    hedger = Hedger(max_workers=args.workers * 2) if args.hedge else None
+    return ClassTableClient(pool_size=args.workers, cache=cache, limiter=limiter,
+                            retry=RetryPolicy(attempts=args.retries + 1), hedger=hedger)
+
+
+def run(student_ids: Iterable[str], writer, view: str, client: ClassTableClient,
+        workers: int, stats: BatchStats, errors: IO[str],
+        time_limit: Optional[float] = None, partial: bool = False) -> int:
+    """查詢並輸出，回傳失敗(含只取得部分星期)的學生數"""
+    failed = 0
+    days = WEEKDAYS if view == "single" else ALL_DAYS
+    for result in batch_class_tables(student_ids, max_workers=workers, client=client,
+                                     stats=stats, days=days, time_limit=time_limit):
+        if view == "single":
+            # 週一到週五都沒課時補抓週末，只有週末有課的學生不算查無此人
+            class_table, class_time, error_list = with_weekend_if_empty(
+                result.student_id, result.class_table, result.class_time, result.error_list, client,
+                deadline=Deadline(time_limit) if time_limit is not None else None)
+            result = result._replace(class_table=class_table, class_time=class_time, error_list=error_list)
+        timetable = None if result.error_list and not partial else build_view(result, view, partial)
+        error = student_error(result, timetable, partial)
+        if error:
+            failed += 1
+            print(f"{result.student_id}: {error}", file=errors, flush=True)
+        elif result.error_list:
+            # --partial：照樣輸出，缺少的星期印到stderr
+            failed += 1
+            print(f"{result.student_id}: 只取得部分課表 ({'; '.join(str(e) for e in result.error_list)})",
+                  file=errors, flush=True)
+        writer.write(result, timetable, error)
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="查詢NTUB課表(不需要視窗)")
+    parser.add_argument("ids", nargs="*", help='學號，"-"表示從stdin讀取(沒有指定學號時也從stdin讀)')
+    parser.add_argument("-i", "--input", action="append", default=[], metavar="FILE",
+                        help="學號清單檔案(一行一個)，可以重複指定")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--view", choices=VIEWS, default="mix",
+                        help="jsonl/csv的內容：single=課表時間格, mix=合併後的課(預設)")
+    parser.add_argument("-o", "--output", help="jsonl/csv的輸出檔(預設stdout)；ics的輸出資料夾(必填)")
+    parser.add_argument("--until", type=datetime.date.fromisoformat,
+                        help="ics重複到這一天(YYYY-MM-DD)，預設無限重複")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="同時送出的請求數")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="依學校伺服器的回應速度與錯誤自動調整同時請求數(最多--workers)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="每一天逾時、連線錯誤或伺服器過載時重試幾次(隨機間隔)")
+    parser.add_argument("--hedge", action="store_true",
+                        help="回應比最近的p95慢時另外送一個相同的請求，先回來的為準")
+    parser.add_argument("--time-limit", type=float, metavar="SECONDS",
+                        help="每位學生最多等幾秒(含排隊)，到期還沒回來的星期當成失敗")
+    parser.add_argument("--partial", action="store_true",
+                        help="部分星期失敗時仍輸出取得的部分(JSON的missing_days列出缺少的星期)")
+    parser.add_argument("--cache", action="store_true", help="使用硬碟快取")
+    parser.add_argument("--cache-dir", help=f"快取資料夾(預設{DEFAULT_CACHE_DIR}，指定時自動啟用快取)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL, help="快取幾秒後過期")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不要在stderr印出統計資料")
+    parser.add_argument("--log-level", help="DEBUG/INFO/WARNING/ERROR(預設NTUB_LOG_LEVEL或WARNING)")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="結束時輸出各階段耗時：.json是JSON摘要，其他是Prometheus文字格式")
+    args = parser.parse_args(argv)
+    metrics.configure_logging(args.log_level)
+
+    if args.format == "ics" and not args.output:
+        parser.error("--format ics 需要用 -o 指定輸出資料夾")
+    if args.format == "ics" and args.view != "mix":
+        parser.error("--format ics 只能用行事曆格式(--view mix)")
+    if args.workers < 1:
+        parser.error("--workers 至少要是1")
+    if args.retries < 0:
+        parser.error("--retries 不能是負數")
+    if args.time_limit is not None and args.time_limit <= 0:
+        parser.error("--time-limit 必須大於0")
+
+    if not args.ids and not args.input and sys.stdin.isatty():
+        # 直接在終端機執行時跟以前一樣詢問一個學號
+        student_ids: Iterable[str] = [input("請輸入學號: ").strip()]
+    else:
+        student_ids = iter_student_ids(args.ids, args.input, sys.stdin)
+
+    stats = BatchStats()
+    client = make_client(args)
+    with contextlib.ExitStack() as stack:
+        if args.format == "ics":
+            writer = _IcsOutput(args.output, args.until, sys.stdout)
+        else:
+            out = sys.stdout
+            if args.output and args.output != "-":
+                out = stack.enter_context(open(args.output, "w", encoding="utf-8", newline=""))
+            writer = (_JsonLinesOutput if args.format == "jsonl" else _CsvOutput)(out, args.view)
+        try:
+            failed = run(student_ids, writer, args.view, client, args.workers, stats, sys.stderr,
+                         args.time_limit, args.partial)
+        except BrokenPipeError:
+            # 輸出接到head之類提早結束的程式：停止查詢，不要印出堆疊
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            return 1
+        finally:
+            client.close()
+
+    if args.metrics:
+        metrics.write_metrics(args.metrics)
+    if not args.quiet:
+        summary = stats.as_dict()
+        if client.limiter is not None:
+            summary["limiter"] = client.limiter.as_dict()
+        if client.hedger is not None:
+            summary["hedge"] = client.hedger.as_dict()
+        print(json.dumps(summary), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+import metrics
+from api import ClassTableURL
+from cache import CacheEntry, ResponseCache, cache_namespace
+from deadline import Deadline, DeadlineExceeded
+from hedge import Hedger, RetryPolicy, is_retryable
+from limiter import AimdLimiter, is_overload_status
+
+log = metrics.get_logger("client")
+
+# 課表API需要的標頭
+DEFAULT_HEADERS = {
+    "Content-Type": "application/x-www-form-urlencoded",
+    "X-Requested-With": "com.hanglong.NTUBStdApp"
+}
+
+# (連線逾時, 讀取逾時) 秒
+DEFAULT_TIMEOUT: Tuple[float, float] = (5.0, 20.0)
+DEFAULT_POOL_SIZE = 16
+DEFAULT_RETRIES = 2
+
+
+# 目前執行緒這次請求花在建立連線的秒數(連線是在送出請求的同一個執行緒建立的)
+_connect_time = threading.local()
+
+
+def _add_connect_time(seconds: float):
+    _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + seconds
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """記錄建立連線時間的HTTPAdapter(requests本身只有從送出到收到標頭的總時間)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class ClassTableClient:
+    """共用的課表HTTP客戶端
+
+    持有一個固定大小的連線池並保持連線(keep-alive)，
+    多個執行緒可以同時使用同一個實例，不必每次請求都重新建立TCP/TLS連線。
+    """
+
+    def __init__(self,
+                 url: str = ClassTableURL,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES,
+                 backoff: float = 0.3,
+                 cache: Optional[ResponseCache] = None,
+                 limiter: Optional[AimdLimiter] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 hedger: Optional[Hedger] = None):
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = cache
+        if cache is not None and cache.namespace != cache_namespace(url):
+            # 不同伺服器的回應不能共用快取(例如NTUB_HOST指到假伺服器時)
+            raise ValueError(f"快取屬於 {cache.url}，不能用在 {url}")
+        # 有設定時，同時送出的請求數由limiter依伺服器的回應調整(上限不要超過pool_size)
+        self.limiter = limiter
+        # 每一天的請求失敗時整個重新查詢(含讀取內容)；urllib3的重試只涵蓋連線與標頭。
+        # 有設定時不再使用urllib3的重試，兩層一起重試次數會相乘
+        self.retry = retry
+        # 有設定時，太慢的請求會另外送一個對沖請求，先回來的為準
+        self.hedger = hedger
+
+        # 課表查詢不會改變伺服器狀態，所以POST也可以安全重試
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        self.session = self._new_session(retry)
+        # 有retry或deadline的請求不在urllib3內部重試，只由fetch_schedule重試(會檢查剩下的時間)：
+        # 兩層一起重試時次數會相乘，而且一個請求最多會花掉(retries+1)倍的縮短後逾時
+        self._no_retry_session = self._new_session(0)
+
+    def _new_session(self, max_retries: Union[int, Retry]) -> requests.Session:
+        # pool_block=True: 連線池滿了就等待，而不是另外開新連線
+        adapter = _TimedAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                max_retries=max_retries, pool_block=True)
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def post_schedule(self, student_id: str, today: int,
+                      headers: Optional[Dict[str, str]] = None,
+                      stream: bool = False,
+                      timeout: Optional[Union[float, Tuple[float, float]]] = None,
+                      retries: bool = True) -> requests.Response:
+        """查詢某學號某一天(1~7)的課表，回傳原始的Response
+
+        stream=True時收到標頭就回傳，內容在讀取response.content/text時才下載。
+        timeout未指定時使用self.timeout。retries=False時不使用urllib3的內部重試。
+        """
+        data = {"StdNo": student_id, "today": str(today)}
+        session = self.session if retries else self._no_retry_session
+        return session.post(self.url, data=data, headers=headers,
+                                 timeout=self.timeout if timeout is None else timeout, stream=stream)
+
+    def fetch_schedule(self, student_id: str, today: int, refresh: bool = False,
+                       deadline: Optional[Deadline] = None) -> str:
+        """查詢某學號某一天的課表HTML，有設定快取時優先使用快取
+
+        refresh=True時略過快取直接向伺服器下載(下載結果仍會寫回快取)。
+        有deadline時逾時、重試與對沖都不會超過剩下的時間，到期時丟出DeadlineExceeded。
+        """
+        cache = self.cache
+        entry = None
+        if cache is not None and not refresh:
+            entry = cache.get(student_id, today)
+            if entry is not None and entry.is_fresh(cache.ttl):
+                metrics.increment("requests", result="cache_hit")
+                return entry.text
+
+        retry = self.retry
+        attempts = retry.attempts if retry is not None else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                if self.hedger is not None:
+                    timeout = deadline.remaining() if deadline is not None else None
+                    return self.hedger.call(self._download, student_id, today, entry, deadline, timeout=timeout)
+                return self._download(student_id, today, entry, deadline)
+            except Exception as e:
+                if isinstance(e, DeadlineExceeded) or (deadline is not None and deadline.expired()):
+                    metrics.increment("deadline_exceeded")
+                    if isinstance(e, DeadlineExceeded):
+                        raise
+                    # 縮短後的逾時造成的錯誤，報告成超過時間限制
+                    raise DeadlineExceeded(f"超過 {deadline.seconds:g} 秒的時間限制") from e
+                if attempt >= attempts or not is_retryable(e):
+                    raise
+                delay = retry.backoff(attempt)
+                if deadline is not None and delay >= deadline.remaining():
+                    # 等完就沒時間了，直接回報這次的錯誤
+                    raise
+                metrics.increment("retries")
+                log.info("day %s of %s failed (%s), retry %d in %.2fs", today, student_id, e, attempt, delay)
+                time.sleep(delay)
+
+    def _download(self, student_id: str, today: int, entry: Optional[CacheEntry],
+                  deadline: Optional[Deadline] = None) -> str:
+        """向伺服器查詢一次(不看快取)；entry是過期的快取，用來送條件式請求"""
+        cache = self.cache
+        headers = cache.conditional_headers(entry) if cache is not None else None
+        if deadline is not None:
+            deadline.check()
+        limiter = self.limiter
+        if limiter is not None:
+            if not limiter.acquire(deadline.remaining() if deadline is not None else None):
+                raise DeadlineExceeded("等待送出請求時超過時間限制")
+        _connect_time.seconds = 0.0
+        start = time.perf_counter()
+        overloaded = False
+        try:
+            timeout = self.timeout
+            if deadline is not None:
+                # 等待limiter的空位也花掉了時間，所以在這裡才計算
+                deadline.check()
+                timeout = deadline.clip(timeout)
+            response = self.post_schedule(student_id, today, headers=headers, stream=True,
+                                          timeout=timeout, retries=deadline is None and self.retry is None)
+            headers_at = time.perf_counter()
+            # 錯誤回應的內容也先讀完，連線才能放回連線池
+            text = response.text
+            # urllib3在內部重試過5xx或連線錯誤時也算過載，即使最後成功了
+            retries = getattr(response.raw, "retries", None)
+            overloaded = is_overload_status(response.status_code) or bool(retries and retries.history)
+        except Exception as e:
+            # 逾時與連線錯誤表示伺服器可能吃不消；其他例外跟伺服器負載無關
+            overloaded = isinstance(e, (requests.Timeout, requests.ConnectionError))
+            metrics.increment("requests", result="error")
+            raise
+        finally:
+            if limiter is not None:
+                limiter.release(not overloaded, time.perf_counter() - start)
+        done_at = time.perf_counter()
+
+        connect = _connect_time.seconds
+        metrics.observe("connect", connect)
+        metrics.observe("server", max(0.0, headers_at - start - connect))
+        metrics.observe("download", done_at - headers_at)
+        log.debug("day %s of %s: HTTP %s, %d bytes in %.1fms (connect %.1fms)",
+                  today, student_id, response.status_code, len(text),
+                  (done_at - start) * 1000, connect * 1000)
+
+        if response.status_code == 304:
+            if entry is None:
+                # 沒有送條件式請求卻回覆304，沒有內容可以用(也不能把空白寫進快取)
+                metrics.increment("requests", result="error")
+                raise requests.HTTPError("304 Not Modified (沒有送出條件式請求)", response=response)
+            metrics.increment("requests", result="not_modified")
+            return cache.revalidated(student_id, today, entry).text
+
+        if not response.ok:
+            metrics.increment("requests", result="error")
+        response.raise_for_status()  # 當HTTP請求發生錯誤時拋出異常
+        metrics.increment("requests", result="ok")
+        if cache is not None and text:
+            cache.put(student_id, today, text,
+                      response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return text
+
+    def close(self):
+        """關閉連線池"""
+        self.session.close()
+        self._no_retry_session.close()
+        if self.hedger is not None:
+            self.hedger.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def describe_error(error: Exception) -> str:
+    """給使用者看的簡短錯誤說明(requests的原始訊息很長)"""
+    if isinstance(error, DeadlineExceeded):
+        return "超過時間限制，沒有取得"
+    if isinstance(error, requests.Timeout):
+        return "學校伺服器沒有回應(逾時)"
+    if isinstance(error, requests.ConnectionError):
+        return "無法連線到學校伺服器"
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return f"學校伺服器錯誤(HTTP {error.response.status_code})"
+    return str(error) or type(error).__name__
+
+
+_default_client: Optional[ClassTableClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> ClassTableClient:
+    """取得整個程式共用的客戶端(第一次呼叫時建立)"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = ClassTableClient()
+        return _default_client
+
+
+def set_default_client(client: ClassTableClient):
+    """替換共用的客戶端，例如調整連線池大小或逾時設定"""
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
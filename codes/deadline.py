@@ -0,0 +1,48 @@
+"""每位學生的時間限制：七天的請求共用一個deadline，往下變成每個請求的逾時
+
+    deadline = Deadline(10)                  # 從現在起10秒
+    personal_class_table(student_id, client, deadline=deadline)
+
+- 每個請求的(連線, 讀取)逾時不會超過剩下的時間
+- 等待連線數上限(limiter)、重試前的等待與對沖請求都不會超過剩下的時間
+- 時間到了還沒回來的星期不再等待，記為DeadlineExceeded
+
+已經送出的請求沒辦法從外面中斷，結果直接丟掉。有deadline時不使用urllib3的內部重試，
+所以連線與每一次讀取都不會等超過縮短後的逾時(伺服器一直斷斷續續送資料時除外)。
+"""
+import time
+from typing import Tuple, Union
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class DeadlineExceeded(TimeoutError):
+    """超過時間限制"""
+
+
+class Deadline:
+    """到期的時間點(time.monotonic())"""
+    __slots__ = ("seconds", "expires_at")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """還剩幾秒(不會是負數)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self):
+        """已經到期時丟出DeadlineExceeded"""
+        if self.expired():
+            raise DeadlineExceeded(f"超過 {self.seconds:g} 秒的時間限制")
+
+    def clip(self, timeout: Timeout) -> Timeout:
+        """把requests的逾時縮短到不超過剩下的時間"""
+        remaining = self.remaining()
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
@@ -0,0 +1,311 @@
+import sys
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple, Union
+
+CLASS_MAP_KEY = ["name", "teacher", "room"]
+
+# 沒有結束標籤的元素，序列化時寫成<br/>
+VOID_ELEMENTS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+    "link", "menuitem", "meta", "param", "source", "track", "wbr", "basefont",
+    "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer",
+})
+# BeautifulSoup會把這些屬性當成以空白分隔的清單("*"表示所有標籤)
+LIST_ATTRIBUTES = {
+    "*": ("class", "accesskey", "dropzone"),
+    "a": ("rel", "rev"),
+    "link": ("rel", "rev"),
+    "td": ("headers",),
+    "th": ("headers",),
+    "form": ("accept-charset",),
+    "object": ("archive",),
+    "area": ("rel",),
+    "icon": ("sizes",),
+    "iframe": ("sandbox",),
+    "output": ("for",),
+}
+PRESERVE_WHITESPACE_TAGS = frozenset({"pre", "textarea"})
+ASCII_SPACES = str.maketrans("", "", "\x20\x0a\x09\x0c\x0d")
+
+CELL_CLASSES = {"td": "Stdtd001", "th": "Stdth003"}
+
+
+def _escape_text(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _serialize_start(tag: str, attrs, empty: bool) -> str:
+    """用跟BeautifulSoup相同的規則把開始標籤轉回HTML"""
+    list_attributes = LIST_ATTRIBUTES["*"] + LIST_ATTRIBUTES.get(tag, ())
+    values = {}
+    for key, value in attrs:
+        if value is None:
+            value = ""
+        if key in list_attributes:
+            value = " ".join(value.split())
+        values[key] = value
+
+    parts = ["<", tag]
+    for key, value in values.items():
+        value = _escape_text(value)
+        if '"' in value:
+            if "'" in value:
+                value = '"' + value.replace('"', "&quot;") + '"'
+            else:
+                value = "'" + value + "'"
+        else:
+            value = '"' + value + '"'
+        parts.append(f" {key}={value}")
+    parts.append("/>" if empty else ">")
+    return "".join(parts)
+
+
+class _OpenTag:
+    """目前開著的標籤"""
+    __slots__ = ("name", "attrs", "positions", "has_children")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        # (儲存格, 開始標籤在該儲存格HTML中的位置)
+        self.positions = []
+        self.has_children = False
+
+
+class _Cell:
+    """正在讀取的目標儲存格"""
+    __slots__ = ("tag", "depth", "html", "output", "index", "a_depth", "a_done", "a_text")
+
+    def __init__(self, tag, depth, output):
+        self.tag = tag
+        self.depth = depth
+        self.html = []
+        # 依開始標籤的順序預留輸出位置(儲存格可能巢狀)
+        self.output = output
+        self.index = len(output)
+        output.append(None)
+        self.a_depth = 0
+        self.a_done = False
+        self.a_text = []
+
+
+class ClassTableExtractor(HTMLParser):
+    """一次讀完課表回應，直接取出td.Stdtd001與th.Stdth003儲存格
+
+    不建立整棵文件樹，只有在目標儲存格裡面才會記錄內容；
+    儲存格內容依BeautifulSoup(html.parser)的規則重組，再用同樣的<br/>切割，
+    所以輸出跟personal_class_table_by_day / personal_class_table_time完全相同。
+    這也包含BeautifulSoup的小怪癖：<br>之後出現的<br/>不會被關閉，會把後面的內容包起來。
+    """
+
+    def __init__(self, with_time: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.with_time = with_time
+        self.classes: List[Optional[Dict[str, str]]] = []
+        self.times: List[Dict[str, str]] = []
+
+        # 整份文件目前開著的標籤，用來模擬BeautifulSoup處理未關閉標籤的方式
+        self._stack: List[_OpenTag] = []
+        self._open_counts: Dict[str, int] = {}
+        self._already_closed_empty: List[str] = []
+        self._data: List[str] = []
+        # 目前所在的目標儲存格(由外到內)
+        self._cells: List[_Cell] = []
+
+    # ── HTMLParser callbacks ──
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._flush_data()
+        self._add_child()
+
+        depth = len(self._stack) + 1
+        target = CELL_CLASSES.get(tag)
+        if target is not None and (tag == "td" or self.with_time):
+            classes = ""
+            for key, value in attrs:
+                if key == "class":
+                    classes = value or ""
+            if target in classes.split():
+                self._cells.append(_Cell(tag, depth, self.classes if tag == "td" else self.times))
+
+        open_tag = _OpenTag(tag, attrs)
+        if self._cells:
+            start = _serialize_start(tag, attrs, tag in VOID_ELEMENTS)
+            for cell in self._cells:
+                open_tag.positions.append((cell, len(cell.html)))
+                cell.html.append(start)
+                if tag == "a" and cell.tag == "td" and not cell.a_done and not cell.a_depth:
+                    cell.a_depth = depth
+
+        self._stack.append(open_tag)
+        self._open_counts[tag] = self._open_counts.get(tag, 0) + 1
+
+        if tag in VOID_ELEMENTS and handle_empty_element:
+            self.handle_endtag(tag, check_already_closed=False)
+            self._already_closed_empty.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed_empty:
+            self._already_closed_empty.remove(tag)
+            return
+        self._flush_data()
+        if not self._open_counts.get(tag):
+            return
+        while self._stack:
+            if self._pop() == tag:
+                break
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._flush_data()
+        self._add_child()
+        for cell in self._cells:
+            cell.html.append(f"<!--{data}-->")
+
+    def close(self):
+        super().close()
+        # 文件結尾時仍未關閉的標籤，BeautifulSoup也會自動關閉
+        self._flush_data()
+        while self._stack:
+            self._pop()
+
+    # ── 文件樹狀態 ──
+
+    def _flush_data(self):
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        # BeautifulSoup會把只有空白的字串縮成一個空白或換行
+        if not data.translate(ASCII_SPACES) and not any(
+                t.name in PRESERVE_WHITESPACE_TAGS for t in self._stack):
+            data = "\n" if "\n" in data else " "
+
+        self._add_child()
+        if not self._cells:
+            return
+        escaped = _escape_text(data)
+        depth = len(self._stack)
+        for cell in self._cells:
+            cell.html.append(escaped)
+            if cell.a_depth and depth >= cell.a_depth:
+                cell.a_text.append(data)
+
+    def _add_child(self):
+        """目前的標籤多了一個子節點；有子節點的空元素要改寫成<br>...</br>"""
+        if not self._stack:
+            return
+        parent = self._stack[-1]
+        if parent.has_children:
+            return
+        parent.has_children = True
+        if parent.positions and parent.name in VOID_ELEMENTS:
+            start = _serialize_start(parent.name, parent.attrs, False)
+            for cell, index in parent.positions:
+                cell.html[index] = start
+
+    def _pop(self) -> str:
+        open_tag = self._stack.pop()
+        name = open_tag.name
+        self._open_counts[name] -= 1
+        depth = len(self._stack) + 1
+        if self._cells:
+            end = f"</{name}>" if name not in VOID_ELEMENTS or open_tag.has_children else ""
+            for cell in self._cells:
+                cell.html.append(end)
+                if depth == cell.a_depth:
+                    cell.a_depth = 0
+                    cell.a_done = True
+            if self._cells[-1].depth == depth:
+                self._close_cell(self._cells.pop())
+        return name
+
+    # ── 儲存格處理 ──
+
+    def _close_cell(self, cell: _Cell):
+        html_content = "".join(cell.html)
+        if cell.tag == "td":
+            cell.output[cell.index] = self._class_info(html_content, "".join(cell.a_text))
+        else:
+            cell.output[cell.index] = self._time_info(html_content)
+
+    @staticmethod
+    def _class_info(html_content: str, a_text: str) -> Optional[Dict[str, str]]:
+        name = a_text.strip()
+        if name == "":
+            return None
+
+        class_info = html_content.split("<br/>")
+        class_info[0] = name
+
+        class_dict = {}
+        for i in range(min(3, len(class_info))):
+            class_dict[CLASS_MAP_KEY[i]] = class_info[i]
+
+        # 修復多教師時教室顯示異常的問題
+        if "room" in class_dict and class_dict["room"] and "<" in class_dict["room"]:
+            class_dict["room"] = class_dict["room"].split("<")[0]
+
+        return class_dict
+
+    @staticmethod
+    def _time_info(html_content: str) -> Dict[str, str]:
+        time_info = html_content.split("<br/>")
+        while len(time_info) < 3:
+            time_info.append("")
+        return {
+            "class_no": time_info[0],
+            "start_at": time_info[1],
+            "end_at": time_info[2]
+        }
+
+
+def extract_class_table_day(html: Union[str, bytes],
+                            with_time: bool = True) -> Tuple[List[Optional[Dict[str, str]]], List[Dict[str, str]]]:
+    """解析某一天的課表HTML，回傳(當天課程, 節次時間)"""
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    extractor = ClassTableExtractor(with_time)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.classes, extractor.times
+
+
+def compare_with_bs4(html: Union[str, bytes]) -> List[str]:
+    """比對串流解析器與BeautifulSoup版本的輸出，回傳不一致的地方(空清單表示一致)"""
+    from table import parse_class_table_day
+
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    expected = parse_class_table_day(html, backend="bs4")
+    actual = extract_class_table_day(html)
+
+    differences = []
+    for label, want, got in zip(("classes", "times"), expected, actual):
+        if len(want) != len(got):
+            differences.append(f"{label}: 數量不同 {len(want)} != {len(got)}")
+        for i, (a, b) in enumerate(zip(want, got)):
+            if a != b:
+                differences.append(f"{label}[{i}]: {a!r} != {b!r}")
+    return differences
+
+
+if __name__ == "__main__":
+    # python extract.py 回應1.html 回應2.html ... 檢查兩種解析方式的輸出是否相同
+    failed = 0
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            differences = compare_with_bs4(f.read())
+        if differences:
+            failed += 1
+            print(f"{path}: 不一致")
+            for line in differences:
+                print(f"  {line}")
+    print(f"{len(sys.argv) - 1 - failed}/{len(sys.argv) - 1} 一致")
+    sys.exit(1 if failed else 0)
@@ -1,10 +1,15 @@
 
 from tkinter import *
 from tkinter import ttk, filedialog # --- 1. 匯入 filedialog ---
-from tkcalendar import DateEntry
-from table import get_single_class_table, get_mix_class_table
+from tkinter import font as tkfont
+# 網路(requests)、解析與日曆元件(tkcalendar)的模組載入很慢，
+# 視窗先畫出來，再由warm_imports在背景載入，真正用到時才在函式裡import
+from layout import LAYERS, FontFitter, grid_metrics, layout_error, layout_mix, layout_single
 import datetime
 import os
+import queue
+import threading
+import time
 
 # ── Material Design 配色 ──
 MD_PRIMARY     = "#6200EE"   # Deep Purple
@@ -16,7 +21,35 @@ MD_DISABLED_BG = "#E0E0E0"
 MD_DISABLED_FG = "#9E9E9E"
 MD_ACCENT      = "#03DAC6"
 
+class TkMeasurer:
+    """用Tk的字型實際量字寬，給layout.FontFitter用；字寬依(字型, 大小, 字)記住"""
+
+    def __init__(self, master):
+        self.master = master
+        self._fonts = {}
+        self._widths = {}
+
+    def _font(self, family, size):
+        font = self._fonts.get((family, size))
+        if font is None:
+            font = self._fonts[(family, size)] = tkfont.Font(root=self.master, family=family, size=size)
+        return font
+
+    def char_width(self, char, family, size):
+        key = (family, size, char)
+        width = self._widths.get(key)
+        if width is None:
+            width = self._widths[key] = self._font(family, size).measure(char)
+        return width
+
+    def line_height(self, family, size):
+        return self._font(family, size).metrics("linespace")
+
+
 class TimetableCanvas:
+    # 視窗大小改變後等這麼久沒有再改變才重畫(毫秒)
+    RESIZE_DELAY_MS = 100
+
     def __init__(self, master, width=1100, height=600):
         self.master = master
         self.width = width
@@ -48,362 +81,169 @@ class TimetableCanvas:
         self.v_scrollbar.config(command=self.canvas.yview)
         self.h_scrollbar.config(command=self.canvas.xview)
         
-        # 儲存格資料
-        self.cells = {}
-        self.merged_cells = {}
+        # 保留目前畫面上的項目：key -> (item id, 種類, 座標, 選項)
+        # 重畫時只更新有變動的項目，不再需要的項目隱藏起來放進_spare重複使用
+        self._items = {}
+        self._spare = {"line": [], "rectangle": [], "text": []}
+        self._scene = {}
+        self._scrollregion = None
+        
+        # 字體大小用實際量測的字寬決定，結果依(文字, 字型, 儲存格大小)記住
+        self.fitter = FontFitter(TkMeasurer(master))
+        # 目前顯示的內容(版面函式, 參數)，視窗大小改變時用來重畫
+        self._shown = None
+        self._resize_job = None
+        self.canvas.bind("<Configure>", self.on_resize)
         
         # 自適應設置
         self.set_adaptive_sizes()
         
     def set_adaptive_sizes(self):
-        """根據畫布大小設置自適應的儲存格尺寸"""
-        # 設置時間列寬度為畫布寬度的12%
-        self.left_margin = int(self.width * 0.12)
-        
-        # 設置表頭高度為畫布高度的8%
-        self.top_margin = int(self.height * 0.08)
-        
-        # 假設最多有5個工作日和8個時間段
-        max_days = 6  # 包含時間列
-        max_times = 8
-        
-        # 計算適合的儲存格尺寸
-        self.cell_width = int((self.width - self.left_margin) / (max_days - 1))
-        self.cell_height = int((self.height - self.top_margin) / max_times)
-        
-        # 目前的資料
-        self.days = []
-        self.time_slots = []
-        
+        """根據畫布大小設置自適應的儲存格尺寸(計算方式在layout.grid_metrics)"""
+        self.left_margin, self.top_margin, self.cell_width, self.cell_height = grid_metrics(self.width, self.height)
+        
+    ITEM_DEFAULTS = {
+        "line": {"fill": "black", "width": 1},
+        "rectangle": {"fill": "", "outline": "black"},
+        "text": {"text": "", "font": ("Iansui", 10), "fill": "black", "width": 0},
+    }
+
+    def begin_scene(self):
+        """開始描述新的畫面，commit_scene()時才真正更新畫布"""
+        self._scene = {}
+
+    def add_item(self, key, kind, coords, layer, **options):
+        """把一個項目放進這次的畫面，key相同的項目在重畫時會沿用同一個item"""
+        full = dict(self.ITEM_DEFAULTS[kind])
+        full.update(options)
+        full["tags"] = (layer,)
+        full["state"] = "normal"
+        self._scene[key] = (kind, tuple(coords), full)
+
+    def commit_scene(self, scrollregion=None):
+        """比較新舊畫面，只對有變動的項目呼叫coords/itemconfigure"""
+        canvas = self.canvas
+        restacked = False
+
+        # 先收回不再需要的項目，這次新增的項目才能直接拿來用
+        for key in [key for key in self._items if key not in self._scene]:
+            self._release(self._items.pop(key))
+
+        for key, (kind, coords, options) in self._scene.items():
+            current = self._items.get(key)
+            if current is not None and current[1] == kind:
+                item_id, _, old_coords, old_options = current
+                if coords != old_coords:
+                    canvas.coords(item_id, *coords)
+                changed = {name: value for name, value in options.items() if old_options.get(name) != value}
+                if changed:
+                    canvas.itemconfigure(item_id, **changed)
+                    restacked = restacked or "tags" in changed
+            else:
+                if current is not None:
+                    self._release(current)
+                spare = self._spare[kind]
+                if spare:
+                    item_id = spare.pop()
+                    canvas.coords(item_id, *coords)
+                    canvas.itemconfigure(item_id, **options)
+                else:
+                    create = getattr(canvas, f"create_{kind}")
+                    item_id = create(*coords, **options)
+                restacked = True
+            self._items[key] = (item_id, kind, coords, options)
+
+        # 重複使用或新建的項目可能疊在錯的位置，依圖層重新排好
+        if restacked:
+            for layer in LAYERS:
+                canvas.tag_raise(layer)
+
+        if scrollregion is not None and scrollregion != self._scrollregion:
+            canvas.config(scrollregion=scrollregion)
+            self._scrollregion = scrollregion
+
+    def _release(self, item):
+        item_id, kind, _, _ = item
+        self.canvas.itemconfigure(item_id, state="hidden")
+        self._spare[kind].append(item_id)
+
     def clear_canvas(self):
-        """清除畫布上的所有內容"""
-        self.canvas.delete("all")
-        self.cells = {}
-        self.merged_cells = {}
-    
-    def set_days(self, days):
-        """設置星期幾的標題"""
-        self.days = days
-        self.draw_headers()
-    
-    def draw_headers(self):
-        """繪製表頭"""
-        # 設置畫布捲動區域
-        total_width = self.left_margin + (len(self.days) - 1) * self.cell_width
-        total_height = self.cell_height * len(self.time_slots) + self.top_margin
-        self.canvas.config(scrollregion=(0, 0, total_width, total_height))
-        
-        # 繪製表頭背景
-        self.canvas.create_rectangle(
-            0, 0, total_width, self.top_margin, 
-            fill="#e0e0e0", outline="black"
-        )
-        
-        # 繪製時間列標題 (調整字體大小)
-        header_font_size = max(10, min(12, int(self.top_margin / 3)))
-        self.canvas.create_text(
-            self.left_margin / 2, self.top_margin / 2,
-            text=self.days[0], font=("Iansui", header_font_size, "bold")
-        )
-        
-        # 繪製星期幾標題
-        for i, day in enumerate(self.days[1:], 1):
-            x = self.left_margin + (i - 1) * self.cell_width + self.cell_width / 2
-            self.canvas.create_text(
-                x, self.top_margin / 2,
-                text=day, font=("Iansui", header_font_size, "bold")
-            )
+        """清除畫布上的所有內容(項目隱藏起來留著下次使用)"""
+        self._shown = None
+        self.begin_scene()
+        self.commit_scene()
     
-    def draw_grid(self):
-        """繪製表格網格"""
-        # 計算表格總寬度和高度
-        total_width = self.left_margin + (len(self.days) - 1) * self.cell_width
-        total_height = self.top_margin + len(self.time_slots) * self.cell_height
-        
-        # 設置畫布捲動區域
-        self.canvas.config(scrollregion=(0, 0, total_width, total_height))
-        
-        # 繪製垂直網格線
-        for i in range(len(self.days)):
-            x = self.left_margin + i * self.cell_width
-            self.canvas.create_line(
-                x, self.top_margin, x, total_height,
-                fill="black", width=1
-            )
-        
-        # 繪製水平網格線
-        for i in range(len(self.time_slots) + 1):
-            y = self.top_margin + i * self.cell_height
-            self.canvas.create_line(
-                0, y, total_width, y,
-                fill="black", width=1
-            )
-            
-    def draw_time_slots(self, time_slots):
-        """繪製時間槽"""
-        self.time_slots = time_slots
-        
-        # 繪製網格
-        self.draw_grid()
-        
-        # 調整字體大小
-        time_font_size = max(8, min(10, int(self.left_margin / 10)))
-        
-        # 繪製時間欄
-        for i, time_slot in enumerate(time_slots):
-            y = self.top_margin + i * self.cell_height + self.cell_height / 2
-            self.canvas.create_text(
-                self.left_margin / 2, y,
-                text=time_slot, font=("Iansui", time_font_size),
-                width=self.left_margin - 10  # 設置文字換行寬度
-            )
-            
-    def set_cell_content(self, row, col, content):
-        """設置儲存格內容"""
-        # 計算儲存格位置
-        x1 = self.left_margin + (col - 1) * self.cell_width
-        y1 = self.top_margin + row * self.cell_height
-        x2 = x1 + self.cell_width
-        y2 = y1 + self.cell_height
-        
-        # 創建儲存格 ID
-        cell_id = f"cell_{row}_{col}"
-        
-        # 檢查是否已經有內容
-        if cell_id in self.cells:
-            # 刪除舊內容
-            self.canvas.delete(self.cells[cell_id])
-            
-        # 調整字體大小
-        font_size = self.calculate_font_size(content, self.cell_width - 10, self.cell_height - 10)
-            
-        # 創建新內容
-        text_id = self.canvas.create_text(
-            (x1 + x2) / 2, (y1 + y2) / 2,
-            text=content, font=("Iansui", font_size),
-            width=self.cell_width - 10,  # 設置文字換行寬度
-            tags=cell_id
-        )
-        
-        self.cells[cell_id] = text_id
-    
-    def calculate_font_size(self, text, max_width, max_height):
-        """根據文字長度和儲存格大小計算適合的字體大小"""
-        # 基礎字體大小
-        base_size = 10
-        
-        # 如果文字較長，減小字體
-        text_length = len(text)
-        lines = text.count('\n') + 1
-        
-        if text_length > 30 or lines > 2:
-            return max(8, base_size - 2)
-        elif text_length > 15 or lines > 1:
-            return max(9, base_size - 1)
+    def on_resize(self, event):
+        """畫布大小改變：重新計算儲存格大小，字體大小的快取作廢，稍後重畫"""
+        if (event.width, event.height) == (self.width, self.height):
+            return
+        self.width, self.height = event.width, event.height
+        self.set_adaptive_sizes()
+        self.fitter.clear()
+        if self._resize_job is not None:
+            self.canvas.after_cancel(self._resize_job)
+        self._resize_job = self.canvas.after(self.RESIZE_DELAY_MS, self._redraw)
+
+    def _redraw(self):
+        self._resize_job = None
+        if self._shown is not None:
+            build, arg = self._shown
+            self._show(build, arg)
+
+    def _show(self, build, arg):
+        self._shown = (build, arg)
+        if build is layout_error:
+            self.show_layout(layout_error(arg, self.width, self.height))
         else:
-            return base_size
-        
-    def merge_cells(self, start_row, end_row, col, content):
-        """合併儲存格"""
-        # 計算合併儲存格位置
-        x1 = self.left_margin + (col - 1) * self.cell_width
-        y1 = self.top_margin + start_row * self.cell_height
-        x2 = x1 + self.cell_width
-        y2 = self.top_margin + (end_row + 1) * self.cell_height
-        
-        # 創建合併儲存格 ID
-        merge_id = f"merge_{start_row}_{end_row}_{col}"
-        
-        # 清除要合併的儲存格
-        for row in range(start_row, end_row + 1):
-            cell_id = f"cell_{row}_{col}"
-            if cell_id in self.cells:
-                self.canvas.delete(self.cells[cell_id])
-                del self.cells[cell_id]
-                
-        # 創建合併儲存格外框
-        rect_id = self.canvas.create_rectangle(
-            x1, y1, x2, y2,
-            fill="white", outline="black",
-            tags=merge_id
-        )
-        
-        # 調整字體大小
-        cell_height = y2 - y1
-        font_size = self.calculate_font_size(content, self.cell_width - 10, cell_height - 10)
-        
-        # 創建文字
-        text_id = self.canvas.create_text(
-            (x1 + x2) / 2, (y1 + y2) / 2,
-            text=content, font=("Iansui", font_size),
-            width=self.cell_width - 10,  # 設置文字換行寬度
-            tags=merge_id
-        )
-        
-        self.merged_cells[merge_id] = (rect_id, text_id)
-        
+            self.show_layout(build(arg, self.width, self.height, self.fitter))
+
+    def show_layout(self, layout):
+        """把layout.py算好的版面畫到畫布上(只更新有變動的項目)"""
+        self.begin_scene()
+        for item in layout.primitives:
+            self.add_item(item.key, item.kind, item.coords, item.layer, **item.options)
+        self.commit_scene(layout.scrollregion)
+
     def display_single_timetable(self, result):
         """顯示單一課表"""
-        self.clear_canvas()
-        
-        # 檢查每一天有沒有課程
-        days = ['Time']
-        if any(slot.get('monday') for slot in result):
-            days.append('Monday')
-        if any(slot.get('tuesday') for slot in result):
-            days.append('Tuesday')
-        if any(slot.get('wednesday') for slot in result):
-            days.append('Wednesday')
-        if any(slot.get('thursday') for slot in result):
-            days.append('Thursday')
-        if any(slot.get('friday') for slot in result):
-            days.append('Friday')
-            
-        self.set_days(days)
-        
-        # 只保留有課程的時間槽
-        times_with_courses = []
-        for time_slot in result:
-            if any(time_slot.get(day.lower(), '') for day in days[1:]):
-                times_with_courses.append(time_slot.get('time', ''))
-        
-        # 去除重複並排序
-        unique_times = sorted(set(times_with_courses), key=lambda x: self.time_to_minutes(x))
-        self.draw_time_slots(unique_times)
-        
-        # 繪製課程
-        for time_slot in result:
-            if any(time_slot.get(day.lower(), '') for day in days[1:]):
-                time = time_slot.get('time', '')
-                row = unique_times.index(time)
-                
-                # 對每一天檢查是否有課
-                for i, day in enumerate(days[1:], 1):
-                    content = time_slot.get(day.lower(), '')
-                    if content:
-                        self.set_cell_content(row, i, content)
-    
+        self._show(layout_single, result)
+
     def display_mix_timetable(self, result):
         """顯示混合課表（行事曆用）"""
-        self.clear_canvas()
-        
-        # 檢查每一天有沒有課程
-        days = ['Time']
-        if any(slot.get('monday') for slot in result):
-            days.append('Monday')
-        if any(slot.get('tuesday') for slot in result):
-            days.append('Tuesday')
-        if any(slot.get('wednesday') for slot in result):
-            days.append('Wednesday')
-        if any(slot.get('thursday') for slot in result):
-            days.append('Thursday')
-        if any(slot.get('friday') for slot in result):
-            days.append('Friday')
-            
-        self.set_days(days)
-        
-        # 只保留有課程的時間槽
-        times_with_courses = []
-        for time_slot in result:
-            if any(time_slot.get(day.lower(), '') for day in days[1:]):
-                times_with_courses.append(time_slot.get('time', ''))
-        
-        # 去除重複並排序
-        unique_times = sorted(set(times_with_courses), key=lambda x: self.time_to_minutes(x))
-        self.draw_time_slots(unique_times)
-        
-        # 為每一天找出連續的相同課程
-        for day_index, day in enumerate(days[1:], 1):
-            day_lower = day.lower()
-            
-            # 建立每個時間槽與課程的對應
-            time_course_map = {}
-            for time_slot in result:
-                course = time_slot.get(day_lower, '')
-                if course:
-                    time = time_slot.get('time', '')
-                    time_index = unique_times.index(time)
-                    time_course_map[time_index] = course
-            
-            # 尋找連續的課程
-            start_row = None
-            current_course = None
-            
-            for i in range(len(unique_times)):
-                if i in time_course_map:
-                    course = time_course_map[i]
-                    
-                    if course == current_course:
-                        # 課程相同，繼續累積
-                        continue
-                    else:
-                        # 新課程，結束前一個課程的合併
-                        if start_row is not None and i-1 > start_row:
-                            # 合併前一個課程的儲存格
-                            merged_content = f"{current_course}"
-                            self.merge_cells(start_row, i-1, day_index, merged_content)
-                        elif start_row is not None:
-                            # 單一時間槽，無需合併
-                            self.set_cell_content(start_row, day_index, 
-                                                 f"{current_course}")
-                        
-                        # 開始新課程
-                        start_row = i
-                        current_course = course
-                
-                elif start_row is not None:
-                    # 遇到空白課程，結束合併
-                    if i-1 > start_row:
-                        # 合併前一個課程的儲存格
-                        merged_content = f"{current_course}"
-                        self.merge_cells(start_row, i-1, day_index, merged_content)
-                    else:
-                        # 單一時間槽，無需合併
-                        self.set_cell_content(start_row, day_index, 
-                                             f"{current_course}")
-                    
-                    start_row = None
-                    current_course = None
-            
-            # 處理最後一個課程
-            if start_row is not None:
-                end_row = len(unique_times) - 1
-                if end_row > start_row:
-                    # 合併最後的課程儲存格
-                    merged_content = f"{current_course}"
-                    self.merge_cells(start_row, end_row, day_index, merged_content)
-                else:
-                    # 單一時間槽，無需合併
-                    self.set_cell_content(start_row, day_index, 
-                                         f"{current_course}")
-    
+        self._show(layout_mix, result)
+
     def display_error(self, message):
         """顯示錯誤訊息"""
-        self.clear_canvas()
-        
-        # 設置畫布大小
-        self.canvas.config(scrollregion=(0, 0, self.width, self.height))
-        
-        # 繪製錯誤訊息
-        self.canvas.create_text(
-            self.width / 2, self.height / 2,
-            text=message, font=("Iansui", 14, "bold"),
-            fill="red"
-        )
-    
-    @staticmethod
-    def time_to_minutes(time_str):
-        """將時間字符串轉換為分鐘數，用於排序"""
-        if not time_str or '-' not in time_str:
-            return 0
-        start_time = time_str.split('-')[0].strip()
-        if not start_time:
-            return 0
+        self._show(layout_error, message)
+
+# 整個視窗共用一個HTTP客戶端(連線池)，重複查詢時不必重新建立連線
+# 課表一學期才變動幾次，查過的結果存在硬碟快取裡，重開程式也不必重新下載
+http_client = None
+
+def get_http_client():
+    """第一次查詢時才建立HTTP客戶端"""
+    global http_client
+    if http_client is None:
+        from cache import ResponseCache
+        from client import ClassTableClient
+        from hedge import Hedger, RetryPolicy
+        # 七天的請求等最慢的一天：失敗時重試，太慢時另外送一次
+        http_client = ClassTableClient(pool_size=7, cache=ResponseCache(),
+                                       retry=RetryPolicy(), hedger=Hedger(max_workers=14))
+    return http_client
+
+# 在背景載入的模組(依序)，視窗出現後才開始
+WARM_MODULES = ("client", "table", "ics", "tkcalendar")
+
+def warm_imports():
+    """先把之後會用到的模組載入，按下按鈕時就不必等"""
+    import importlib
+    for name in WARM_MODULES:
         try:
-            hours, minutes = map(int, start_time.split(':'))
-            return hours * 60 + minutes
-        except:
-            return 0
+            importlib.import_module(name)
+        except ImportError:
+            # 缺少的模組等到真正用到時再顯示錯誤
+            pass
 
 # 主視窗設置
 window = Tk()
@@ -451,8 +291,8 @@ class_type = StringVar(value="單一課表")  # 預設值
 def on_class_type_change():
     """Radio 切換時控制日期選擇區的顯示/隱藏"""
     if class_type.get() == '混合課表':
-        date_frame.pack(side='right', padx=10, before=button_frame)
-    else:
+        build_date_frame().pack(side='right', padx=10, before=button_frame)
+    elif date_frame is not None:
         date_frame.pack_forget()
 
 single_class_radio = Radiobutton(type_frame, text="課表", variable=class_type, value="單一課表",
@@ -464,39 +304,13 @@ mix_class_radio = Radiobutton(type_frame, text="行事曆用課表", variable=cl
 mix_class_radio.pack(side='left', padx=5)
 
 # ── 結束日期設定（Material Design） ──
-date_frame = Frame(control_frame, bg=MD_SURFACE, bd=0, highlightthickness=0)
-# 預設隱藏，選「行事曆用課表」才顯示
+# 第一次選「行事曆用課表」時才建立(需要載入tkcalendar)
+date_frame = None
+end_date_entry = None
 
 # 預設日期 = 今天 + 18 週
 default_end_date = datetime.date.today() + datetime.timedelta(weeks=18)
 
-repeat_label = Label(date_frame, text="重複至:", font=("Iansui", 12),
-                     bg=MD_SURFACE, fg=MD_ON_SURFACE)
-repeat_label.pack(side='left')
-
-end_date_entry = DateEntry(
-    date_frame,
-    width=12,
-    year=default_end_date.year,
-    month=default_end_date.month,
-    day=default_end_date.day,
-    font=("Iansui", 11),
-    background=MD_PRIMARY,
-    foreground=MD_ON_PRIMARY,
-    headersbackground=MD_PRIMARY,
-    headersforeground=MD_ON_PRIMARY,
-    selectbackground=MD_PRIMARY_D,
-    selectforeground=MD_ON_PRIMARY,
-    normalbackground=MD_SURFACE,
-    normalforeground=MD_ON_SURFACE,
-    weekendbackground=MD_SURFACE,
-    weekendforeground=MD_ON_SURFACE,
-    bordercolor=MD_PRIMARY,
-    date_pattern='yyyy/mm/dd',
-    locale='zh_TW',
-)
-end_date_entry.pack(side='left', padx=5)
-
 # 無限重複 Checkbox
 infinite_var = BooleanVar(value=False)
 
@@ -506,13 +320,58 @@ def toggle_date_entry():
     else:
         end_date_entry.config(state='normal')
 
-infinite_check = Checkbutton(
-    date_frame, text="無限重複", variable=infinite_var,
-    font=("Iansui", 10), bg=MD_SURFACE, fg=MD_ON_SURFACE,
-    activebackground=MD_SURFACE, selectcolor=MD_SURFACE,
-    command=toggle_date_entry
-)
-infinite_check.pack(side='left', padx=5)
+def build_date_frame():
+    """建立結束日期設定區，之後重複使用同一個"""
+    global date_frame, end_date_entry
+    if date_frame is not None:
+        return date_frame
+    from tkcalendar import DateEntry
+
+    date_frame = Frame(control_frame, bg=MD_SURFACE, bd=0, highlightthickness=0)
+
+    repeat_label = Label(date_frame, text="重複至:", font=("Iansui", 12),
+                         bg=MD_SURFACE, fg=MD_ON_SURFACE)
+    repeat_label.pack(side='left')
+
+    end_date_entry = DateEntry(
+        date_frame,
+        width=12,
+        year=default_end_date.year,
+        month=default_end_date.month,
+        day=default_end_date.day,
+        font=("Iansui", 11),
+        background=MD_PRIMARY,
+        foreground=MD_ON_PRIMARY,
+        headersbackground=MD_PRIMARY,
+        headersforeground=MD_ON_PRIMARY,
+        selectbackground=MD_PRIMARY_D,
+        selectforeground=MD_ON_PRIMARY,
+        normalbackground=MD_SURFACE,
+        normalforeground=MD_ON_SURFACE,
+        weekendbackground=MD_SURFACE,
+        weekendforeground=MD_ON_SURFACE,
+        bordercolor=MD_PRIMARY,
+        date_pattern='yyyy/mm/dd',
+        locale='zh_TW',
+    )
+    end_date_entry.pack(side='left', padx=5)
+
+    infinite_check = Checkbutton(
+        date_frame, text="無限重複", variable=infinite_var,
+        font=("Iansui", 10), bg=MD_SURFACE, fg=MD_ON_SURFACE,
+        activebackground=MD_SURFACE, selectcolor=MD_SURFACE,
+        command=toggle_date_entry
+    )
+    infinite_check.pack(side='left', padx=5)
+    return date_frame
+
+def selected_until_date():
+    """重複到哪一天，None表示無限重複(還沒打開日期設定區時用預設日期)"""
+    if infinite_var.get():
+        return None
+    if end_date_entry is None:
+        return default_end_date
+    return end_date_entry.get_date()
 
 # ── 按鈕區（Material Design） ──
 button_frame = Frame(control_frame, bg=MD_SURFACE)
@@ -544,6 +403,22 @@ ics_button.pack(pady=2)
 ics_button.bind('<Enter>', md_button_enter)
 ics_button.bind('<Leave>', md_button_leave)
 
+refresh_button = Button(
+    button_frame, text="重新整理", font=("Iansui", 10),
+    bg=MD_SURFACE, fg=MD_PRIMARY, activebackground=MD_SURFACE,
+    activeforeground=MD_PRIMARY_D, relief='flat', padx=8, pady=0,
+    cursor='hand2', bd=0
+)
+refresh_button.pack(pady=2)
+
+cancel_button = Button(
+    button_frame, text="取消", font=("Iansui", 10),
+    bg=MD_SURFACE, fg=MD_DISABLED_FG, activebackground=MD_SURFACE,
+    activeforeground=MD_PRIMARY_D, relief='flat', padx=8, pady=0,
+    bd=0, state='disabled'
+)
+cancel_button.pack(pady=2)
+
 ics_error_label = Label(button_frame, text="", font=("Iansui", 10), fg="red", state='disabled')
 ics_error_label.pack()
 
@@ -552,8 +427,96 @@ timetable_canvas = TimetableCanvas(window, width=960, height=560)
 
 student_id_check=""
 
+# 目前學生的課表，產生課表與匯出ICS共用同一份資料
+current_timetable = None
+
+def get_timetable(student_id, refresh=False):
+    """取得學生的課表物件，換學號或要求重新整理時才重新下載"""
+    global current_timetable
+    if current_timetable is None or current_timetable.student_id != student_id:
+        from table import StudentTimetable
+        current_timetable = StudentTimetable(student_id, get_http_client(), skip_known_empty=True,
+                                             time_limit=TIME_LIMIT)
+    if refresh:
+        current_timetable.refresh()
+    return current_timetable
+
+# ── 背景下載 ──
+# 下載在背景執行緒進行，進度與結果放進job_queue，由Tk主執行緒每POLL_MS毫秒取出處理，
+# 視窗在下載時不會卡住。每次開始新的下載時generation加一，舊的下載結果直接丟掉。
+POLL_MS = 50
+DAY_NAMES = "一二三四五六日"
+# 每次下載最多等幾秒，到期時先顯示已經取得的星期
+TIME_LIMIT = 15.0
+job_queue = queue.Queue()
+job_generation = 0
+job_cancel = None
+job_started_at = 0.0
+
+def start_job(description, work, on_done):
+    """在背景執行work(progress, cancel)，完成後在主執行緒呼叫on_done(結果, 例外)"""
+    global job_generation, job_cancel, job_started_at
+    if job_cancel is not None:
+        job_cancel.set()
+    job_generation += 1
+    generation = job_generation
+    cancel = threading.Event()
+    job_cancel = cancel
+    job_started_at = time.monotonic()
+
+    def progress(day, done, total):
+        job_queue.put((generation, 'progress', (description, day, done, total)))
+
+    def run():
+        try:
+            result = work(progress, cancel)
+            job_queue.put((generation, 'done', (on_done, result, None)))
+        except Exception as e:
+            job_queue.put((generation, 'done', (on_done, None, e)))
+
+    status_label.config(text=f"{description}：連線中…")
+    cancel_button.config(state='normal', fg=MD_PRIMARY, cursor='hand2')
+    threading.Thread(target=run, daemon=True).start()
+
+def cancel_job():
+    """取消目前的下載(已送出的請求會在背景自然結束，結果不會顯示)"""
+    global job_generation, job_cancel
+    if job_cancel is None:
+        return
+    job_cancel.set()
+    job_cancel = None
+    job_generation += 1
+    cancel_button.config(state='disabled', fg=MD_DISABLED_FG, cursor='')
+    status_label.config(text="已取消")
+
+def poll_jobs():
+    """在主執行緒處理背景下載送回來的進度與結果"""
+    global job_cancel
+    try:
+        while True:
+            generation, kind, payload = job_queue.get_nowait()
+            if generation != job_generation:
+                continue
+            if kind == 'progress':
+                description, day, done, total = payload
+                status_label.config(text=f"{description}：星期{DAY_NAMES[day - 1]}完成 ({done}/{total})")
+            else:
+                from table import FetchCancelled
+                on_done, result, error = payload
+                job_cancel = None
+                cancel_button.config(state='disabled', fg=MD_DISABLED_FG, cursor='')
+                if isinstance(error, FetchCancelled):
+                    status_label.config(text="已取消")
+                    continue
+                elapsed = time.monotonic() - job_started_at
+                status_label.config(text="發生錯誤" if error else f"完成 ({elapsed:.1f} 秒)")
+                on_done(result, error)
+    except queue.Empty:
+        pass
+    window.after(POLL_MS, poll_jobs)
+
 # 產生課表函數
-def generate_timetable():
+def generate_timetable(refresh=False):
     
     #取得學號
     student_id = student_id_entry.get()
@@ -569,16 +532,34 @@ def generate_timetable():
 
     try:
         if not student_id:
-            error_type = '學號'
             raise Exception('請輸入學號')
         
         elif not student_id.isdigit():
-            error_type='學號'
             raise Exception('不是你咋做到的')
-            
-        result = get_single_class_table(student_id)
+
+    except Exception as e:
+        student_id_error_label.config(text=str(e),state='normal')
+        ics_button.config(state='disabled', bg=MD_DISABLED_BG, fg=MD_DISABLED_FG)
+        return
+
+    timetable = get_timetable(student_id, refresh)
+    # 課表畫面可以只顯示取得的星期；匯出ICS則一定要完整(mix_view會重新下載缺少的星期)
+    start_job(f"下載 {student_id} 的課表",
+              lambda progress, cancel: (timetable.single_view(progress, cancel, partial=True), timetable.missing),
+              lambda result, error: show_timetable(result, error, selected_type))
+
+def show_timetable(result, error, selected_type):
+    """背景下載完成後顯示課表(在主執行緒執行)，result是(課表, 沒有取得的星期)"""
+    try:
+        if error is not None:
+            raise error
+
+        result, missing = result
+        if missing:
+            days = "、".join(DAY_NAMES[day - 1] for day in missing)
+            status_label.config(text=f"星期{days}沒有取得，只顯示部分課表")
+
         if result == '無此人':
-            error_type='沒人'
             raise Exception('此學號不存在或沒選課')
             
         if result:
@@ -590,13 +571,8 @@ def generate_timetable():
                 ics_button.config(state='normal', bg=MD_PRIMARY, fg=MD_ON_PRIMARY)
 
     except Exception as e:
-        if 'error_type' in locals() and error_type == '學號':
-            student_id_error_label.config(text=str(e),state='normal')
-            ics_button.config(state='disabled', bg=MD_DISABLED_BG, fg=MD_DISABLED_FG)
-
-        else:
-            timetable_canvas.display_error(f'錯誤: {str(e)}')
-            ics_button.config(state='disabled', bg=MD_DISABLED_BG, fg=MD_DISABLED_FG)
+        timetable_canvas.display_error(f'錯誤: {str(e)}')
+        ics_button.config(state='disabled', bg=MD_DISABLED_BG, fg=MD_DISABLED_FG)
 
 def generate_ics():
     student_id = student_id_entry.get()
@@ -614,8 +590,21 @@ def generate_ics():
         
         elif student_id != student_id_check:
             raise Exception('你以為我不知道你換學號了嗎')
+    except Exception as e:
+        ics_error_label.config(text=str(e),state='normal', fg="red")
+        return
+
+    timetable = get_timetable(student_id)
+    start_job(f"下載 {student_id} 的行事曆",
+              lambda progress, cancel: timetable.mix_view(progress, cancel),
+              lambda result, error: save_ics(result, error, student_id))
+
+def save_ics(result, error, student_id):
+    """背景下載完成後選擇存檔位置並寫出ics(在主執行緒執行)"""
+    try:
+        if error is not None:
+            raise error
 
-        result = get_mix_class_table(student_id)
         if result == '無此人':
             raise Exception('告訴下Nekolia你怎麼找到漏洞的')
         
@@ -641,55 +630,41 @@ def generate_ics():
 
         # --- 修改結束，後續邏輯不變 ---
         
-        today = datetime.date.today()
-        weekday = today.weekday()
-
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write("BEGIN:VCALENDAR\n")
-            f.write("VERSION:2.0\n")
-            f.write("PRODID:-//NTUB Timetable Generator//EN\n")
-            f.write("CALSCALE:GREGORIAN\n")
-            f.write("METHOD:PUBLISH\n")
-            for i in range(len(result["class"])):
-                class_name = result["class"][i]
-                class_day = result["day"][i] - 1
-                class_place = result["place"][i]
-                class_start = result["start"][i]
-                class_end = result["end"][i]
-
-                days_ahead = (class_day - weekday + 7) % 7
-                go_to_class_date = today + datetime.timedelta(days=days_ahead)
-
-                uid = f"{go_to_class_date.strftime('%Y%m%d')}T{class_start.replace(':','')}00Z-{class_name}@ntub.tw"
-                f.write("BEGIN:VEVENT\n")
-                f.write(f"SUMMARY:{class_name}\n")
-                f.write(f"DTSTART;TZID=Asia/Taipei:{go_to_class_date.strftime('%Y%m%d')}T{class_start.replace(':','')}00\n")
-                f.write(f"DTEND;TZID=Asia/Taipei:{go_to_class_date.strftime('%Y%m%d')}T{class_end.replace(':','')}00\n")
-                f.write(f"LOCATION:{class_place}\n")
-                f.write(f"UID:{uid}\n")
-                f.write(f"DTSTAMP:{datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}\n")
-                if infinite_var.get():
-                    f.write("RRULE:FREQ=WEEKLY\n")
-                else:
-                    until_date = end_date_entry.get_date()
-                    f.write(f"RRULE:FREQ=WEEKLY;UNTIL={until_date.strftime('%Y%m%d')}T235959Z\n")
-                f.write("END:VEVENT\n")
-
-            f.write("END:VCALENDAR\n")
+        from ics import write_ics
+        until_date = selected_until_date()
+        # 覆蓋之前匯出的檔案時，沒改變的課沿用原本的事件，只有改變的課SEQUENCE加一
+        previous = None
+        if os.path.exists(file_path):
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                previous = f.read()
+        with open(file_path, "wb") as f:
+            diff = write_ics(f, result, until_date, previous=previous)
         
         # 提示使用者檔案已儲存
-        ics_error_label.config(text=f"成功匯出！", fg="green", state='normal')
+        if diff is not None and not diff.has_changes:
+            ics_error_label.config(text="成功匯出！課表沒有變動", fg="green", state='normal')
+        elif diff is not None:
+            changes = diff.summary()
+            ics_error_label.config(text=f"成功匯出！變動 {changes['changed'] + changes['added']} 堂，取消 {changes['removed']} 堂",
+                                   fg="green", state='normal')
+        else:
+            ics_error_label.config(text="成功匯出！", fg="green", state='normal')
 
     except Exception as e:
         ics_error_label.config(text=str(e),state='normal', fg="red")
 
 # 設定按鈕命令
 generate_button.config(command=generate_timetable)
+refresh_button.config(command=lambda: generate_timetable(refresh=True))
 ics_button.config(command=generate_ics)
+cancel_button.config(command=cancel_job)
 # 狀態欄
 status_frame = Frame(window, height=20)
 status_frame.pack(fill='x', side='bottom')
 status_label = Label(status_frame, text="就緒", bd=1, relief=SUNKEN, anchor=W)
 status_label.pack(fill='x')
 
+window.after(POLL_MS, poll_jobs)
+# 第一次畫面畫完(事件迴圈閒置)之後才開始在背景載入模組
+window.after_idle(lambda: threading.Thread(target=warm_imports, daemon=True).start())
 window.mainloop()
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""讓單一個慢的或失敗的請求不要拖住整位學生：重試與對沖請求(hedged request)
+
+一位學生的課表要等七天的請求都回來，最慢的那一個決定整體的時間。
+
+- RetryPolicy：逾時、連線錯誤與5xx/429時，隔一段隨機時間(full jitter)再試，最多attempts次
+- Hedger：請求超過最近回應時間的某個百分位數(預設p95)還沒回來時，另外送一個一樣的請求，
+  先回來的為準。對沖請求的數量有預算(預設最多多出10%)，伺服器變慢時不會讓負載加倍。
+
+    client = ClassTableClient(retry=RetryPolicy(), hedger=Hedger())
+    ...
+    client.hedger.as_dict()    # 對沖統計
+
+課表查詢不會改變伺服器狀態，所以重複送出是安全的；輸掉的請求會在背景自然結束，結果直接丟掉。
+"""
+import collections
+import concurrent.futures
+import random
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, TypeVar
+
+import requests
+
+import metrics
+from deadline import DeadlineExceeded
+from limiter import is_overload_status
+
+T = TypeVar("T")
+
+DEFAULT_PERCENTILE = 0.95
+# 對沖的延遲最少這麼多秒，避免伺服器很快時幾乎每個請求都對沖
+DEFAULT_MIN_DELAY = 0.05
+# 累積這麼多個樣本之前不對沖(還不知道正常的回應時間)
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_WINDOW = 512
+# 每個請求累積多少對沖額度，以及最多累積多少(短時間內的上限)
+DEFAULT_BUDGET = 0.1
+DEFAULT_BURST = 10.0
+DEFAULT_MAX_WORKERS = 32
+# 每多少個新樣本重新計算一次延遲
+_RECOMPUTE_EVERY = 16
+
+log = metrics.get_logger("hedge")
+
+
+class RetryPolicy(NamedTuple):
+    """每一天的請求失敗時的重試方式
+
+    第n次重試前等待0到min(max_delay, base_delay * 2**(n-1))之間的隨機秒數，
+    很多請求同時失敗時不會在同一個時間點一起重試。
+    """
+    attempts: int = 3
+    base_delay: float = 0.2
+    max_delay: float = 2.0
+
+    def backoff(self, retry: int) -> float:
+        """第retry次重試(1開始)前要等待的秒數"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+def is_retryable(error: Exception) -> bool:
+    """暫時性的錯誤(逾時、連線中斷、伺服器過載)才值得重試"""
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and is_overload_status(error.response.status_code)
+    return isinstance(error, (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError))
+
+
+class _Race:
+    """同一個請求的主請求與對沖請求，先成功的為準"""
+    __slots__ = ("lock", "done", "launched", "finished", "ok", "result", "error", "hedge_won")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.launched = 1
+        self.finished = 0
+        self.ok = False
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.hedge_won = False
+
+
+class Hedger:
+    """對沖請求：超過最近回應時間的percentile還沒回來時再送一次
+
+    主請求與對沖請求都在Hedger自己的執行緒池(max_workers)裡執行，
+    呼叫的執行緒只負責等待；還沒累積min_samples個樣本前直接在呼叫的執行緒執行。
+    """
+
+    def __init__(self, percentile: float = DEFAULT_PERCENTILE,
+                 min_delay: float = DEFAULT_MIN_DELAY,
+                 max_delay: Optional[float] = None,
+                 min_samples: int = DEFAULT_MIN_SAMPLES,
+                 window: int = DEFAULT_WINDOW,
+                 budget: float = DEFAULT_BUDGET,
+                 burst: float = DEFAULT_BURST,
+                 max_workers: int = DEFAULT_MAX_WORKERS):
+        if not 0 < percentile < 1:
+            raise ValueError("percentile必須介於0和1之間")
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self.burst = burst
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._samples = collections.deque(maxlen=window)
+        self._since_recompute = 0
+        self._delay: Optional[float] = None
+        self._tokens = burst
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+
+    def delay(self) -> Optional[float]:
+        """目前的對沖延遲(秒)；樣本還不夠時是None"""
+        with self._lock:
+            return self._delay
+
+    def _record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_recompute += 1
+            if len(self._samples) < self.min_samples:
+                return
+            if self._delay is not None and self._since_recompute < _RECOMPUTE_EVERY:
+                return
+            self._since_recompute = 0
+            ordered = sorted(self._samples)
+            delay = max(self.min_delay, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+            if self.max_delay is not None:
+                delay = min(delay, self.max_delay)
+            self._delay = delay
+        metrics.set_gauge("hedge_delay_seconds", delay)
+
+    def _start(self) -> Optional[float]:
+        """一個新的請求：累積對沖額度，回傳對沖延遲"""
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(self.burst, self._tokens + self.budget)
+            if self._delay is not None and self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="hedge")
+            return self._delay
+
+    def _take_token(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                self.skipped += 1
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def call(self, fn: Callable[..., T], *args, timeout: Optional[float] = None) -> T:
+        """執行fn(*args)，太慢時再執行一次，回傳先成功的結果
+
+        主請求在對沖之前就失敗時直接丟出例外(交給RetryPolicy處理)；
+        兩個都失敗時丟出主請求的例外。timeout秒內都沒有結果時丟出DeadlineExceeded
+        (fn自己也要遵守同一個期限，這裡只是不再等待)。
+        """
+        delay = self._start()
+        if delay is None:
+            start = time.perf_counter()
+            result = fn(*args)
+            self._record(time.perf_counter() - start)
+            return result
+
+        race = _Race()
+        waited_until = None if timeout is None else time.monotonic() + timeout
+        self._executor.submit(self._attempt, race, fn, args, False)
+        # 剩下的時間等不到對沖的時候就不對沖
+        can_hedge = timeout is None or delay < timeout
+        if not race.done.wait(delay if can_hedge else timeout) and can_hedge:
+            with race.lock:
+                launch = not race.done.is_set() and self._take_token()
+                if launch:
+                    race.launched += 1
+            if launch:
+                log.debug("no response after %.0fms, sending a hedged request", delay * 1000)
+                metrics.increment("hedges", result="fired")
+                self._executor.submit(self._attempt, race, fn, args, True)
+        if not race.done.wait(None if waited_until is None else max(0.0, waited_until - time.monotonic())):
+            raise DeadlineExceeded("超過時間限制")
+
+        if not race.ok:
+            raise race.error
+        if race.hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+            metrics.increment("hedges", result="won")
+        return race.result
+
+    def _attempt(self, race: _Race, fn: Callable, args, hedge: bool):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            with race.lock:
+                race.finished += 1
+                # 主請求的例外比較有代表性
+                if race.error is None or not hedge:
+                    race.error = e
+                if race.finished == race.launched and not race.done.is_set():
+                    race.done.set()
+            return
+        # 輸掉的請求也是真實的回應時間，一樣列入樣本
+        self._record(time.perf_counter() - start)
+        with race.lock:
+            race.finished += 1
+            if not race.done.is_set():
+                race.ok = True
+                race.result = result
+                race.hedge_won = hedge
+                race.done.set()
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "skipped": self.skipped,
+                "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else 0.0,
+                "win_rate": round(self.hedge_wins / self.hedges, 4) if self.hedges else 0.0,
+                "delay_ms": round(self._delay * 1000, 1) if self._delay is not None else None,
+            }
+
+    def close(self):
+        """結束執行緒池(不等待還在進行的請求)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
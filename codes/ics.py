@@ -0,0 +1,343 @@
+import datetime
+import hashlib
+import io
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import metrics
+
+CRLF = "\r\n"
+# RFC 5545: 每行最多75個位元組(不含CRLF)，超過要折行
+MAX_LINE_OCTETS = 75
+_SPECIAL_CHARS = "\\;,\n"
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+PRODID = "-//NTUB Timetable Generator//EN"
+TZID = "Asia/Taipei"
+# 台北時間沒有日光節約，固定UTC+8
+VTIMEZONE = (
+    "BEGIN:VTIMEZONE",
+    f"TZID:{TZID}",
+    "BEGIN:STANDARD",
+    "DTSTART:19700101T000000",
+    "TZOFFSETFROM:+0800",
+    "TZOFFSETTO:+0800",
+    "TZNAME:CST",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+)
+
+
+class IcsEvent(NamedTuple):
+    """一個每週重複的課程事件"""
+    uid: str
+    summary: str
+    location: str
+    date: datetime.date
+    start: str      # "HH:MM"
+    end: str        # "HH:MM"
+    sequence: int = 0
+    status: Optional[str] = None    # 取消的事件為"CANCELLED"
+
+    def content_key(self):
+        """判斷事件內容有沒有改變用的值(不含第一次上課的日期，只看星期幾)"""
+        return (self.summary, self.location, self.date.weekday(), self.start, self.end)
+
+
+def escape_text(value: str) -> str:
+    """跳脫TEXT屬性值裡的 \\ ; , 與換行"""
+    if not any(c in value for c in _SPECIAL_CHARS):
+        return value
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold_line(line: str) -> str:
+    """超過75位元組的行折成多行，續行以一個空白開頭，不會切斷UTF-8字元"""
+    if len(line) <= MAX_LINE_OCTETS // 4 or len(line.encode("utf-8")) <= MAX_LINE_OCTETS:
+        return line
+
+    parts = []
+    current = []
+    size = 0
+    limit = MAX_LINE_OCTETS
+    for char in line:
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > limit:
+            parts.append("".join(current))
+            current = []
+            size = 0
+            limit = MAX_LINE_OCTETS - 1   # 續行開頭的空白也算
+        current.append(char)
+        size += char_size
+    parts.append("".join(current))
+    return (CRLF + " ").join(parts)
+
+
+class IcsWriter:
+    """把VEVENT一個一個寫到sink，累積到buffer_size才真正寫出去
+
+    sink可以是文字檔(請用newline=""開啟)、二進位檔、BytesIO或HTTP回應這類有write()的物件；
+    文字sink收到str，其他收到UTF-8 bytes。
+    DTSTAMP、RRULE等每個行事曆都一樣的內容只計算一次。
+    """
+
+    def __init__(self, sink, until_date: Optional[datetime.date] = None,
+                 dtstamp: Optional[datetime.datetime] = None,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 method: str = "PUBLISH"):
+        self.sink = sink
+        self.text_sink = isinstance(sink, io.TextIOBase)
+        self.buffer_size = buffer_size
+        self.method = method
+        self.events = 0
+        self._buffer = []
+        self._buffered = 0
+
+        if dtstamp is None:
+            dtstamp = datetime.datetime.now(datetime.timezone.utc)
+        self.dtstamp_line = f"DTSTAMP:{dtstamp.strftime('%Y%m%dT%H%M%SZ')}"
+        self.rrule_line = "RRULE:" + rrule_value(until_date)
+        self._event_tail = self.dtstamp_line + CRLF + self.rrule_line + CRLF + "END:VEVENT" + CRLF
+
+    def _line(self, line: str):
+        line = fold_line(line) + CRLF
+        self._buffer.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        data = "".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        self.sink.write(data if self.text_sink else data.encode("utf-8"))
+
+    def begin(self):
+        for line in ("BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}",
+                     "CALSCALE:GREGORIAN", f"METHOD:{self.method}") + VTIMEZONE:
+            self._line(line)
+
+    def write_event(self, event: IcsEvent):
+        # 只有課名、教室、UID可能超過一行；其他行長度固定，整個事件組成一個字串再放進buffer
+        day = event.date.strftime("%Y%m%d")
+        text = (
+            "BEGIN:VEVENT" + CRLF
+            + fold_line("SUMMARY:" + escape_text(event.summary)) + CRLF
+            + f"DTSTART;TZID={TZID}:{day}T{event.start.replace(':', '')}00" + CRLF
+            + f"DTEND;TZID={TZID}:{day}T{event.end.replace(':', '')}00" + CRLF
+            + fold_line("LOCATION:" + escape_text(event.location)) + CRLF
+            + fold_line("UID:" + event.uid) + CRLF
+            + f"SEQUENCE:{event.sequence}" + CRLF
+            + (f"STATUS:{event.status}" + CRLF if event.status else "")
+            + self._event_tail
+        )
+        self._buffer.append(text)
+        self._buffered += len(text)
+        self.events += 1
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def end(self):
+        self._line("END:VCALENDAR")
+        self.flush()
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.end()
+
+
+def rrule_value(until_date: Optional[datetime.date] = None) -> str:
+    if until_date is None:
+        return "FREQ=WEEKLY"
+    return f"FREQ=WEEKLY;UNTIL={until_date.strftime('%Y%m%d')}T235959Z"
+
+
+def semester_of(date: datetime.date) -> str:
+    """民國學年度與學期，例如2026/10/18是"115-1"，2027/3/1是"115-2"
+
+    8月到隔年1月是上學期，2月到7月是下學期。
+    """
+    if date.month >= 8:
+        return f"{date.year - 1911}-1"
+    if date.month == 1:
+        return f"{date.year - 1912}-1"
+    return f"{date.year - 1912}-2"
+
+
+def event_uid(name: str, teacher: str, day: int, periods, semester: str) -> str:
+    """由課程、星期、節次與學期產生固定的UID，同一學期重新匯出時UID不會變"""
+    key = f"{semester}|{day}|{','.join(str(p) for p in periods)}|{name}|{teacher}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+    return f"{semester}-{digest}@ntub.tw"
+
+
+def iter_events(result, today: Optional[datetime.date] = None,
+                semester: Optional[str] = None) -> Iterator[IcsEvent]:
+    """由get_mix_class_table的結果產生事件，第一次上課日期為今天起算的下一個該星期"""
+    if today is None:
+        today = datetime.date.today()
+    if semester is None:
+        semester = semester_of(today)
+    weekday = today.weekday()
+    teachers = result.get("teacher")
+    periods = result.get("periods")
+
+    for i in range(len(result["class"])):
+        class_name = result["class"][i]
+        class_day = result["day"][i] - 1
+        class_start = result["start"][i]
+
+        days_ahead = (class_day - weekday + 7) % 7
+        go_to_class_date = today + datetime.timedelta(days=days_ahead)
+
+        uid = event_uid(class_name, teachers[i] if teachers else "", class_day + 1,
+                        periods[i] if periods else (class_start, result["end"][i]), semester)
+        yield IcsEvent(uid, class_name, result["place"][i], go_to_class_date,
+                       class_start, result["end"][i])
+
+
+_UNFOLD_RE = re.compile(r"\n[ \t]")
+_UNESCAPE_RE = re.compile(r"\\([\\;,nN])")
+
+
+def unescape_text(value: str) -> str:
+    return _UNESCAPE_RE.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def read_events(text: str) -> Dict[str, Tuple[IcsEvent, str]]:
+    """讀取之前匯出的ics，回傳{UID: (事件, RRULE)}，只讀本程式會寫出的欄位
+
+    同時接受CRLF與舊版程式寫出的LF換行。
+    """
+    text = _UNFOLD_RE.sub("", text.replace("\r\n", "\n"))
+    events = {}
+    props = None
+    for line in text.split("\n"):
+        if line == "BEGIN:VEVENT":
+            props = {}
+        elif line == "END:VEVENT":
+            if props is not None and "UID" in props and "DTSTART" in props:
+                start = props["DTSTART"]
+                end = props.get("DTEND", start)
+                event = IcsEvent(
+                    props["UID"],
+                    unescape_text(props.get("SUMMARY", "")),
+                    unescape_text(props.get("LOCATION", "")),
+                    datetime.date(int(start[:4]), int(start[4:6]), int(start[6:8])),
+                    f"{start[9:11]}:{start[11:13]}",
+                    f"{end[9:11]}:{end[11:13]}",
+                    int(props.get("SEQUENCE", "0") or 0),
+                    props.get("STATUS"),
+                )
+                events[event.uid] = (event, props.get("RRULE", ""))
+            props = None
+        elif props is not None and ":" in line:
+            name, value = line.split(":", 1)
+            props[name.split(";", 1)[0].upper()] = value
+    return events
+
+
+class CalendarDiff:
+    """這次產生的事件與上次匯出的ics比較的結果
+
+    - unchanged: 內容相同，沿用上次的事件(包含第一次上課日期與SEQUENCE)
+    - changed: 內容改變，SEQUENCE加一
+    - added: 新的課
+    - removed: 這次沒有的課，SEQUENCE加一並標成CANCELLED
+    """
+
+    def __init__(self):
+        self.unchanged: List[IcsEvent] = []
+        self.changed: List[IcsEvent] = []
+        self.added: List[IcsEvent] = []
+        self.removed: List[IcsEvent] = []
+        self.events: List[IcsEvent] = []    # 完整的新行事曆(依這次的順序)
+
+    @property
+    def delta(self) -> List[IcsEvent]:
+        """需要讓訂閱者更新的事件"""
+        return self.changed + self.added + self.removed
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.changed or self.added or self.removed)
+
+    def summary(self) -> Dict[str, int]:
+        return {"unchanged": len(self.unchanged), "changed": len(self.changed),
+                "added": len(self.added), "removed": len(self.removed)}
+
+
+def diff_calendar(previous_text: str, events: Iterable[IcsEvent],
+                  until_date: Optional[datetime.date] = None) -> CalendarDiff:
+    """比較上次匯出的ics與這次的事件，只有內容改變的事件SEQUENCE會增加"""
+    previous = read_events(previous_text) if previous_text else {}
+    rrule = rrule_value(until_date)
+    diff = CalendarDiff()
+
+    for event in events:
+        old = previous.pop(event.uid, None)
+        if old is None:
+            diff.added.append(event)
+            diff.events.append(event)
+            continue
+        old_event, old_rrule = old
+        if old_event.status is None and old_rrule == rrule and old_event.content_key() == event.content_key():
+            diff.unchanged.append(old_event)
+            diff.events.append(old_event)
+        else:
+            # 同一個UID一定是同一個星期，沿用原本的第一次上課日期，重複規則的起點才不會跳動
+            event = event._replace(date=old_event.date, sequence=old_event.sequence + 1)
+            diff.changed.append(event)
+            diff.events.append(event)
+
+    for old_event, _ in previous.values():
+        if old_event.status != "CANCELLED":
+            diff.removed.append(old_event._replace(sequence=old_event.sequence + 1, status="CANCELLED"))
+    return diff
+
+
+@metrics.timed("ics")
+def write_calendar(sink, events: Iterable[IcsEvent], until_date: Optional[datetime.date] = None,
+                   **options) -> int:
+    """把事件串流寫成完整的行事曆，回傳事件數量"""
+    with IcsWriter(sink, until_date, **options) as writer:
+        for event in events:
+            writer.write_event(event)
+    return writer.events
+
+
+def calendar_bytes(events: Iterable[IcsEvent], until_date: Optional[datetime.date] = None,
+                   **options) -> bytes:
+    """產生完整行事曆的bytes(給HTTP回應或壓縮檔使用)"""
+    buffer = io.BytesIO()
+    write_calendar(buffer, events, until_date, **options)
+    return buffer.getvalue()
+
+
+def write_ics(f, result, until_date: Optional[datetime.date] = None,
+              today: Optional[datetime.date] = None,
+              previous: Optional[str] = None) -> Optional[CalendarDiff]:
+    """把get_mix_class_table的結果寫成ics，until_date為None時無限重複
+
+    previous是上次匯出的ics內容：沒改變的事件原樣保留，改變的事件SEQUENCE加一，
+    回傳CalendarDiff。
+    """
+    events = iter_events(result, today)
+    if previous is None:
+        write_calendar(f, events, until_date)
+        return None
+    diff = diff_calendar(previous, events, until_date)
+    write_calendar(f, diff.events, until_date)
+    return diff
+
+
+def write_delta(f, diff: CalendarDiff, until_date: Optional[datetime.date] = None) -> int:
+    """只寫出改變、新增與取消的事件"""
+    return write_calendar(f, diff.delta, until_date)
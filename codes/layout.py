@@ -0,0 +1,356 @@
+"""課表格線的版面計算，不需要Tk
+
+由get_single_class_table的結果算出要畫的線、方框與文字(Primitive)，
+gui.py的TimetableCanvas與render.py的SVG/PNG輸出共用同一份結果。
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from blocks import single_view_blocks
+
+FONT_FAMILY = "Iansui"
+# 由下往上的圖層：表頭背景、網格線、合併儲存格外框、文字
+LAYERS = ("layer_header", "layer_grid", "layer_block", "layer_text")
+
+DAY_KEYS = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+DAY_LABELS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+HEADER_FILL = "#e0e0e0"
+# 儲存格文字的字體大小範圍(點)，放不下時逐級縮小
+MAX_FONT_SIZE = 10
+MIN_FONT_SIZE = 6
+LINE_SPACING = 1.25
+
+
+class Primitive(NamedTuple):
+    """一個要畫的項目；key在同一張圖裡唯一，重畫時用來找回同一個項目"""
+    key: Tuple
+    kind: str           # "line" | "rectangle" | "text"
+    coords: Tuple[float, ...]
+    layer: str
+    options: Dict
+
+
+class GridMetrics(NamedTuple):
+    """依畫面大小決定的儲存格尺寸"""
+    left_margin: int
+    top_margin: int
+    cell_width: int
+    cell_height: int
+
+
+class GridLayout(NamedTuple):
+    width: int
+    height: int
+    scrollregion: Tuple[int, int, int, int]
+    primitives: List[Primitive]
+
+
+def grid_metrics(width: int, height: int) -> GridMetrics:
+    """根據畫布大小設置自適應的儲存格尺寸"""
+    # 設置時間列寬度為畫布寬度的12%
+    left_margin = int(width * 0.12)
+
+    # 設置表頭高度為畫布高度的8%
+    top_margin = int(height * 0.08)
+
+    # 假設最多有5個工作日和8個時間段
+    max_days = 6  # 包含時間列
+    max_times = 8
+
+    # 計算適合的儲存格尺寸
+    cell_width = int((width - left_margin) / (max_days - 1))
+    cell_height = int((height - top_margin) / max_times)
+    return GridMetrics(left_margin, top_margin, cell_width, cell_height)
+
+
+class ApproxMeasurer:
+    """沒有Tk時的文字量測：用估計的字寬(全形字約一個字高，半形字約一半)"""
+
+    def char_width(self, char: str, family: str, size: int) -> float:
+        return char_width(char, points_to_pixels(size))
+
+    def line_height(self, family: str, size: int) -> float:
+        return points_to_pixels(size) * LINE_SPACING
+
+
+class FontFitter:
+    """找出換行後放得進儲存格的最大字體大小
+
+    measurer需要提供char_width(字, 字型, 大小)與line_height(字型, 大小)，單位是像素；
+    視窗用Tk的實際字寬(gui.TkMeasurer)，SVG/PNG輸出用ApproxMeasurer。
+    結果以(文字, 字型, 寬, 高)記住，視窗大小改變時呼叫clear()。
+    """
+
+    def __init__(self, measurer=None, max_size: int = MAX_FONT_SIZE, min_size: int = MIN_FONT_SIZE):
+        self.measurer = measurer if measurer is not None else ApproxMeasurer()
+        self.max_size = max_size
+        self.min_size = min_size
+        self._fits: Dict[Tuple[str, str, int, int], int] = {}
+
+    def clear(self):
+        self._fits.clear()
+
+    def wrap(self, text: str, family: str, size: int, max_width: Optional[float]) -> List[str]:
+        measure = self.measurer.char_width
+        return wrap_lines(text, max_width, lambda char: measure(char, family, size))
+
+    def fits(self, text: str, family: str, size: int, max_width: float, max_height: float) -> bool:
+        lines = self.wrap(text, family, size, max_width)
+        if len(lines) * self.measurer.line_height(family, size) > max_height:
+            return False
+        # 換行只會在超過寬度前斷開，只剩一個字還超過寬度時就是太大了
+        measure = self.measurer.char_width
+        return all(measure(line, family, size) <= max_width for line in lines if len(line) == 1)
+
+    def fit(self, text: str, family: str, max_width: float, max_height: float) -> int:
+        key = (text, family, int(max_width), int(max_height))
+        size = self._fits.get(key)
+        if size is None:
+            size = self.min_size
+            for candidate in range(self.max_size, self.min_size - 1, -1):
+                if self.fits(text, family, candidate, key[2], key[3]):
+                    size = candidate
+                    break
+            self._fits[key] = size
+        return size
+
+
+_default_fitter = FontFitter()
+
+
+def calculate_font_size(text: str, max_width: float, max_height: float,
+                        fitter: Optional[FontFitter] = None, family: str = FONT_FAMILY) -> int:
+    """換行後放得進max_width x max_height的最大字體大小(最小MIN_FONT_SIZE)"""
+    return (fitter or _default_fitter).fit(text, family, max_width, max_height)
+
+
+def time_to_minutes(time_str: str) -> int:
+    """將時間字符串轉換為分鐘數，用於排序"""
+    if not time_str or '-' not in time_str:
+        return 0
+    start_time = time_str.split('-')[0].strip()
+    if not start_time:
+        return 0
+    try:
+        hours, minutes = map(int, start_time.split(':'))
+        return hours * 60 + minutes
+    except ValueError:
+        return 0
+
+
+class _LayoutBuilder:
+    """照TimetableCanvas原本的繪製步驟產生Primitive"""
+
+    def __init__(self, width: int, height: int, fitter: Optional["FontFitter"] = None):
+        self.width = width
+        self.height = height
+        self.fitter = fitter
+        self.metrics = grid_metrics(width, height)
+        self.days: List[str] = []
+        self.time_slots: List[str] = []
+        self.items: Dict[Tuple, Primitive] = {}
+        self.scrollregion = (0, 0, width, height)
+
+    def add(self, key, kind, coords, layer, **options):
+        self.items[key] = Primitive(key, kind, tuple(coords), layer, options)
+
+    def layout(self) -> GridLayout:
+        return GridLayout(self.width, self.height, self.scrollregion, list(self.items.values()))
+
+    def set_days(self, days):
+        """設置星期幾的標題"""
+        self.days = days
+        m = self.metrics
+        total_width = m.left_margin + (len(days) - 1) * m.cell_width
+
+        # 繪製表頭背景
+        self.add(("header_bg",), "rectangle", (0, 0, total_width, m.top_margin), "layer_header",
+                 fill=HEADER_FILL, outline="black")
+
+        # 繪製時間列標題 (調整字體大小)
+        header_font_size = max(10, min(12, int(m.top_margin / 3)))
+        self.add(("header", 0), "text", (m.left_margin / 2, m.top_margin / 2), "layer_text",
+                 text=days[0], font=(FONT_FAMILY, header_font_size, "bold"))
+
+        # 繪製星期幾標題
+        for i, day in enumerate(days[1:], 1):
+            x = m.left_margin + (i - 1) * m.cell_width + m.cell_width / 2
+            self.add(("header", i), "text", (x, m.top_margin / 2), "layer_text",
+                     text=day, font=(FONT_FAMILY, header_font_size, "bold"))
+
+    def draw_grid(self):
+        """繪製表格網格"""
+        m = self.metrics
+        total_width = m.left_margin + (len(self.days) - 1) * m.cell_width
+        total_height = m.top_margin + len(self.time_slots) * m.cell_height
+        self.scrollregion = (0, 0, total_width, total_height)
+
+        # 繪製垂直網格線
+        for i in range(len(self.days)):
+            x = m.left_margin + i * m.cell_width
+            self.add(("vline", i), "line", (x, m.top_margin, x, total_height), "layer_grid",
+                     fill="black", width=1)
+
+        # 繪製水平網格線
+        for i in range(len(self.time_slots) + 1):
+            y = m.top_margin + i * m.cell_height
+            self.add(("hline", i), "line", (0, y, total_width, y), "layer_grid",
+                     fill="black", width=1)
+
+    def draw_time_slots(self, time_slots):
+        """繪製時間槽"""
+        self.time_slots = time_slots
+        self.draw_grid()
+
+        m = self.metrics
+        time_font_size = max(8, min(10, int(m.left_margin / 10)))
+        for i, time_slot in enumerate(time_slots):
+            y = m.top_margin + i * m.cell_height + m.cell_height / 2
+            self.add(("time", i), "text", (m.left_margin / 2, y), "layer_text",
+                     text=time_slot, font=(FONT_FAMILY, time_font_size),
+                     width=m.left_margin - 10)  # 設置文字換行寬度
+
+    def set_cell_content(self, row, col, content):
+        """設置儲存格內容"""
+        m = self.metrics
+        x1 = m.left_margin + (col - 1) * m.cell_width
+        y1 = m.top_margin + row * m.cell_height
+        x2 = x1 + m.cell_width
+        y2 = y1 + m.cell_height
+
+        font_size = calculate_font_size(content, m.cell_width - 10, m.cell_height - 10, self.fitter)
+        self.add(("course", row, col), "text", ((x1 + x2) / 2, (y1 + y2) / 2), "layer_text",
+                 text=content, font=(FONT_FAMILY, font_size), width=m.cell_width - 10)
+
+    def merge_cells(self, start_row, end_row, col, content):
+        """合併儲存格"""
+        m = self.metrics
+        x1 = m.left_margin + (col - 1) * m.cell_width
+        y1 = m.top_margin + start_row * m.cell_height
+        x2 = x1 + m.cell_width
+        y2 = m.top_margin + (end_row + 1) * m.cell_height
+
+        # 清除要合併的儲存格
+        for row in range(start_row + 1, end_row + 1):
+            self.items.pop(("course", row, col), None)
+
+        self.add(("block", start_row, col), "rectangle", (x1, y1, x2, y2), "layer_block",
+                 fill="white", outline="black")
+
+        # 文字用跟單一儲存格相同的key，同一門課從單格變成合併時沿用同一個項目
+        font_size = calculate_font_size(content, m.cell_width - 10, y2 - y1 - 10, self.fitter)
+        self.add(("course", start_row, col), "text", ((x1 + x2) / 2, (y1 + y2) / 2), "layer_text",
+                 text=content, font=(FONT_FAMILY, font_size), width=m.cell_width - 10)
+
+
+def _days_and_times(builder: _LayoutBuilder, result) -> Tuple[List[str], List[str], Dict[str, int]]:
+    """決定有課的星期與時間槽，並畫出表頭、網格與時間欄
+
+    回傳(星期標題, 顯示的時間槽, {時間: 列號})。
+    """
+    # 檢查每一天有沒有課程
+    days = ['Time']
+    for key, label in zip(DAY_KEYS, DAY_LABELS):
+        if any(slot.get(key) for slot in result):
+            days.append(label)
+    builder.set_days(days)
+
+    # 只保留有課程的時間槽，去除重複並排序
+    times_with_courses = {
+        time_slot.get('time', '') for time_slot in result
+        if any(time_slot.get(day.lower(), '') for day in days[1:])
+    }
+    unique_times = sorted(times_with_courses, key=time_to_minutes)
+    builder.draw_time_slots(unique_times)
+    return days, unique_times, {time: row for row, time in enumerate(unique_times)}
+
+
+def layout_single(result, width: int, height: int, fitter: Optional[FontFitter] = None) -> GridLayout:
+    """課表：每一節一格"""
+    builder = _LayoutBuilder(width, height, fitter)
+    days, _, row_of = _days_and_times(builder, result)
+
+    for time_slot in result:
+        row = row_of.get(time_slot.get('time', ''))
+        if row is None:
+            continue
+        for i, day in enumerate(days[1:], 1):
+            content = time_slot.get(day.lower(), '')
+            if content:
+                builder.set_cell_content(row, i, content)
+    return builder.layout()
+
+
+def layout_mix(result, width: int, height: int, fitter: Optional[FontFitter] = None) -> GridLayout:
+    """行事曆用課表：連續相同的課合併成一格(區塊由blocks.py計算，跟ics的事件一致)"""
+    builder = _LayoutBuilder(width, height, fitter)
+    days, _, row_of = _days_and_times(builder, result)
+    blocks = single_view_blocks(result, [day.lower() for day in days[1:]])
+
+    for col, day in enumerate(days[1:], 1):
+        for block in blocks[day.lower()]:
+            # 區塊裡的每一節都有課，一定都在顯示的時間槽裡
+            start_row = row_of[result[block.start_row].get('time', '')]
+            end_row = row_of[result[block.end_row].get('time', '')]
+            if end_row > start_row:
+                builder.merge_cells(start_row, end_row, col, f"{block.value}")
+            else:
+                # 單一時間槽，無需合併
+                builder.set_cell_content(start_row, col, f"{block.value}")
+    return builder.layout()
+
+
+def layout_error(message: str, width: int, height: int) -> GridLayout:
+    """顯示錯誤訊息"""
+    builder = _LayoutBuilder(width, height)
+    builder.add(("error",), "text", (width / 2, height / 2), "layer_text",
+                text=message, font=(FONT_FAMILY, 14, "bold"), fill="red")
+    return builder.layout()
+
+
+def layout_timetable(result, view: str, width: int, height: int,
+                     fitter: Optional[FontFitter] = None) -> GridLayout:
+    """view為"single"(課表)或"mix"(行事曆用課表)"""
+    if view == "mix":
+        return layout_mix(result, width, height, fitter)
+    return layout_single(result, width, height, fitter)
+
+
+# ── 沒有Tk時的文字寬度估計(SVG/PNG用) ──
+
+def points_to_pixels(size: float) -> float:
+    """Tk的字體大小是點數，以96dpi換算成像素"""
+    return size * 96 / 72
+
+
+def char_width(char: str, size_px: float) -> float:
+    """全形字約一個字高，半形字約一半"""
+    if ord(char) < 0x2E80:
+        return size_px * 0.55
+    return size_px
+
+
+def wrap_lines(text: str, max_width: Optional[float], width_of: Callable[[str], float]) -> List[str]:
+    """模擬Tk text項目的width換行(逐字換行)，width_of(字)回傳字寬"""
+    lines = []
+    for paragraph in text.split("\n"):
+        if not max_width:
+            lines.append(paragraph)
+            continue
+        current = ""
+        current_width = 0.0
+        for char in paragraph:
+            w = width_of(char)
+            if current and current_width + w > max_width:
+                lines.append(current)
+                current = ""
+                current_width = 0.0
+            current += char
+            current_width += w
+        lines.append(current)
+    return lines
+
+
+def wrap_text(text: str, size: float, max_width: Optional[float]) -> List[str]:
+    """用估計的字寬換行(SVG/PNG用)"""
+    size_px = points_to_pixels(size)
+    return wrap_lines(text, max_width, lambda char: char_width(char, size_px))
@@ -0,0 +1,172 @@
+"""依學校伺服器的回應自動調整同時請求數(AIMD)
+
+跟TCP的壅塞控制一樣：
+- 一開始(還沒遇過壅塞)每個正常的回應上限加一，每一輪加倍(slow start)
+- 之後回應正常且夠快：每收到大約「目前上限」個回應，上限加一(加法增加)
+- 逾時、連線錯誤、5xx/429，或回應比latency_target慢：上限乘上backoff(乘法減少)，
+  同一波壅塞(cooldown秒內)只減少一次
+
+上限介於min_limit與max_limit之間；max_limit是不能超過的天花板(例如連線池大小)。
+只有在請求數真的碰到上限時才會往上加，閒置時不會無限制地長大。
+
+    limiter = AimdLimiter(max_limit=32)
+    client = ClassTableClient(pool_size=32, limiter=limiter)
+    ...
+    limiter.limit          # 目前的上限
+    limiter.as_dict()      # 統計
+
+asyncio版本是AsyncAimdLimiter，給AsyncClassTableClient用。
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+import metrics
+
+DEFAULT_INITIAL = 4
+DEFAULT_MIN = 1
+DEFAULT_MAX = 32
+# 比這個慢(秒)的回應當成伺服器開始吃不消
+DEFAULT_LATENCY_TARGET = 2.0
+DEFAULT_BACKOFF = 0.5
+# 這些狀態碼表示伺服器過載，需要降低請求數
+OVERLOAD_STATUS = frozenset({429, 500, 502, 503, 504})
+
+log = metrics.get_logger("limiter")
+
+
+def is_overload_status(status: int) -> bool:
+    return status in OVERLOAD_STATUS
+
+
+class _Aimd:
+    """AIMD的計算部分；呼叫端負責加鎖"""
+
+    def __init__(self, initial: int = DEFAULT_INITIAL,
+                 min_limit: int = DEFAULT_MIN,
+                 max_limit: int = DEFAULT_MAX,
+                 latency_target: float = DEFAULT_LATENCY_TARGET,
+                 backoff: float = DEFAULT_BACKOFF,
+                 cooldown: Optional[float] = None,
+                 name: str = "default"):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("需要 1 <= min_limit <= max_limit")
+        if not 0 < backoff < 1:
+            raise ValueError("backoff必須介於0和1之間")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = latency_target if cooldown is None else cooldown
+        self.name = name
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._last_decrease = float("-inf")
+        self.inflight = 0
+        self.successes = 0
+        self.failures = 0
+        self.slow = 0
+        self.decreases = 0
+        self.peak_limit = self.limit
+        metrics.set_gauge("concurrency_limit", self.limit, limiter=name)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _has_room(self) -> bool:
+        return self.inflight < self.limit
+
+    def _record(self, ok: bool, latency: float):
+        """一個請求結束(呼叫時inflight還包含這個請求)"""
+        before = self.limit
+        if not ok:
+            self.failures += 1
+            self._decrease()
+        elif latency > self.latency_target:
+            self.slow += 1
+            self._decrease()
+        else:
+            self.successes += 1
+            # 只有請求數碰到上限時才加，否則上限沒有被驗證過
+            if self.inflight >= before:
+                step = 1.0 if self.decreases == 0 else 1.0 / self._limit
+                self._limit = min(float(self.max_limit), self._limit + step)
+        after = self.limit
+        if after != before:
+            self.peak_limit = max(self.peak_limit, after)
+            metrics.set_gauge("concurrency_limit", after, limiter=self.name)
+            log.info("%s: concurrency limit %d -> %d", self.name, before, after)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit * self.backoff)
+        self.decreases += 1
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "peak_limit": self.peak_limit,
+            "inflight": self.inflight,
+            "successes": self.successes,
+            "failures": self.failures,
+            "slow": self.slow,
+            "decreases": self.decreases,
+        }
+
+
+class AimdLimiter(_Aimd):
+    """多執行緒用的AIMD限制器：acquire()會等到有空位，請求結束後release(成功與否, 秒數)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """等待空位，timeout秒內等不到時回傳False"""
+        with self._cond:
+            if not self._cond.wait_for(self._has_room, timeout):
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self, ok: bool, latency: float):
+        with self._cond:
+            self._record(ok, latency)
+            self.inflight -= 1
+            # 上限可能一次增加或減少，讓等待的執行緒自己重新檢查
+            self._cond.notify_all()
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._cond:
+            return super().as_dict()
+
+
+class AsyncAimdLimiter(_Aimd):
+    """asyncio用的AIMD限制器(同一個事件迴圈內使用)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        # Condition要在事件迴圈裡建立
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(self._has_room)
+            self.inflight += 1
+
+    async def release(self, ok: bool, latency: float):
+        cond = self._condition()
+        async with cond:
+            self._record(ok, latency)
+            self.inflight -= 1
+            cond.notify_all()
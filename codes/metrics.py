@@ -0,0 +1,262 @@
+"""各階段耗時的統計與匯出(取代原本把整份回應印到stdout的除錯方式)
+
+階段(PHASES)：
+- queue_wait：請求排進執行緒池到真正開始執行
+- connect：建立TCP/TLS連線(沿用連線池裡的連線時不計)
+- server：送出請求到收到回應標頭，扣掉connect
+- download：讀取回應內容
+- parse：解析HTML
+- merge：合併成課表/行事曆格式
+- ics：輸出ics
+
+    import metrics
+    metrics.add_hook(lambda phase, seconds, labels: ...)   # 每次記錄時呼叫
+    print(metrics.to_prometheus())                          # Prometheus文字格式
+    print(json.dumps(metrics.summary()))                    # JSON摘要
+
+記錄時只做幾次加法；hook在記錄的執行緒裡同步呼叫，請不要在hook裡做耗時的事。
+log等級用configure_logging()或NTUB_LOG_LEVEL環境變數設定(預設WARNING)。
+"""
+import bisect
+import collections
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+PHASES = ("queue_wait", "connect", "server", "download", "parse", "merge", "ics")
+# 直方圖的上界(秒)，Prometheus的le標籤
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 計算百分位數用的最近樣本數(每個階段)
+RECENT_SAMPLES = 2048
+METRIC_PREFIX = "ntub"
+LOGGER_NAME = "ntub"
+
+Hook = Callable[[str, float, Dict[str, str]], None]
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "recent")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = collections.deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+
+class MetricsRegistry:
+    """執行緒安全的階段耗時直方圖與計數器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._hooks: List[Hook] = []
+
+    def observe(self, phase: str, seconds: float, **labels: str):
+        """記錄某個階段花了幾秒"""
+        with self._lock:
+            histogram = self._histograms.get(phase)
+            if histogram is None:
+                histogram = self._histograms[phase] = _Histogram()
+            histogram.observe(seconds)
+            hooks = self._hooks
+        for hook in hooks:
+            hook(phase, seconds, labels)
+
+    def increment(self, name: str, amount: float = 1, **labels: str):
+        """計數器加一(例如請求結果、快取命中)"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        """設定目前的數值(例如同時請求數的上限)"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def timed(self, phase: str, **labels: str) -> "_Timer":
+        """記錄花的時間(發生例外也會記錄)，可以用with或當成decorator：
+
+            with metrics.timed("parse"): ...
+            @metrics.timed("merge")
+            def build(...): ...
+        """
+        return _Timer(self, phase, labels)
+
+    def add_hook(self, hook: Hook):
+        with self._lock:
+            # 複製一份，observe不必在持有鎖的時候呼叫hook
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook: Hook):
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def summary(self) -> Dict[str, Dict]:
+        """JSON摘要：每個階段的次數、總秒數、平均與最近樣本的p50/p95/p99(毫秒)，以及計數器與gauge"""
+        with self._lock:
+            snapshot = {phase: (h.count, h.total, sorted(h.recent)) for phase, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        phases = {}
+        for phase, (count, total, recent) in sorted(snapshot.items(), key=lambda item: _phase_order(item[0])):
+            phases[phase] = {
+                "count": count,
+                "total_s": round(total, 6),
+                "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                "p50_ms": round(_percentile(recent, 0.50) * 1000, 3),
+                "p95_ms": round(_percentile(recent, 0.95) * 1000, 3),
+                "p99_ms": round(_percentile(recent, 0.99) * 1000, 3),
+            }
+        return {
+            "phases": phases,
+            "counters": {_counter_label(name, labels): value for (name, labels), value in sorted(counters.items())},
+            "gauges": {_counter_label(name, labels): value for (name, labels), value in sorted(gauges.items())},
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus文字格式(text/plain; version=0.0.4)"""
+        with self._lock:
+            histograms = {phase: (list(h.counts), h.total, h.count) for phase, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        name = f"{METRIC_PREFIX}_phase_seconds"
+        lines = [f"# HELP {name} Time spent in each phase of fetching and exporting timetables.",
+                 f"# TYPE {name} histogram"]
+        for phase in sorted(histograms, key=_phase_order):
+            counts, total, count = histograms[phase]
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{phase="{phase}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{phase="{phase}"}} {total:.6f}')
+            lines.append(f'{name}_count{{phase="{phase}"}} {count}')
+
+        lines.extend(_prometheus_values(counters, "counter", "_total"))
+        lines.extend(_prometheus_values(gauges, "gauge", ""))
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    """timed()的結果；每秒會被呼叫上萬次，不用contextlib以免多出產生器的開銷"""
+    __slots__ = ("registry", "phase", "labels", "start")
+
+    def __init__(self, registry: MetricsRegistry, phase: str, labels: Dict[str, str]):
+        self.registry = registry
+        self.phase = phase
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.phase, time.perf_counter() - self.start, **self.labels)
+        return False
+
+    def __call__(self, func):
+        registry, phase, labels = self.registry, self.phase, self.labels
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.observe(phase, time.perf_counter() - start, **labels)
+        return wrapper
+
+
+def _prometheus_values(values, kind: str, suffix: str) -> List[str]:
+    by_name = collections.defaultdict(list)
+    for (name, labels), value in values.items():
+        by_name[name].append((labels, value))
+    lines = []
+    for name in sorted(by_name):
+        full = f"{METRIC_PREFIX}_{name}{suffix}"
+        lines.append(f"# TYPE {full} {kind}")
+        for labels, value in sorted(by_name[name]):
+            label_text = ",".join(f'{key}="{_escape_label(value_)}"' for key, value_ in labels)
+            lines.append(f"{full}{{{label_text}}} {value:g}" if label_text else f"{full} {value:g}")
+    return lines
+
+
+def _phase_order(phase: str):
+    return (PHASES.index(phase), phase) if phase in PHASES else (len(PHASES), phase)
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _counter_label(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{key}={value}" for key, value in labels) + "}"
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# 整個程式共用的registry；模組層級的函式都是操作它
+registry = MetricsRegistry()
+observe = registry.observe
+increment = registry.increment
+set_gauge = registry.set_gauge
+timed = registry.timed
+add_hook = registry.add_hook
+remove_hook = registry.remove_hook
+summary = registry.summary
+to_prometheus = registry.to_prometheus
+reset = registry.reset
+
+
+def write_metrics(path: str):
+    """依副檔名輸出：.json是JSON摘要，其他是Prometheus文字格式"""
+    import json
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            json.dump(summary(), f, ensure_ascii=False, indent=2)
+        else:
+            f.write(to_prometheus())
+
+
+def get_logger(name: Optional[str] = None) -> logging.Logger:
+    """ntub底下的logger，例如get_logger("table") → "ntub.table" """
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def configure_logging(level: Optional[str] = None):
+    """設定ntub logger的等級並輸出到stderr；level未指定時用NTUB_LOG_LEVEL(預設WARNING)"""
+    level = (level or os.environ.get("NTUB_LOG_LEVEL") or "WARNING").upper()
+    logger = get_logger()
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
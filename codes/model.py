@@ -0,0 +1,180 @@
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DAY_COUNT = 7
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def parse_minutes(text: str) -> int:
+    """把"08:10"或"09:00</th>"這類字串轉成當天的分鐘數，找不到時間時回傳-1"""
+    match = _TIME_RE.search(text or "")
+    if match is None:
+        return -1
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def format_minutes(minutes: int) -> str:
+    """分鐘數轉回"HH:MM" """
+    if minutes < 0:
+        return ""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class TimeSlot:
+    """一天中的某一節，時間以分鐘數表示"""
+    __slots__ = ("index", "class_no", "start", "end")
+
+    def __init__(self, index: int, class_no: str, start: int, end: int):
+        self.index = index
+        self.class_no = class_no
+        self.start = start
+        self.end = end
+
+    @property
+    def start_text(self) -> str:
+        return format_minutes(self.start)
+
+    @property
+    def end_text(self) -> str:
+        return format_minutes(self.end)
+
+    def __eq__(self, other):
+        return (isinstance(other, TimeSlot) and self.index == other.index
+                and self.class_no == other.class_no
+                and self.start == other.start and self.end == other.end)
+
+    def __hash__(self):
+        return hash((self.index, self.class_no, self.start, self.end))
+
+    def __repr__(self):
+        return f"TimeSlot({self.index}, {self.class_no!r}, {self.start_text}-{self.end_text})"
+
+
+class Course:
+    """一門課(課名、老師、教室)；同一批次裡相同的課只會有一個物件"""
+    __slots__ = ("name", "teacher", "room")
+
+    def __init__(self, name: str, teacher: str, room: str):
+        self.name = name
+        self.teacher = teacher
+        self.room = room
+
+    def __eq__(self, other):
+        return (isinstance(other, Course) and self.name == other.name
+                and self.teacher == other.teacher and self.room == other.room)
+
+    def __hash__(self):
+        return hash((self.name, self.teacher, self.room))
+
+    def __repr__(self):
+        return f"Course({self.name!r}, {self.teacher!r}, {self.room!r})"
+
+
+class Period:
+    """某一天某一節上的課"""
+    __slots__ = ("day", "slot", "course")
+
+    def __init__(self, day: int, slot: TimeSlot, course: Course):
+        self.day = day
+        self.slot = slot
+        self.course = course
+
+    def __repr__(self):
+        return f"Period(day={self.day}, {self.slot!r}, {self.course!r})"
+
+
+class Interner:
+    """讓同一批次的字串、課程與節次表共用同一個物件
+
+    大量學生的課表放在記憶體裡時，老師、教室、課名和節次時間幾乎都重複，
+    共用之後每位學生只剩下指向這些物件的參照。
+    """
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+        self._courses: Dict[Tuple[str, str, str], Course] = {}
+        self._slots: Dict[Tuple, Tuple[TimeSlot, ...]] = {}
+        self._rows: Dict[Tuple, Tuple] = {}
+
+    def string(self, value: str) -> str:
+        return self._strings.setdefault(value, value)
+
+    def course(self, name: str, teacher: str, room: str) -> Course:
+        key = (name, teacher, room)
+        course = self._courses.get(key)
+        if course is None:
+            course = Course(self.string(name), self.string(teacher), self.string(room))
+            self._courses[key] = course
+        return course
+
+    def slots(self, values: List[Tuple[str, int, int]]) -> Tuple[TimeSlot, ...]:
+        key = tuple(values)
+        slots = self._slots.get(key)
+        if slots is None:
+            slots = tuple(TimeSlot(i, self.string(class_no), start, end)
+                          for i, (class_no, start, end) in enumerate(values))
+            self._slots[key] = slots
+        return slots
+
+    def row(self, courses: Tuple[Optional[Course], ...]) -> Tuple[Optional[Course], ...]:
+        """同班同學某一天的課通常完全相同，整列共用"""
+        return self._rows.setdefault(courses, courses)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"strings": len(self._strings), "courses": len(self._courses),
+                "slot_tables": len(self._slots), "rows": len(self._rows)}
+
+
+class CompactTimetable:
+    """一位學生一週的課表
+
+    days[星期-1][節次] 是Course或None，slots是共用的節次表。
+    """
+    __slots__ = ("student_id", "slots", "days")
+
+    def __init__(self, student_id: str, slots: Tuple[TimeSlot, ...],
+                 days: Tuple[Tuple[Optional[Course], ...], ...]):
+        self.student_id = student_id
+        self.slots = slots
+        self.days = days
+
+    def is_empty(self) -> bool:
+        return all(course is None for day in self.days for course in day)
+
+    def periods(self) -> Iterator[Period]:
+        """依星期、節次順序列出所有有課的節次"""
+        for day, courses in enumerate(self.days, 1):
+            for slot, course in zip(self.slots, courses):
+                if course is not None:
+                    yield Period(day, slot, course)
+
+    def __repr__(self):
+        return f"CompactTimetable({self.student_id!r}, {sum(1 for _ in self.periods())} periods)"
+
+
+def build_compact_timetable(student_id: str, class_table, class_time,
+                            interner: Optional[Interner] = None) -> CompactTimetable:
+    """由personal_class_table的(課表, 節次時間)建立CompactTimetable
+
+    時間只在這裡解析一次(包含end_at後面多出來的</th>)，之後都用分鐘數。
+    要讓多位學生共用字串與課程物件時，請傳入同一個interner。
+    """
+    if interner is None:
+        interner = Interner()
+
+    slots = interner.slots([
+        (_TAG_RE.sub("", t["class_no"]).strip(), parse_minutes(t["start_at"]), parse_minutes(t["end_at"]))
+        for t in class_time
+    ])
+
+    days = []
+    for day_classes in class_table[:DAY_COUNT]:
+        days.append(interner.row(tuple(
+            interner.course(c["name"], c.get("teacher", ""), c.get("room", "")) if c else None
+            for c in day_classes
+        )))
+    while len(days) < DAY_COUNT:
+        days.append(())
+    return CompactTimetable(interner.string(student_id), slots, tuple(days))
@@ -0,0 +1,214 @@
+"""不需要Tk與顯示器的課表圖片輸出(SVG，有安裝Pillow時也能輸出PNG)
+
+    python codes/render.py ids.txt out/ --format svg --view mix --processes 4
+
+版面由layout.py計算，跟視窗裡的課表相同；文字寬度沒有Tk可以量，用估計值換行。
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import re
+import sys
+from typing import Iterable, List, NamedTuple, Optional
+from xml.sax.saxutils import escape
+
+from layout import (FONT_FAMILY, LAYERS, LINE_SPACING, GridLayout, layout_error, layout_timetable,
+                    points_to_pixels, wrap_text)
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:     # PNG輸出是選用功能
+    Image = ImageDraw = ImageFont = None
+
+DEFAULT_WIDTH = 960
+DEFAULT_HEIGHT = 560
+FORMATS = ("svg", "png")
+VIEWS = ("single", "mix")
+# PNG用的字型檔(需要支援中文)，沒有設定時用Pillow內建字型
+FONT_PATH = os.environ.get("NTUB_FONT")
+_UNSAFE_CHARS = re.compile(r"[^0-9A-Za-z_-]")
+
+
+class RenderResult(NamedTuple):
+    student_id: str
+    path: Optional[str]
+    error: Optional[str] = None
+
+
+def _ordered(layout: GridLayout):
+    """依圖層由下往上排序(同一圖層保持原本順序)"""
+    return sorted(layout.primitives, key=lambda item: LAYERS.index(item.layer))
+
+
+def _font_parts(font):
+    family = font[0] if font else FONT_FAMILY
+    size = font[1] if len(font) > 1 else 10
+    bold = len(font) > 2 and "bold" in font[2:]
+    return family, size, bold
+
+
+def svg_document(layout: GridLayout) -> str:
+    """把版面轉成SVG字串"""
+    x0, y0, x1, y1 = layout.scrollregion
+    width = max(layout.width, x1 - x0)
+    height = max(layout.height, y1 - y0)
+    out = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="{x0} {y0} {width} {height}">',
+        f'<rect x="{x0}" y="{y0}" width="{width}" height="{height}" fill="white"/>',
+    ]
+    for item in _ordered(layout):
+        o = item.options
+        if item.kind == "line":
+            ax, ay, bx, by = item.coords
+            out.append(f'<line x1="{ax}" y1="{ay}" x2="{bx}" y2="{by}" '
+                       f'stroke="{o.get("fill", "black")}" stroke-width="{o.get("width", 1)}"/>')
+        elif item.kind == "rectangle":
+            ax, ay, bx, by = item.coords
+            out.append(f'<rect x="{ax}" y="{ay}" width="{bx - ax}" height="{by - ay}" '
+                       f'fill="{o.get("fill") or "none"}" stroke="{o.get("outline", "black")}"/>')
+        elif item.kind == "text":
+            family, size, bold = _font_parts(o.get("font", ()))
+            size_px = points_to_pixels(size)
+            lines = wrap_text(o.get("text", ""), size, o.get("width"))
+            cx, cy = item.coords
+            top = cy - (len(lines) - 1) * size_px * LINE_SPACING / 2
+            weight = ' font-weight="bold"' if bold else ""
+            out.append(f'<text x="{cx}" y="{top:.1f}" font-family="{escape(family)}, sans-serif" '
+                       f'font-size="{size_px:.1f}"{weight} '
+                       f'fill="{o.get("fill", "black")}" text-anchor="middle" dominant-baseline="central">')
+            for i, line in enumerate(lines):
+                dy = "0" if i == 0 else f"{size_px * LINE_SPACING:.1f}"
+                out.append(f'<tspan x="{cx}" dy="{dy}">{escape(line)}</tspan>')
+            out.append('</text>')
+    out.append('</svg>')
+    return "\n".join(out)
+
+
+def write_svg(layout: GridLayout, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(svg_document(layout))
+
+
+def _load_font(size_px: float):
+    if FONT_PATH:
+        return ImageFont.truetype(FONT_PATH, int(round(size_px)))
+    try:
+        return ImageFont.load_default(size=int(round(size_px)))
+    except TypeError:   # Pillow 10.1以前的load_default沒有size參數
+        return ImageFont.load_default()
+
+
+def write_png(layout: GridLayout, path: str):
+    """需要Pillow；中文字請用NTUB_FONT環境變數指定字型檔"""
+    if Image is None:
+        raise RuntimeError("輸出PNG需要安裝Pillow (pip install Pillow)")
+    x0, y0, x1, y1 = layout.scrollregion
+    width = int(max(layout.width, x1 - x0))
+    height = int(max(layout.height, y1 - y0))
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    fonts = {}
+
+    for item in _ordered(layout):
+        o = item.options
+        if item.kind == "line":
+            draw.line(item.coords, fill=o.get("fill", "black"), width=int(o.get("width", 1)))
+        elif item.kind == "rectangle":
+            draw.rectangle(item.coords, fill=o.get("fill") or None, outline=o.get("outline", "black"))
+        elif item.kind == "text":
+            _, size, _ = _font_parts(o.get("font", ()))
+            size_px = points_to_pixels(size)
+            font = fonts.get(size_px)
+            if font is None:
+                font = fonts[size_px] = _load_font(size_px)
+            lines = wrap_text(o.get("text", ""), size, o.get("width"))
+            cx, cy = item.coords
+            top = cy - (len(lines) - 1) * size_px * LINE_SPACING / 2
+            for i, line in enumerate(lines):
+                draw.text((cx, top + i * size_px * LINE_SPACING), line, font=font,
+                          fill=o.get("fill", "black"), anchor="mm")
+    image.save(path, "PNG")
+
+
+def render_timetable(student_id: str, result, out_dir: str, fmt: str = "svg", view: str = "single",
+                     width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT) -> RenderResult:
+    """把一位學生的課表(get_single_class_table的結果)輸出成圖片；給行程池呼叫"""
+    try:
+        if result == "無此人":
+            layout = layout_error("錯誤: 此學號不存在或沒選課", width, height)
+        else:
+            layout = layout_timetable(result, view, width, height)
+        path = os.path.join(out_dir, f"{_UNSAFE_CHARS.sub('_', student_id)}.{fmt}")
+        if fmt == "png":
+            write_png(layout, path)
+        else:
+            write_svg(layout, path)
+        return RenderResult(student_id, path)
+    except Exception as e:
+        return RenderResult(student_id, None, str(e))
+
+
+def render_many(student_ids: Iterable[str], out_dir: str, fmt: str = "svg", view: str = "single",
+                processes: Optional[int] = None, max_workers: int = 16, client=None,
+                width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT) -> List[RenderResult]:
+    """查詢多位學生的課表並輸出圖片
+
+    下載在執行緒池進行(batch_class_tables)，版面計算與輸出在多個行程同時進行，
+    完成一位學生就交給行程池，不必等全部下載完。
+    """
+    from batch import batch_class_tables
+    from table import WEEKDAYS, build_single_class_table, with_weekend_if_empty
+
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的格式: {fmt}")
+    if fmt == "png" and Image is None:
+        raise RuntimeError("輸出PNG需要安裝Pillow (pip install Pillow)")
+    os.makedirs(out_dir, exist_ok=True)
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        futures = []
+        for fetched in batch_class_tables(student_ids, max_workers=max_workers, client=client, days=WEEKDAYS):
+            # 週一到週五都沒課時補抓週末，只有週末有課的學生不算查無此人
+            class_table, class_time, errors = with_weekend_if_empty(
+                fetched.student_id, fetched.class_table, fetched.class_time, fetched.error_list, client)
+            if errors:
+                results.append(RenderResult(fetched.student_id, None, "; ".join(str(e) for e in errors)))
+                continue
+            result = build_single_class_table(class_table, class_time, errors)
+            futures.append(pool.submit(render_timetable, fetched.student_id, result, out_dir,
+                                       fmt, view, width, height))
+        for future in concurrent.futures.as_completed(futures):
+            results.append(future.result())
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批次輸出課表圖片(不需要視窗)")
+    parser.add_argument("ids", help="學號清單檔案(一行一個)")
+    parser.add_argument("output", help="輸出資料夾")
+    parser.add_argument("--format", choices=FORMATS, default="svg")
+    parser.add_argument("--view", choices=VIEWS, default="single", help="single=課表, mix=行事曆用課表")
+    parser.add_argument("--processes", type=int, help="輸出圖片的行程數(預設CPU數)")
+    parser.add_argument("--workers", type=int, default=16, help="下載的執行緒數")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH)
+    parser.add_argument("--height", type=int, default=DEFAULT_HEIGHT)
+    args = parser.parse_args(argv)
+
+    with open(args.ids, encoding="utf-8") as f:
+        student_ids = [line.strip() for line in f if line.strip()]
+
+    results = render_many(student_ids, args.output, args.format, args.view, args.processes,
+                          args.workers, width=args.width, height=args.height)
+    failed = [r for r in results if r.error]
+    for r in failed:
+        print(f"{r.student_id}: {r.error}", file=sys.stderr)
+    print(json.dumps({"rendered": len(results) - len(failed), "failed": len(failed)}), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""行事曆訂閱伺服器：GET /calendar/<學號>.ics
+
+    python codes/server.py --port 8080 --until 2027-01-20
+
+行事曆App(Google/Apple/Outlook)訂閱 webcal://主機:8080/calendar/<學號>.ics 之後會定期輪詢。
+每位學生的行事曆只在第一次或過期時向學校伺服器查詢，其餘請求都直接從記憶體回應：
+- 強ETag與Last-Modified，If-None-Match/If-Modified-Since相符時回304
+- 預先壓縮好的gzip版本
+- 過期的行事曆先照舊回應，在背景重新產生(課表沒變時ETag不變)
+- 第一次產生最多等--time-limit秒，學校伺服器太慢時回504；
+  加--partial時改為先提供缺了幾天的行事曆(X-Missing-Days標頭)，下一次請求時在背景補齊
+
+GET /metrics 回傳各階段耗時(Prometheus文字格式)，/metrics.json是JSON摘要。
+"""
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import email.utils
+import gzip
+import hashlib
+import http.server
+import re
+import sys
+import threading
+import json
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import metrics
+from cache import ResponseCache
+from client import ClassTableClient
+from hedge import Hedger, RetryPolicy
+from limiter import AimdLimiter
+from ics import calendar_bytes, diff_calendar, iter_events
+from deadline import Deadline, DeadlineExceeded
+from table import FetchFailed, build_mix_class_table, missing_days, personal_class_table
+
+DEFAULT_TTL = 60 * 60               # 一小時後在背景重新產生
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_REFRESH_WORKERS = 4
+# 每位學生最多等幾秒
+DEFAULT_TIME_LIMIT = 15.0
+# 缺了幾天的行事曆讓行事曆App早一點再來拿
+PARTIAL_MAX_AGE = 60
+CALENDAR_PATH = re.compile(r"^/calendar/([0-9A-Za-z]{1,20})\.ics$")
+
+
+class NotFound(Exception):
+    """查不到這個學號"""
+
+
+class CalendarEntry(NamedTuple):
+    """記憶體裡一位學生的行事曆"""
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    gzip_etag: str
+    last_modified: float        # epoch秒
+    built_at: float             # time.monotonic()
+    # 沒有取得的星期(--partial)；不是空的時候一律當成過期，下次請求時在背景補齊
+    missing_days: Tuple[int, ...] = ()
+
+    def is_fresh(self, ttl: float) -> bool:
+        return not self.missing_days and time.monotonic() - self.built_at < ttl
+
+    def matches(self, if_none_match: str) -> bool:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or self.gzip_etag in tags
+
+
+class CalendarStore:
+    """以學號為鍵的行事曆快取(LRU)，同一位學生同時只會產生一次"""
+
+    def __init__(self, client: ClassTableClient,
+                 ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 until_date: Optional[datetime.date] = None,
+                 refresh_workers: int = DEFAULT_REFRESH_WORKERS,
+                 time_limit: Optional[float] = DEFAULT_TIME_LIMIT,
+                 partial: bool = False):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.until_date = until_date
+        self.time_limit = time_limit
+        self.partial = partial
+        self._entries: "collections.OrderedDict[str, CalendarEntry]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # 正在產生的行事曆；同一位學生的其他請求等同一個結果(成功、失敗或缺了幾天都一樣)
+        self._building: Dict[str, concurrent.futures.Future] = {}
+        self._refreshing = set()
+        self._executor = concurrent.futures.ThreadPoolExecutor(refresh_workers, thread_name_prefix="calendar-refresh")
+
+    def peek(self, student_id: str) -> Optional[CalendarEntry]:
+        """只看記憶體；過期時排入背景重新產生，但仍回傳舊的內容"""
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(student_id)
+            if not entry.is_fresh(self.ttl) and student_id not in self._refreshing:
+                self._refreshing.add(student_id)
+                self._executor.submit(self._refresh, student_id)
+        return entry
+
+    def get(self, student_id: str) -> CalendarEntry:
+        """取得行事曆，記憶體裡沒有時向學校伺服器查詢(會阻塞)"""
+        entry = self.peek(student_id)
+        if entry is not None:
+            return entry
+        return self.build(student_id)
+
+    def build(self, student_id: str) -> CalendarEntry:
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None and entry.is_fresh(self.ttl):
+                # 其他執行緒剛產生好，不必重新產生
+                return entry
+            future = self._building.get(student_id)
+            leader = future is None
+            if leader:
+                future = self._building[student_id] = concurrent.futures.Future()
+        if not leader:
+            # 這一輪由第一個請求負責產生，失敗時一起回報失敗，不再各自重試
+            return future.result()
+
+        try:
+            entry = self._build(student_id, entry)
+        except BaseException as e:
+            with self._lock:
+                self._building.pop(student_id, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[student_id] = entry
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._building.pop(student_id, None)
+        future.set_result(entry)
+        return entry
+
+    def _build(self, student_id: str, previous: Optional[CalendarEntry]) -> CalendarEntry:
+        deadline = Deadline(self.time_limit) if self.time_limit is not None else None
+        class_table, class_time, errors = personal_class_table(
+            student_id, self.client, refresh=previous is not None, deadline=deadline)
+        missing = tuple(missing_days(errors))
+        # 已經有完整的行事曆時，不要用缺了幾天的版本取代(失敗時繼續提供舊的)
+        if errors and (not self.partial or (previous is not None and not previous.missing_days)):
+            raise FetchFailed(student_id, errors)
+        result = build_mix_class_table(class_table, class_time, errors, partial=self.partial)
+        if result == "無此人":
+            raise NotFound(student_id)
+        if not isinstance(result, dict):
+            raise RuntimeError(f"無法取得 {student_id} 的課表")
+
+        events = iter_events(result)
+        if previous is not None:
+            diff = diff_calendar(previous.body.decode("utf-8"), events, self.until_date)
+            if not diff.has_changes:
+                # 課表沒變：沿用原本的內容與ETag，訂閱者不必重新下載
+                return previous._replace(built_at=time.monotonic(), missing_days=missing)
+            events = diff.events
+
+        body = calendar_bytes(events, self.until_date)
+        gzip_body = gzip.compress(body, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        # 同一個ETag不能對應兩種不同的bytes，gzip版本用另一個強ETag
+        return CalendarEntry(body, gzip_body, f'"{digest}"', f'"{digest}-gz"',
+                             float(int(time.time())), time.monotonic(), missing)
+
+    def _refresh(self, student_id: str):
+        try:
+            self.build(student_id)
+        except Exception:
+            # 更新失敗時繼續提供舊的內容，下次請求再試
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(student_id)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CalendarHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "NTUBTimetable/1.0"
+    store: CalendarStore
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body: bool):
+        path = self.path.split("?", 1)[0]
+        if path in ("/metrics", "/metrics.json"):
+            self._send_metrics(path, send_body)
+            return
+        match = CALENDAR_PATH.match(path)
+        if match is None:
+            self._send_error(404, "not found", send_body)
+            return
+        student_id = match.group(1)
+
+        store = self.store
+        try:
+            entry = store.get(student_id)
+        except NotFound:
+            self._send_error(404, "student not found", send_body)
+            return
+        except FetchFailed as e:
+            timed_out = any(isinstance(getattr(error, "cause", None), DeadlineExceeded) for error in e.errors)
+            self._send_error(504 if timed_out else 502, f"upstream error: {e}", send_body)
+            return
+        except Exception as e:
+            self._send_error(502, f"upstream error: {e}", send_body)
+            return
+
+        use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        etag = entry.gzip_etag if use_gzip else entry.etag
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(entry.last_modified, usegmt=True),
+            "Cache-Control": f"private, max-age={int(store.ttl)}",
+            "Vary": "Accept-Encoding",
+        }
+        if entry.missing_days:
+            headers["Cache-Control"] = f"private, max-age={min(int(store.ttl), PARTIAL_MAX_AGE)}"
+            headers["X-Missing-Days"] = ",".join(str(day) for day in entry.missing_days)
+
+        if self._not_modified(entry):
+            self._send(304, b"", headers, send_body=False)
+            return
+
+        headers["Content-Type"] = "text/calendar; charset=utf-8"
+        headers["Content-Disposition"] = f'inline; filename="{student_id}.ics"'
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, entry.gzip_body if use_gzip else entry.body, headers, send_body)
+
+    def _send_metrics(self, path: str, send_body: bool):
+        if path.endswith(".json"):
+            body = json.dumps(metrics.summary(), ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        else:
+            body = metrics.to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        self._send(200, body, {"Content-Type": content_type, "Cache-Control": "no-store"}, send_body)
+
+    def _not_modified(self, entry: CalendarEntry) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return entry.matches(if_none_match)
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return entry.last_modified <= since
+        return False
+
+    def _send(self, status: int, body: bytes, headers: Dict[str, str], send_body: bool):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, send_body: bool):
+        self._send(status, message.encode("utf-8"),
+                   {"Content-Type": "text/plain; charset=utf-8", "Cache-Control": "no-store"}, send_body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CalendarServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 訂閱的App中途斷線是常有的事，不印出堆疊
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(host: str, port: int, store: CalendarStore) -> CalendarServer:
+    handler = type("Handler", (CalendarHandler,), {"store": store})
+    return CalendarServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NTUB課表行事曆訂閱伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="幾秒後在背景重新產生行事曆")
+    parser.add_argument("--until", type=datetime.date.fromisoformat,
+                        help="重複到這一天(YYYY-MM-DD)，預設無限重複")
+    parser.add_argument("--pool-size", type=int, default=16, help="連到學校伺服器的連線數")
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES)
+    parser.add_argument("--disk-cache", action="store_true", help="原始回應另外存到硬碟快取")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="依學校伺服器的回應自動調整同時請求數(最多--pool-size，目前的值在/metrics)")
+    parser.add_argument("--time-limit", type=float, default=DEFAULT_TIME_LIMIT, metavar="SECONDS",
+                        help="第一次產生行事曆時最多等學校伺服器幾秒")
+    parser.add_argument("--partial", action="store_true",
+                        help="到期時先提供缺了幾天的行事曆，之後在背景補齊(預設回504)")
+    parser.add_argument("--hedge", action="store_true",
+                        help="學校伺服器的回應比最近的p95慢時另外送一個相同的請求(統計在/metrics)")
+    parser.add_argument("--log-level", help="DEBUG/INFO/WARNING/ERROR(預設NTUB_LOG_LEVEL或WARNING)")
+    args = parser.parse_args(argv)
+    metrics.configure_logging(args.log_level)
+
+    client = ClassTableClient(pool_size=args.pool_size,
+                              cache=ResponseCache(ttl=args.ttl) if args.disk_cache else None,
+                              limiter=AimdLimiter(max_limit=args.pool_size, name="server") if args.adaptive else None,
+                              retry=RetryPolicy(),
+                              hedger=Hedger(max_workers=args.pool_size * 2) if args.hedge else None)
+    store = CalendarStore(client, args.ttl, args.max_entries, args.until,
+                          time_limit=args.time_limit, partial=args.partial)
+    server = make_server(args.host, args.port, store)
+    print(f"serving http://{args.host}:{server.server_address[1]}/calendar/<學號>.ics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
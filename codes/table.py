@@ -1,39 +1,85 @@
-import requests
-from bs4 import BeautifulSoup
 import concurrent.futures
-from typing import List, Dict, Tuple, Optional
+from typing import TYPE_CHECKING, Callable, Iterable, List, Dict, Tuple, Optional
 import threading
+import time
+import metrics
 from api import ClassTableURL
+from blocks import week_blocks
+from client import ClassTableClient, describe_error, get_default_client
+from deadline import Deadline, DeadlineExceeded
+from extract import extract_class_table_day
+from model import CompactTimetable, Interner, build_compact_timetable
+
+if TYPE_CHECKING:
+    # bs4只有舊的解析方式(PARSER_BACKEND="bs4")會用到，需要時才載入
+    from bs4 import BeautifulSoup
 # 設定課表查詢API的URL
 CLASS_TABLE_URL = ClassTableURL  
 CLASS_MAP_KEY = ["name", "teacher", "room"]
 
-def get_personal_class_table(student_id: str, today: int) -> Optional[BeautifulSoup]:
-    """發送請求獲取課表並返回BeautifulSoup物件"""
-    client = requests.Session()
-    
-    data = {"StdNo": student_id, "today": str(today)}
+ALL_DAYS = range(1, 8)
+# get_single_class_table只用到週一到週五
+WEEKDAYS = range(1, 6)
+WEEKEND = range(6, 8)
+DAY_NAMES = "一二三四五六日"
+# 硬碟快取記錄為沒課的星期，超過這麼多秒就不再相信，重新下載確認(加選或調課)
+KNOWN_EMPTY_MAX_AGE = 7 * 24 * 60 * 60
+
+# 解析課表HTML的方式: "stream"(extract.py的單次掃描解析器) 或 "bs4"(BeautifulSoup)
+PARSER_BACKENDS = ("stream", "bs4")
+PARSER_BACKEND = "stream"
+
+log = metrics.get_logger("table")
+
+
+class FetchCancelled(Exception):
+    """下載途中被使用者取消"""
+
+
+class DayFetchError(Exception):
+    """某一天的課表查詢失敗(重試之後)，cause是原本的例外"""
+
+    def __init__(self, student_id: str, day: int, cause: Exception):
+        super().__init__(student_id, day, cause)
+        self.student_id = student_id
+        self.day = day
+        self.cause = cause
+
+    def __str__(self):
+        return f"星期{DAY_NAMES[self.day - 1]}: {describe_error(self.cause)}"
+
+
+class FetchFailed(Exception):
+    """有星期查詢失敗，errors是每一天的DayFetchError"""
+
+    def __init__(self, student_id: str, errors: List[Exception]):
+        super().__init__(student_id, errors)
+        self.student_id = student_id
+        self.errors = sorted(errors, key=lambda e: getattr(e, "day", 0))
+
+    def __str__(self):
+        return "；".join(str(e) for e in self.errors)
+
+
+def get_personal_class_table(student_id: str, today: int,
+                             client: Optional[ClassTableClient] = None,
+                             refresh: bool = False) -> Optional["BeautifulSoup"]:
+    """發送請求獲取課表並返回BeautifulSoup物件
+
+    client有設定快取時會優先使用快取，refresh=True則強制重新下載。
+    """
+    if client is None:
+        client = get_default_client()
     
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "X-Requested-With": "com.hanglong.NTUBStdApp"
-    }
+    from bs4 import BeautifulSoup
 
-    try:
-        response = client.post(CLASS_TABLE_URL, data=data, headers=headers)
-        print(response.status_code)
-        print(response.headers)
-        print(response.url)
-        print(data)
-        response.raise_for_status()  # 當HTTP請求發生錯誤時拋出異常
-        print(response.text)
-        # 解析HTML回應
-        doc = BeautifulSoup(response.text, 'html.parser')
-        return doc
-    except requests.exceptions.RequestException as e:
-        raise e
-
-def personal_class_table_by_day(doc: BeautifulSoup) -> List[Optional[Dict[str, str]]]:
+    html = client.fetch_schedule(student_id, today, refresh)
+    log.debug("StdNo=%s today=%s: %d bytes", student_id, today, len(html))
+    # 解析HTML回應
+    doc = BeautifulSoup(html, 'html.parser')
+    return doc
+
+def personal_class_table_by_day(doc: "BeautifulSoup") -> List[Optional[Dict[str, str]]]:
     """從HTML文件中提取特定日期的課程信息"""
     class_table_of_day = []
     
@@ -64,7 +110,7 @@ def personal_class_table_by_day(doc: BeautifulSoup) -> List[Optional[Dict[str, s
     
     return class_table_of_day
 
-def personal_class_table_time(doc: BeautifulSoup) -> List[Dict[str, str]]:
+def personal_class_table_time(doc: "BeautifulSoup") -> List[Dict[str, str]]:
     """從課表中提取時間信息"""
     time_list = []
     
@@ -85,8 +131,60 @@ def personal_class_table_time(doc: BeautifulSoup) -> List[Dict[str, str]]:
     
     return time_list
 
-def personal_class_table(student_id: str) -> Tuple[List[List[Optional[Dict[str, str]]]], List[Dict[str, str]], List[Exception]]:
-    """獲取學生一週七天的完整課表"""
+@metrics.timed("parse")
+def parse_class_table_day(html: str, with_time: bool = True,
+                          backend: Optional[str] = None) -> Tuple[List[Optional[Dict[str, str]]], List[Dict[str, str]]]:
+    """解析某一天的課表HTML，回傳(當天課程, 節次時間)
+
+    backend未指定時使用PARSER_BACKEND，兩種解析方式的輸出完全相同。
+    """
+    backend = backend or PARSER_BACKEND
+    if backend == "stream":
+        return extract_class_table_day(html, with_time)
+    if backend != "bs4":
+        raise ValueError(f"未知的解析方式: {backend}")
+
+    from bs4 import BeautifulSoup
+    doc = BeautifulSoup(html, 'html.parser')
+    day_time = personal_class_table_time(doc) if with_time else []
+    return personal_class_table_by_day(doc), day_time
+
+def fetch_class_table_day(student_id: str, today: int,
+                          client: Optional[ClassTableClient] = None,
+                          with_time: bool = True,
+                          refresh: bool = False,
+                          deadline: Optional[Deadline] = None) -> Tuple[List[Optional[Dict[str, str]]], List[Dict[str, str]]]:
+    """抓取並解析某一天的課表，回傳(當天課程, 節次時間)
+
+    with_time=False時不解析節次時間(每一天的節次都一樣，只需要解析一次)。
+    """
+    if client is None:
+        client = get_default_client()
+    html = client.fetch_schedule(student_id, today, refresh, deadline)
+    return parse_class_table_day(html, with_time)
+
+def personal_class_table(student_id: str, client: Optional[ClassTableClient] = None,
+                         executor: Optional[concurrent.futures.Executor] = None,
+                         refresh: bool = False,
+                         days: Optional[Iterable[int]] = None,
+                         known_empty: Optional[Iterable[int]] = None,
+                         progress: Optional[Callable[[int, int, int], None]] = None,
+                         cancel: Optional[threading.Event] = None,
+                         deadline: Optional[Deadline] = None) -> Tuple[List[List[Optional[Dict[str, str]]]], List[Dict[str, str]], List[Exception]]:
+    """獲取學生一週七天的完整課表(七天的請求共用同一個連線池)
+
+    有傳入executor時使用呼叫端共用的執行緒池，避免每次呼叫都另開一個。
+    days指定需要的星期(1~7，預設全部)，known_empty是已知沒課的星期；
+    沒有下載的星期在課表裡是空清單。
+    每完成一天會在下載的執行緒呼叫progress(星期, 已完成天數, 總天數)。
+    cancel被設定後，還沒開始的星期不再下載，並丟出FetchCancelled。
+    失敗的星期(client的重試用完之後)以DayFetchError放進錯誤清單。
+    deadline到期時不再等待還沒完成的星期(記為DeadlineExceeded)，之後才回來的結果也不採用。
+    """
+    if client is None:
+        client = get_default_client()
+    fetch_days = sorted(set(ALL_DAYS if days is None else days) - set(known_empty or ()))
+
     class_table = [[] for _ in range(7)]
     class_time = []
     error_list = []
@@ -94,44 +192,145 @@ def personal_class_table(student_id: str) -> Tuple[List[List[Optional[Dict[str,
     # 用於線程安全操作共享資源的鎖
     lock = threading.Lock()
     
-    def fetch_day(today: int):
+    done = 0
+    # 回傳之後(超過時間限制)才完成的星期不再寫入結果
+    closed = False
+
+    def fetch_day(today: int, submitted_at: float):
+        nonlocal class_time, done
+        metrics.observe("queue_wait", time.perf_counter() - submitted_at)
+        if cancel is not None and cancel.is_set():
+            return
         try:
-            doc = get_personal_class_table(student_id, today)
-            day_classes = personal_class_table_by_day(doc)
+            html = client.fetch_schedule(student_id, today, refresh, deadline)
+            # 每一天的節次都一樣，只要還沒有寫入的星期提供過就提取時間信息；
+            # 提取到的星期沒有寫入(失敗或超過時間)時，之後的星期仍會提取
+            with lock:
+                with_time = not class_time
+            day_classes, day_time = parse_class_table_day(html, with_time)
             
             with lock:
+                if closed:
+                    return
                 class_table[today-1] = day_classes
                 
-                # 只從第一天提取時間信息
-                if today == 1:
-                    nonlocal class_time
-                    class_time = personal_class_table_time(doc)
+                if with_time and not class_time:
+                    class_time = day_time
         
         except Exception as e:
             with lock:
-                error_list.append(e)
-    
-    # 使用ThreadPoolExecutor進行併發處理
-    with concurrent.futures.ThreadPoolExecutor(max_workers=7) as executor:
-        # 提交所有7天的任務
-        futures = [executor.submit(fetch_day, day) for day in range(1, 8)]
-        
-        # 等待所有任務完成
-        concurrent.futures.wait(futures)
+                if closed:
+                    return
+                error_list.append(DayFetchError(student_id, today, e))
+            log.warning("%s 星期%s 查詢失敗: %r", student_id, today, e)
+
+        if progress is not None:
+            with lock:
+                done += 1
+                finished = done
+            progress(today, finished, len(fetch_days))
     
-    return class_table, class_time, error_list
+    if not fetch_days:
+        return class_table, class_time, error_list
+
+    own_executor = executor is None
+    if own_executor:
+        # 使用ThreadPoolExecutor進行併發處理
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(fetch_days))
+    try:
+        # 提交所有要下載的星期，等待完成或到期
+        futures = {executor.submit(fetch_day, day, time.perf_counter()): day for day in fetch_days}
+        _, not_done = concurrent.futures.wait(futures, timeout=None if deadline is None else deadline.remaining())
+    finally:
+        if own_executor:
+            # 超過時間限制的請求不等它們結束(逾時已縮短到deadline，很快會自己結束)
+            executor.shutdown(wait=False)
+
+    if cancel is not None and cancel.is_set():
+        raise FetchCancelled(student_id)
+    with lock:
+        closed = True
+        for future in not_done:
+            future.cancel()
+            error_list.append(DayFetchError(student_id, futures[future],
+                                            DeadlineExceeded(f"超過 {deadline.seconds:g} 秒的時間限制")))
+        return class_table, class_time, list(error_list)
+
+def missing_days(errors: Iterable[Exception]) -> List[int]:
+    """錯誤清單裡沒有取得的星期(1~7)"""
+    return sorted({e.day for e in errors if isinstance(e, DayFetchError)})
+
+def known_empty_days(student_id: str, client: Optional[ClassTableClient] = None,
+                     max_age: Optional[float] = None) -> List[int]:
+    """從硬碟快取的歷史資料找出這位學生沒課的星期
+
+    過期的快取也會參考(課表一學期才變幾次)；max_age秒以上的資料則不採用。
+    client沒有快取時回傳空清單。
+    """
+    if client is None:
+        client = get_default_client()
+    cache = client.cache
+    if cache is None:
+        return []
+
+    empty = []
+    for today in ALL_DAYS:
+        entry = cache.get(student_id, today)
+        if entry is None or (max_age is not None and not entry.is_fresh(max_age)):
+            continue
+        day_classes, _ = parse_class_table_day(entry.text, with_time=False)
+        if all(x is None for x in day_classes):
+            empty.append(today)
+    return empty
+
+def personal_class_table_compact(student_id: str, client: Optional[ClassTableClient] = None,
+                                 interner: Optional[Interner] = None,
+                                 refresh: bool = False) -> Tuple[CompactTimetable, List[Exception]]:
+    """跟personal_class_table一樣，但回傳佔用記憶體較少的CompactTimetable"""
+    class_table, class_time, errors = personal_class_table(student_id, client, refresh=refresh)
+    return build_compact_timetable(student_id, class_table, class_time, interner), errors
 
 # 使用示例
 
 
-def get_single_class_table(student_id):
-    class_table, class_time, errors = personal_class_table(student_id)
+def get_single_class_table(student_id, client=None, refresh=False, time_limit=None, partial=False):
+    """time_limit是整位學生最多等幾秒，partial的意思同build_single_class_table"""
+    deadline = Deadline(time_limit) if time_limit is not None else None
+    # 課表格式只顯示週一到週五，週末不必下載
+    data = personal_class_table(student_id, client, refresh=refresh, days=WEEKDAYS, deadline=deadline)
+    return build_single_class_table(*with_weekend_if_empty(student_id, *data, client=client, refresh=refresh,
+                                                           deadline=deadline), partial=partial)
+
+def _has_no_classes(class_table) -> bool:
+    """每一天都沒有課(沒有下載的星期是空清單，也算沒課)"""
+    return all(all(x is None for x in day) for day in class_table)
+
+def with_weekend_if_empty(student_id, class_table, class_time, errors, client=None, refresh=False, deadline=None):
+    """只下載了週一到週五而且都沒課時補抓週末，回傳(課表, 節次時間, 錯誤)
+
+    只有週末有課的學生不是「無此人」，要看過週末才能判斷；其他情況原樣回傳。
+    """
+    if errors or not _has_no_classes(class_table):
+        return class_table, class_time, errors
+    weekend, weekend_time, errors = personal_class_table(student_id, client, refresh=refresh, days=WEEKEND,
+                                                         deadline=deadline)
+    class_table = [class_table[day - 1] if day in WEEKDAYS else weekend[day - 1] for day in ALL_DAYS]
+    return class_table, class_time or weekend_time, errors
+
+@metrics.timed("merge")
+def build_single_class_table(class_table, class_time, errors, partial=False):
+    """由personal_class_table的結果產生課表格式(週一到週五的時間格)
+
+    有星期失敗時回傳[]；partial=True時仍用取得的星期產生，
+    沒有取得的星期是空的(哪幾天用missing_days(errors)得知)。
+    """
+    missing = missing_days(errors) if partial else []
 # Check if all elements in class_table are None
-    if all(all(x is None for x in day) for day in class_table):
+    if not missing and _has_no_classes(class_table):
         #print("無此人")
         return "無此人"
 
-    if errors:
+    if errors and not partial:
         return []
 
     # Create a list to store formatted time slots
@@ -167,76 +366,46 @@ def get_single_class_table(student_id):
  
     #print(result)
     return result
-def get_mix_class_table(student_id) :   
-    
+def get_mix_class_table(student_id, client=None, refresh=False, time_limit=None, partial=False) :   
+    """time_limit是整位學生最多等幾秒，partial的意思同build_mix_class_table"""
+    deadline = Deadline(time_limit) if time_limit is not None else None
+    return build_mix_class_table(*personal_class_table(student_id, client, refresh=refresh, deadline=deadline),
+                                 partial=partial)
 
-    result={"class":[],"place":[],"day":[],"start":[],"end":[]}
-    
-    class_table, class_time, errors = personal_class_table(student_id)
+@metrics.timed("merge")
+def build_mix_class_table(class_table, class_time, errors, partial=False):
+    """由personal_class_table的結果產生行事曆格式(合併後的課程欄位)
+
+    partial=True時有星期失敗也用取得的星期產生，沒有取得的星期列在"missing_days"。
+    """
 
-    if all(all(x is None for x in day) for day in class_table):
+    result={"class":[],"place":[],"day":[],"start":[],"end":[],"teacher":[],"periods":[]}
+    missing = missing_days(errors) if partial else []
+    if partial:
+        result["missing_days"] = missing
+
+    if not missing and _has_no_classes(class_table):
         #print("無此人")
         return "無此人"
 
-    if errors:
-        #print(f"發生 {len(errors)} 個錯誤:")
+    if errors and not partial:
         for e in errors:
-            print(f"- {e}")
+            log.warning("查詢課表失敗: %s", e)
 
     else:
-        print("\n課表:")
-        for day_index, day_classes in enumerate(class_table):
-            # Check if there are any classes on this day
-            has_classes = any(class_info is not None for class_info in day_classes)
+        # 同一天只有連續的節次才合併，同一門課中間有空堂時是兩個事件
+        for block in week_blocks(class_table, class_time):
+            name, teacher, room = block.value
+            result["class"].append(name)
+            result["place"].append(room)
+            result["day"].append(block.day)
+            result["start"].append(class_time[block.start_row]['start_at'])
+            result["end"].append(class_time[block.end_row]['end_at'][:-5])
+            result["teacher"].append(teacher)
+            # 第幾節(1開始)，用來產生固定的UID
+            result["periods"].append(block.periods)
 
-            if has_classes:
-                
-                #print(f"\n【星期{day_index + 1}】")
-                
-                # 用於存儲合併後的課程
-                merged_classes = {}
-
-                # 遍歷當天所有課程
-                for i, class_info in enumerate(day_classes):
-                    if class_info:
-                        class_key = f"{class_info['name']}_{class_info['teacher']}_{class_info['room']}"
-                        # 如果課程已存在，添加新的時間段
-                        if class_key in merged_classes:
-                            merged_classes[class_key]['periods'].append({
-                                'period': i + 1,
-                                'start': class_time[i]['start_at'],
-                                'end': class_time[i]['end_at'][:-5]
-                            })
-                        else:
-                            # 如果是新課程，創建新條目
-                            merged_classes[class_key] = {
-                                'name': class_info['name'],
-                                'teacher': class_info['teacher'],
-                                'room': class_info['room'],
-                                'periods': [{
-                                    'period': i + 1,
-                                    'start': class_time[i]['start_at'],
-                                    'end': class_time[i]['end_at'][:-5]
-                                }]
-                            }
-
-                # 顯示合併後的課程
-                for class_info in merged_classes.values():
-
-                    periods = [p['period'] for p in class_info['periods']]
-                    if len(periods) > 1:
-                        period_str = f"第{periods[0]}~{periods[-1]}節:"
-                    else:
-                        period_str = f"第{periods[0]}節:"
-
-                    #print(f"{period_str} {class_info['name']} - {class_info['teacher']} ({class_info['room']}) / ({class_info['periods'][0]['start']} - {class_info['periods'][-1]['end']})")
-                    
-                    result["class"].append(class_info['name'])
-                    result["place"].append(class_info['room'])
-                    result["day"].append(day_index+1)
-                    result["start"].append(class_info['periods'][0]['start'])
-                    result["end"].append(class_info['periods'][-1]['end'])
-            
+        log.debug("合併成 %d 堂課", len(result["class"]))
         return result
 
                     # periods = class_info['periods']
@@ -249,7 +418,121 @@ def get_mix_class_table(student_id) :
 
 
 
+class StudentTimetable:
+    """一位學生的課表，只下載一次就能產生課表與行事曆兩種格式
+
+    下載結果保留在記憶體裡，直到換學號(建立新的物件)或呼叫refresh()。
+    每種格式只下載需要的星期：課表格式只要週一到週五，之後要行事曆格式時只補抓週末。
+    skip_known_empty=True時，課表格式不下載硬碟快取記錄為沒課的星期(重新整理時仍會下載)；
+    只採用known_empty_max_age秒內的紀錄。行事曆格式(匯出ICS)一律下載七天，
+    避免過時的紀錄讓某一天的課從行事曆裡消失。
+    有任何一天下載失敗時這次下載的結果都不保留，下次使用時會重新下載。
+    time_limit是每次下載最多等幾秒(None表示不限制)，到期時還沒回來的星期當成失敗。
+    """
+
+    def __init__(self, student_id: str, client: Optional[ClassTableClient] = None,
+                 skip_known_empty: bool = False, time_limit: Optional[float] = None,
+                 known_empty_max_age: Optional[float] = KNOWN_EMPTY_MAX_AGE):
+        self.student_id = student_id
+        self.client = client
+        self.skip_known_empty = skip_known_empty
+        self.known_empty_max_age = known_empty_max_age
+        self.time_limit = time_limit
+        # 最近一次使用partial=True的格式時沒有取得的星期
+        self.missing: List[int] = []
+        self._class_table = [[] for _ in ALL_DAYS]
+        self._class_time = []
+        self._loaded = set()
+        self._force_refresh = False
+        # refresh()時加一，下載前後不一樣表示結果已經過時
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def load(self, days: Iterable[int] = ALL_DAYS, refresh: bool = False,
+             progress: Optional[Callable[[int, int, int], None]] = None,
+             cancel: Optional[threading.Event] = None,
+             skip_known_empty: bool = False):
+        """取得(課表, 節次時間, 錯誤)，只下載還沒有的星期
+
+        progress與cancel的用法同personal_class_table；取消時這次下載的結果不保留。
+        skip_known_empty=True時略過已知沒課的星期(這些星期不算已下載，之後仍會下載)。
+        鎖只在讀取與合併狀態時持有，下載期間refresh()不必等待(在Tk主執行緒呼叫也不會卡住)；
+        下載途中呼叫過refresh()時，這次的結果照樣回傳但不保留。
+        """
+        with self._lock:
+            refresh = refresh or self._force_refresh
+            if refresh:
+                self._loaded.clear()
+            missing = sorted(set(days) - self._loaded)
+            if not missing:
+                return list(self._class_table), self._class_time, []
+            generation = self._generation
+
+        known_empty = []
+        if skip_known_empty and not refresh:
+            known_empty = known_empty_days(self.student_id, self.client, self.known_empty_max_age)
+        deadline = Deadline(self.time_limit) if self.time_limit is not None else None
+        class_table, class_time, errors = personal_class_table(
+            self.student_id, self.client, refresh=refresh, days=missing, known_empty=known_empty,
+            progress=progress, cancel=cancel, deadline=deadline)
+
+        with self._lock:
+            if errors or generation != self._generation:
+                # 已經有的星期跟這次取得的合在一起，partial=True時可以顯示
+                merged = [class_table[day - 1] if day in missing else self._class_table[day - 1]
+                          for day in ALL_DAYS]
+                return merged, class_time or self._class_time, errors
+
+            fetched = [day for day in missing if day not in known_empty]
+            for day in fetched:
+                self._class_table[day - 1] = class_table[day - 1]
+            for day in known_empty:
+                # 沒有下載，只是先當成沒課
+                self._class_table[day - 1] = []
+            if class_time or not self._class_time:
+                self._class_time = class_time
+            self._loaded.update(fetched)
+            self._force_refresh = False
+            return list(self._class_table), self._class_time, []
+
+    def refresh(self):
+        """丟掉記憶體中的資料，下次使用時略過硬碟快取重新下載(不會等待進行中的下載)"""
+        with self._lock:
+            self._generation += 1
+            self._loaded.clear()
+            self._force_refresh = True
+
+    def _load_or_raise(self, days, progress, cancel, partial, skip_known_empty=False):
+        class_table, class_time, errors = self.load(days, progress=progress, cancel=cancel,
+                                                    skip_known_empty=skip_known_empty)
+        missing = missing_days(errors)
+        # 一天都沒有取得時沒有東西可以顯示
+        if errors and (not partial or set(days) <= set(missing)):
+            raise FetchFailed(self.student_id, errors)
+        self.missing = missing
+        return class_table, class_time, errors
+
+    def single_view(self, progress=None, cancel=None, partial=False):
+        """get_single_class_table格式；有星期查詢失敗時丟出FetchFailed
+
+        partial=True時改為回傳取得的部分，沒有取得的星期記在self.missing。
+        週一到週五都沒課時會補抓週末，只有週末有課的學生不會被當成「無此人」。
+        """
+        data = self._load_or_raise(WEEKDAYS, progress, cancel, partial, self.skip_known_empty)
+        if not data[2] and _has_no_classes(data[0]):
+            data = self._load_or_raise(ALL_DAYS, progress, cancel, partial, self.skip_known_empty)
+        return build_single_class_table(*data, partial=partial)
+
+    def mix_view(self, progress=None, cancel=None, partial=False):
+        """get_mix_class_table格式；有星期查詢失敗時丟出FetchFailed(partial同single_view)"""
+        return build_mix_class_table(*self._load_or_raise(ALL_DAYS, progress, cancel, partial), partial=partial)
+
+
+
+
+
 if __name__ == "__main__":
-    student_id = input("請輸入學號: ")
-    get_single_class_table(student_id)
-    #print(get_mix_class_table(student_id))
\ No newline at end of file
+    # 命令列工具在cli.py(可以一次查詢多位學生並輸出JSON/CSV/ics)
+    import sys
+    from cli import main
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# codes/與benchmarks/的模組彼此直接import(不是套件)，跟執行腳本時一樣加進路徑
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("codes", "benchmarks"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
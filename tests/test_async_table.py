@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from async_table import AsyncClassTableClient
+from cache import ResponseCache
+
+
+async def start_app(handler):
+    app = web.Application()
+    app.router.add_post("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+def test_unconditional_304_is_an_error_and_not_cached(tmp_path):
+    async def not_modified(request):
+        return web.Response(status=304)
+
+    async def main():
+        runner, url = await start_app(not_modified)
+        cache = ResponseCache(str(tmp_path), url=url)
+        try:
+            async with AsyncClassTableClient(url=url, cache=cache, retries=0) as client:
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await client.fetch_schedule("11200001", 1)
+        finally:
+            await runner.cleanup()
+        assert cache.get("11200001", 1) is None
+
+    asyncio.run(main())
+
+
+def test_backoff_does_not_hold_a_concurrency_slot():
+    async def unavailable(request):
+        if request.headers.get("X-Fast"):
+            return web.Response(text="ok")
+        return web.Response(status=503)
+
+    async def main():
+        runner, url = await start_app(unavailable)
+        try:
+            async with AsyncClassTableClient(url=url, concurrency=1, retries=1, backoff=1.0) as client:
+                slow = asyncio.ensure_future(client.post_schedule("11200001", 1))
+                await asyncio.sleep(0.2)
+                start = time.monotonic()
+                status, _, text = await client.post_schedule("11200002", 1, {"X-Fast": "1"})
+                elapsed = time.monotonic() - start
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await slow
+        finally:
+            await runner.cleanup()
+        assert (status, text) == (200, "ok")
+        # 第一個請求在等待重試時，第二個請求不必等它
+        assert elapsed < 0.5
+
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+import os
+import time
+
+import pytest
+
+import cache as cache_module
+from cache import ResponseCache, cache_namespace
+from client import ClassTableClient
+
+REAL = "https://ntcbadm.ntub.edu.tw/JMobile_STD/AjaxPage/SRHCUR_Schedule_ajax.aspx"
+MOCK = "http://127.0.0.1:8765/JMobile_STD/AjaxPage/SRHCUR_Schedule_ajax.aspx"
+
+
+def test_hosts_do_not_share_entries(tmp_path):
+    real = ResponseCache(str(tmp_path), url=REAL)
+    mock = ResponseCache(str(tmp_path), url=MOCK)
+    real.put("11200001", 1, "<table>real</table>")
+    assert mock.get("11200001", 1) is None
+    assert real.get("11200001", 1).text == "<table>real</table>"
+    assert real.directory != mock.directory
+    assert cache_namespace(MOCK) == "127.0.0.1_8765"
+
+
+def test_client_rejects_cache_of_another_host(tmp_path):
+    with pytest.raises(ValueError):
+        ClassTableClient(url=MOCK, cache=ResponseCache(str(tmp_path), url=REAL))
+    ClassTableClient(url=MOCK, cache=ResponseCache(str(tmp_path), url=MOCK)).close()
+
+
+def test_stale_tmp_files_are_removed(tmp_path):
+    directory = tmp_path / cache_namespace(REAL)
+    directory.mkdir()
+    stale, fresh = directory / "stale.tmp", directory / "fresh.tmp"
+    stale.write_text("half")
+    fresh.write_text("writing")
+    old = time.time() - cache_module.STALE_TMP_SECONDS - 10
+    os.utime(stale, (old, old))
+
+    ResponseCache(str(tmp_path), url=REAL)
+    assert not stale.exists()
+    # 可能是其他程式正在寫入的暫存檔
+    assert fresh.exists()
@@ -0,0 +1,66 @@
+import glob
+import os
+
+import pytest
+
+from corpus import FIXTURE_DIR
+from extract import compare_with_bs4, extract_class_table_day
+
+FIXTURE_FILES = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+
+HEAD = ('<table class="StdTable" width="100%">'
+        '<tr><th class="Stdth001">節次</th><th class="Stdth002">課程</th></tr>')
+TAIL = '</table>'
+
+
+def row(period, start, end, cell, br="<br/>"):
+    return (f'<tr><th class="Stdth003">{period}{br}{start}{br}{end}</th>'
+            f'<td class="Stdtd001">{cell}</td></tr>')
+
+
+def course(name, teacher, room, br="<br/>"):
+    return f'<a href="javascript:void(0)" class="CurLink">{name}</a>{br}{teacher}{br}{room}'
+
+
+EDGE_CASES = {
+    "br_html": HEAD + row(1, "08:10", "09:00", course("微積分", "王小明", "A-501", "<br>"), "<br>") + TAIL,
+    "br_xhtml": HEAD + row(1, "08:10", "09:00", course("微積分", "王小明", "A-501")) + TAIL,
+    "br_mixed": HEAD + row(1, "08:10", "09:00", course("微積分", "王小明", "A-501", "<br />"))
+                + row(2, "09:10", "10:00", course("統計學", "李大華", "B-305"), "<br>") + TAIL,
+    "unclosed_td": HEAD + '<tr><th class="Stdth003">1<br/>08:10<br/>09:00</th><td class="Stdtd001">'
+                   + course("微積分", "王小明", "A-501") + '</tr>' + row(2, "09:10", "10:00", "<a></a>") + TAIL,
+    "nested_td": HEAD + row(1, "08:10", "09:00", '<table><tr><td>' + course("微積分", "王小明", "A-501")
+                            + '</td></tr></table>') + TAIL,
+    "entities": HEAD + row(1, "08:10", "09:00", course("程式設計&amp;實作", "陳&nbsp;怡君", "&lt;A-501&gt;"))
+                + row(2, "09:10", "10:00", course("英文&#40;二&#41;", "&#x5F35;雅婷", "S&nbsp;110")) + TAIL,
+    "nbsp_only_cell": HEAD + row(1, "08:10", "09:00", "&nbsp;") + TAIL,
+    "empty_table": HEAD + TAIL,
+    "no_table": "<html><body><p>查無資料</p></body></html>",
+    "empty_page": "",
+}
+
+
+@pytest.mark.parametrize("path", FIXTURE_FILES, ids=os.path.basename)
+def test_fixtures_match_bs4(path):
+    with open(path, "rb") as f:
+        assert compare_with_bs4(f.read()) == []
+
+
+@pytest.mark.parametrize("name", EDGE_CASES)
+def test_edge_cases_match_bs4(name):
+    assert compare_with_bs4(EDGE_CASES[name]) == []
+
+
+def test_fixture_corpus_is_not_empty():
+    assert len(FIXTURE_FILES) >= 7
+
+
+def test_entities_are_decoded():
+    classes, times = extract_class_table_day(EDGE_CASES["entities"])
+    assert classes[0]["name"] == "程式設計&實作"
+    assert classes[1]["teacher"] == "張雅婷"
+    assert len(times) == 2
+
+
+def test_no_table_has_no_rows():
+    assert extract_class_table_day(EDGE_CASES["no_table"]) == ([], [])
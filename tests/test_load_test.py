@@ -0,0 +1,16 @@
+import pytest
+
+from load_test import percentile
+
+VALUES = list(range(1, 11))
+
+
+@pytest.mark.parametrize("p, expected", [
+    (0, 1), (10, 1), (15, 2), (25, 3), (45, 5), (50, 5), (55, 6), (90, 9), (95, 10), (99, 10), (100, 10),
+])
+def test_nearest_rank(p, expected):
+    assert percentile(VALUES, p) == expected
+
+
+def test_empty():
+    assert percentile([], 50) == 0.0
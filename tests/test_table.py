@@ -0,0 +1,97 @@
+import time
+
+from corpus import load_fixtures
+
+import batch
+import table
+from deadline import Deadline
+
+FIXTURES = load_fixtures()
+
+
+class FakeClient:
+    """依星期回傳固定HTML的客戶端，記錄下載過的星期"""
+    cache = None
+
+    def __init__(self, week):
+        self.week = week
+        self.fetched = []
+
+    def fetch_schedule(self, student_id, today, refresh=False, deadline=None):
+        self.fetched.append(today)
+        return self.week[today - 1]
+
+
+def weekend_only_week():
+    # 週一到週五沒課，只有週六有夜間課程
+    return FIXTURES["empty"][:5] + [FIXTURES["evening"][5], FIXTURES["empty"][6]]
+
+
+def test_weekend_only_student_gets_grid():
+    client = FakeClient(weekend_only_week())
+    result = table.get_single_class_table("11200001", client)
+    assert isinstance(result, list) and result
+    assert all(set(slot) == {"time"} for slot in result)
+    assert sorted(client.fetched) == list(table.ALL_DAYS)
+
+
+def test_weekend_only_student_in_timetable_views():
+    client = FakeClient(weekend_only_week())
+    timetable = table.StudentTimetable("11200001", client)
+    assert isinstance(timetable.single_view(), list)
+    mixed = timetable.mix_view()
+    assert isinstance(mixed, dict) and set(mixed["day"]) == {6}
+    # 單一格式已經補抓過週末，行事曆格式不必重新下載
+    assert sorted(client.fetched) == list(table.ALL_DAYS)
+
+
+def test_empty_student_is_not_found():
+    client = FakeClient(FIXTURES["empty"])
+    assert table.get_single_class_table("11200001", client) == "無此人"
+    assert table.StudentTimetable("11200001", FakeClient(FIXTURES["empty"])).single_view() == "無此人"
+
+
+def test_weekday_student_skips_weekend():
+    client = FakeClient(FIXTURES["regular"])
+    result = table.get_single_class_table("11200001", client)
+    assert any("monday" in slot for slot in result)
+    assert sorted(client.fetched) == list(table.WEEKDAYS)
+
+
+class StaggeredClient(FakeClient):
+    """星期越後面回應越慢，星期一最先完成"""
+
+    def fetch_schedule(self, student_id, today, refresh=False, deadline=None):
+        time.sleep(0.02 * today)
+        return super().fetch_schedule(student_id, today, refresh, deadline)
+
+
+def slow_first_time_parse(monkeypatch, module):
+    """第一個解析節次時間的星期慢到超過時間限制，結果會被丟掉"""
+    parse = module.parse_class_table_day
+    slowed = []
+
+    def parse_day(html, with_time=True, *args):
+        if with_time and not slowed:
+            slowed.append(True)
+            time.sleep(0.6)
+        return parse(html, with_time, *args)
+
+    monkeypatch.setattr(module, "parse_class_table_day", parse_day)
+
+
+def test_times_come_from_a_stored_day_when_the_first_is_dropped(monkeypatch):
+    slow_first_time_parse(monkeypatch, table)
+    class_table, class_time, errors = table.personal_class_table(
+        "11200001", StaggeredClient(FIXTURES["regular"]), deadline=Deadline(0.3))
+    assert table.missing_days(errors) == [1]
+    assert class_time
+    assert isinstance(table.build_mix_class_table(class_table, class_time, errors, partial=True), dict)
+
+
+def test_batch_times_come_from_a_stored_day_when_the_first_is_dropped(monkeypatch):
+    slow_first_time_parse(monkeypatch, batch)
+    [result] = batch.batch_class_tables(["11200001"], client=StaggeredClient(FIXTURES["regular"]),
+                                        time_limit=0.3)
+    assert table.missing_days(result.error_list) == [1]
+    assert result.class_time